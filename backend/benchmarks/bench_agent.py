@@ -0,0 +1,64 @@
+import copy
+import random
+import pytest
+from conftest import SEED, deal_round
+from blackjack_model.evaluation import flat_bet, play_hands
+from blackjack_model.game import BlackjackGame
+from blackjack_model.policy_table import compile_policy
+
+# Rounds of each evaluation benchmark, and the hands played in each
+EVALUATION_ROUNDS = 5
+EVALUATION_HANDS = 20000
+
+@pytest.fixture
+def agent(trained_agent):
+    '''
+    Copy of the trained agent that a benchmark can keep training
+    '''
+    random.seed(SEED)
+    return copy.deepcopy(trained_agent)
+
+@pytest.fixture
+def states():
+    '''
+    Tuple of (state, next state) of a dealt hand before and after a hit
+    '''
+    game = BlackjackGame(seed=SEED)
+    deal_round(game)
+    state = game.get_state()
+    game.hit()
+    return (state, game.get_state())
+
+def bench_compute_best_action(benchmark, agent, states):
+    '''
+    Finding the best legal action of a state
+    '''
+    benchmark(agent.compute_best_action, states[0])
+
+def bench_update(benchmark, agent, states):
+    '''
+    One Q-learning update
+    '''
+    state, next_state = states
+    benchmark(agent.update, state, 'hit', next_state, 0)
+
+def bench_run_episode(benchmark, agent):
+    '''
+    One Q-learning episode, so operations per second are training hands per second
+    '''
+    benchmark(agent.run_episode)
+
+    # There are no stats with --benchmark-disable
+    if benchmark.stats:
+        benchmark.extra_info['hands_per_sec'] = 1 / benchmark.stats.stats.mean
+
+def bench_evaluation(benchmark, trained_agent):
+    '''
+    Playing EVALUATION_HANDS rounds of the trained policy in this process, like each worker of
+    evaluate_policy
+    '''
+    policy = compile_policy(trained_agent.q_vals)
+    benchmark.pedantic(play_hands, args=(policy, EVALUATION_HANDS, flat_bet), kwargs={'seed': SEED},
+                       rounds=EVALUATION_ROUNDS)
+    if benchmark.stats:
+        benchmark.extra_info['hands_per_sec'] = EVALUATION_HANDS / benchmark.stats.stats.mean
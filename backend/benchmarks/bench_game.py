@@ -0,0 +1,33 @@
+from conftest import deal_round
+
+# Rounds of the benchmarks that need a new hand dealt before every call
+ROUNDS = 20000
+
+def bench_deal(benchmark, game):
+    '''
+    Starting a hand and dealing two cards each to the player and dealer
+    '''
+    benchmark(deal_round, game)
+
+def bench_hit(benchmark, game):
+    '''
+    One hit on a freshly dealt hand
+    '''
+    benchmark.pedantic(game.hit, setup=lambda: deal_round(game), rounds=ROUNDS, warmup_rounds=100)
+
+def bench_evaluate_hand(benchmark, game):
+    '''
+    Playing the dealer and paying out a hand the player stood on
+    '''
+    def stand():
+        deal_round(game)
+        game.stand()
+
+    benchmark.pedantic(game.evaluate_hand, setup=stand, rounds=ROUNDS, warmup_rounds=100)
+
+def bench_get_state(benchmark, game):
+    '''
+    Building the state tuple of a dealt hand
+    '''
+    deal_round(game)
+    benchmark(game.get_state)
@@ -0,0 +1,63 @@
+import json
+import random
+import itertools
+import pytest
+from conftest import SEED
+from load_test import random_hand
+from server_metrics import ServerMetrics
+
+# Random hands cycled through by the /get_policy benchmarks
+NUM_HANDS = 1000
+
+@pytest.fixture
+def client(app):
+    '''
+    Flask test client of the backend, requests don't go over the network
+    '''
+    return app.test_client()
+
+@pytest.fixture
+def hands():
+    '''
+    Iterator cycling over NUM_HANDS seeded random /get_policy request bodies
+    '''
+    random.seed(SEED)
+    return itertools.cycle([random_hand() for _ in range(NUM_HANDS)])
+
+def bench_get_policy_post(benchmark, client, hands):
+    '''
+    Latency of a JSON POST to /get_policy
+    '''
+    def post():
+        return client.post('/get_policy', data=json.dumps(next(hands)), content_type='application/json')
+
+    assert benchmark(post).status_code == 200
+
+def bench_get_policy_get(benchmark, client, hands):
+    '''
+    Latency of a GET of /get_policy with the hand in the query string, as the frontend sends it
+    '''
+    def get():
+        hand = next(hands)
+        return client.get('/get_policy', query_string={'player_cards': ','.join(hand['player_cards']),
+                                                       'dealer_card': hand['dealer_card'], 'true_count': hand['true_count']})
+
+    assert benchmark(get).status_code == 200
+
+def bench_policy_table(benchmark, client):
+    '''
+    Latency of a GET of the /policy_table export
+    '''
+    assert benchmark(client.get, '/policy_table').status_code == 200
+
+def bench_record_metrics(benchmark):
+    '''
+    Metrics recorded for every /get_policy request, its latency and the policy sent
+    '''
+    metrics = ServerMetrics()
+
+    def record():
+        metrics.observe_request('/get_policy', 0.0003)
+        metrics.count_policy('hit', 0)
+
+    benchmark(record)
@@ -0,0 +1,9 @@
+import pytest
+from blackjack_model.model_file import load_policy_table
+
+@pytest.mark.parametrize("model_format", ["npy", "bjq", "pkl"])
+def bench_load_policy_table(benchmark, model_paths, model_format):
+    '''
+    Loading the policy the backend serves from a policy .npy, a model file or a pickled agent
+    '''
+    benchmark(load_policy_table, model_paths[model_format])
@@ -0,0 +1,83 @@
+import os
+import sys
+import random
+import pickle
+import pytest
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+
+# Benchmarks import the backend like its scripts do, with the backend directory on the path
+sys.path.insert(0, BACKEND_DIR)
+
+from blackjack_model.blackjack_agent import BlackjackAgent
+from blackjack_model.game import BlackjackGame
+from blackjack_model.model_file import get_rules, save_model
+from blackjack_model.policy_table import compile_policy, save_policy
+
+# Episodes the agent of the benchmarks is trained for, so its Q-values aren't all ties
+TRAINING_EPISODES = 20000
+SEED = 0
+
+def deal_round(game):
+    '''
+    Deals the player and dealer two cards each like BlackjackAgent.run_episode, starting a new
+    hand of @game first
+    '''
+    game.reset()
+    game.deal_player()
+    game.deal_dealer(False)
+    game.deal_player()
+    game.deal_dealer(True)
+
+@pytest.fixture
+def game():
+    '''
+    Seeded BlackjackGame with the default rules
+    '''
+    return BlackjackGame(seed=SEED)
+
+@pytest.fixture(scope="session")
+def trained_agent():
+    '''
+    BlackjackAgent trained for TRAINING_EPISODES episodes on a seeded game
+    '''
+    random.seed(SEED)
+    agent = BlackjackAgent()
+    agent.game = BlackjackGame(seed=SEED)
+    for _ in range(TRAINING_EPISODES):
+        agent.run_episode()
+    return agent
+
+@pytest.fixture(scope="session")
+def model_paths(trained_agent, tmp_path_factory):
+    '''
+    Dict of the trained agent saved in each format load_policy_table accepts: "pkl", "bjq" and "npy"
+    '''
+    directory = tmp_path_factory.mktemp("models")
+    paths = {name: str(directory / f"agent.{name}") for name in ("pkl", "bjq", "npy")}
+
+    with open(paths["pkl"], "wb") as f:
+        pickle.dump(trained_agent, f)
+    save_model(trained_agent.q_vals, paths["bjq"], get_rules(trained_agent.game))
+    save_policy(compile_policy(trained_agent.q_vals), paths["npy"])
+
+    return paths
+
+@pytest.fixture(scope="session")
+def app():
+    '''
+    Flask app of optimal_policy.py, which loads its policy relative to the repository root
+    '''
+    if not os.path.exists(os.path.join(REPO_DIR, "backend/blackjack_model/blackjack_policy.npy")):
+        pytest.skip("the backend needs backend/blackjack_model/blackjack_policy.npy, run export_policy.py or solve_policy.py")
+
+    cwd = os.getcwd()
+    os.chdir(REPO_DIR)
+    try:
+        import optimal_policy
+    finally:
+        os.chdir(cwd)
+
+    return optimal_policy.app
@@ -1,19 +1,172 @@
+import random
 import pickle
+import argparse
 from blackjack_model.blackjack_agent import BlackjackAgent
+from blackjack_model.batch_game import BatchBlackjackGame
+from blackjack_model.episode_kernel import BACKENDS, EpisodeKernel
+from blackjack_model.parallel_training import train_parallel
+from blackjack_model.rules import Rules
+from blackjack_model.model_file import AGENT_SETTINGS, get_rules, save_model
+from blackjack_model.profiling import add_profile_arguments, profile_run
+from blackjack_model.training_monitor import TrainingMonitor, save_checkpoint, load_checkpoint
 
 MAX_ITER = 500000000
 
-agent = BlackjackAgent()
+# Table rules the agent learns to play
+RULES = Rules()
 
-# Train agent MAX_ITER times
-for _ in range(MAX_ITER):
-    agent.run_episode()
+# Number of tables played in lockstep by the batched environment, 0 trains one hand at a time
+BATCH_TABLES = 16384
 
-# Check learned states and parameter values
-print(len(agent.q_vals))
-print(agent.epsilon)
-print(agent.alpha)
+# Backend of the fused episode kernel (episode_kernel.py) that trains in place of the batched or
+# serial environment, "numba" or "python", None doesn't use it. Overridden by --kernel
+EPISODE_KERNEL = None
 
-# Save agent
-with open("blackjack_model/blackjack_agent.pkl", "wb") as f:
-    pickle.dump(agent, f)
\ No newline at end of file
+# Number of worker processes for parallel training, 0 trains in this process
+NUM_WORKERS = 0
+SYNC_INTERVAL = 1000000
+MERGE = "average"
+SEED = 0
+
+# Episodes between metrics records (parallel training records after every sync instead) and between checkpoints
+METRICS_INTERVAL = 10000000
+CHECKPOINT_INTERVAL = 50000000
+
+# Metrics are written as CSV rows, or as JSON lines for a .jsonl path
+METRICS_PATH = "blackjack_model/training_metrics.csv"
+
+# Training resumes from this checkpoint if it exists
+CHECKPOINT_PATH = "blackjack_model/training_checkpoint.pkl"
+
+# Stop early once the greedy action changed in at most POLICY_TOLERANCE percent of states for
+# STABLE_INTERVALS metrics intervals in a row, 0 never stops early
+STABLE_INTERVALS = 0
+POLICY_TOLERANCE = 0.1
+
+def new_checkpoint(kernel_backend=None):
+    '''
+    Returns the checkpoint of a training run that hasn't started
+
+    :param kernel_backend: backend of the episode kernel to train with, None doesn't use it
+    '''
+    agent = BlackjackAgent(rules=RULES)
+    batch_game = None
+    kernel = None
+    if kernel_backend:
+        kernel = EpisodeKernel(kernel_backend, seed=SEED)
+    elif BATCH_TABLES and not NUM_WORKERS:
+        batch_game = BatchBlackjackGame(num_tables=BATCH_TABLES, num_decks=agent.game.num_decks, penetration=agent.game.penetration,
+                                        seed=SEED, rules=RULES)
+
+    return {
+        'agent': agent,
+        'episodes': 0,
+        'batch_game': batch_game,
+        'kernel': kernel,
+        'random_state': random.getstate(),
+        'monitor': TrainingMonitor(METRICS_PATH, STABLE_INTERVALS, POLICY_TOLERANCE),
+    }
+
+def record_interval(checkpoint, episodes):
+    '''
+    Records the metrics of the interval that just ended, saves a checkpoint if one is due and
+    returns whether training converged
+
+    :param checkpoint: checkpoint dict of the training run
+    :param episodes: total number of episodes played
+    '''
+    agent = checkpoint['agent']
+    metrics, converged = checkpoint['monitor'].update(agent, episodes)
+    print(f"{episodes} episodes: {metrics['episodes_per_sec']:.0f} episodes/s, Q delta {metrics['q_delta_norm']:.4f}, "
+          f"{metrics['greedy_changed_pct']:.2f}% greedy changed, {metrics['coverage_pct']:.1f}% coverage")
+
+    if converged or episodes - checkpoint['episodes'] >= CHECKPOINT_INTERVAL:
+        checkpoint['episodes'] = episodes
+        checkpoint['random_state'] = random.getstate()
+        save_checkpoint(CHECKPOINT_PATH, checkpoint)
+
+    return converged
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the Q-learning agent")
+    parser.add_argument("--kernel", choices=BACKENDS, default=EPISODE_KERNEL,
+                        help="train with the fused episode kernel on this backend")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if args.kernel and NUM_WORKERS:
+        parser.error("--kernel trains in this process, set NUM_WORKERS = 0")
+
+    checkpoint = load_checkpoint(CHECKPOINT_PATH)
+    if checkpoint is None:
+        checkpoint = new_checkpoint(args.kernel)
+    else:
+        print(f"Resuming from {checkpoint['episodes']} episodes")
+        random.setstate(checkpoint['random_state'])
+
+    agent = checkpoint['agent']
+    batch_game = checkpoint['batch_game']
+    episodes = checkpoint['episodes']
+
+    # Checkpoints from before the kernel or without it start its random stream now
+    kernel = checkpoint.get('kernel')
+    if not args.kernel:
+        kernel = None
+    elif kernel is None:
+        kernel = checkpoint['kernel'] = EpisodeKernel(args.kernel, seed=[SEED, episodes])
+    else:
+        kernel.set_backend(args.kernel)
+
+    checkpoint['monitor'].start(agent, episodes)
+
+    # Phase timing and profiling only see this process, not parallel workers
+    with profile_run(args.profile_phases, args.profile):
+        # Train agent MAX_ITER times
+        if NUM_WORKERS:
+            # Workers get new random streams when resuming
+            seed = SEED if episodes == 0 else [SEED, episodes]
+            offset = episodes
+
+            def callback(agent, num_episodes):
+                return record_interval(checkpoint, offset + num_episodes)
+
+            train_parallel(agent, MAX_ITER - episodes, num_workers=NUM_WORKERS, sync_interval=SYNC_INTERVAL, merge=MERGE,
+                           seed=seed, callback=callback)
+            episodes = checkpoint['monitor'].last_episodes
+        else:
+            # Batched training plays whole rounds of BATCH_TABLES episodes
+            round_size = BATCH_TABLES if batch_game is not None and kernel is None else 1
+            max_episodes = MAX_ITER - MAX_ITER % round_size
+
+            while episodes < max_episodes:
+                interval = min(max(METRICS_INTERVAL - METRICS_INTERVAL % round_size, round_size), max_episodes - episodes)
+
+                if kernel is not None:
+                    kernel.run_episodes(agent, interval)
+                elif batch_game is not None:
+                    agent.run_batch_episodes(batch_game, interval // BATCH_TABLES)
+                else:
+                    for _ in range(interval):
+                        agent.run_episode()
+                episodes += interval
+
+                if record_interval(checkpoint, episodes):
+                    print("Policy converged")
+                    break
+
+    # Keep the final state so training can be extended by raising MAX_ITER
+    checkpoint['episodes'] = episodes
+    checkpoint['random_state'] = random.getstate()
+    save_checkpoint(CHECKPOINT_PATH, checkpoint)
+
+    # Check learned states and parameter values
+    print(len(agent.q_vals))
+    print(agent.epsilon)
+    print(agent.alpha)
+
+    # Save agent
+    with open("blackjack_model/blackjack_agent.pkl", "wb") as f:
+        pickle.dump(agent, f)
+
+    # Save the Q-values in the model file format, which loads without unpickling the agent
+    save_model(agent.q_vals, "blackjack_model/blackjack_agent.bjq", get_rules(agent.game),
+               {setting: getattr(agent, setting) for setting in AGENT_SETTINGS})
@@ -0,0 +1,216 @@
+'''
+Bankroll analysis of count-based bet ramps from the outcomes of evaluated rounds
+
+A bet ramp is an array of the bet placed at each binned true count. Since bets don't change the
+cards, the HandOutcomes of one evaluation (evaluation.collect_outcomes) give the results of every
+ramp: each round's winnings are its unit result times the ramp's bet at its true count. Expected
+value, standard deviation and N0 of a ramp come from per true count sums of the outcomes, so any
+number of ramps are compared in one matrix product. Risk of ruin is simulated over many bankroll
+trajectories at once, each a chain of blocks of consecutive rounds resampled from the outcomes so
+the true counts of neighbouring rounds stay correlated like they are within a shoe.
+'''
+import math
+import numpy as np
+from blackjack_model import state_encoding
+from blackjack_model.evaluation import get_bet_sizing
+
+TRUE_COUNTS = list(range(state_encoding.TRUE_COUNT_MIN, state_encoding.TRUE_COUNT_MIN + state_encoding.TRUE_COUNTS))
+
+# Rounds played per hour at a full table, for hourly results
+HANDS_PER_HOUR = 100
+
+# Consecutive rounds resampled together by simulate_bankrolls, several shoes' worth
+BLOCK_SIZE = 500
+
+def get_ramp(bet_sizing):
+    '''
+    Returns the bet ramp of @bet_sizing, an array of its bet at each of TRUE_COUNTS
+
+    :param bet_sizing: function returning the bet for a binned true count
+    '''
+    return np.array([bet_sizing(true_count) for true_count in TRUE_COUNTS], dtype=float)
+
+def get_linear_ramps(min_bet, max_bets, spreads):
+    '''
+    Returns a tuple as:
+    (array of shape (len(@max_bets) * len(@spreads), len(TRUE_COUNTS)) of ramps, list of their labels)
+    of the linear ramps of get_bet_sizing for every max bet and spread
+
+    :param min_bet: bet at a true count of 0 or less
+    :param max_bets: largest bets
+    :param spreads: true counts at which the max bet is reached
+    '''
+    ramps = []
+    labels = []
+    for max_bet in max_bets:
+        for spread in spreads:
+            ramps.append(get_ramp(lambda true_count: get_bet_sizing(true_count, min_bet, max_bet, spread)))
+            labels.append(f"{min_bet:g}-{max_bet:g} by {spread:g}")
+
+    return (np.array(ramps), labels)
+
+def get_count_sums(outcomes):
+    '''
+    Returns a tuple of arrays indexed like TRUE_COUNTS as:
+    (rounds, sum of unit winnings, sum of squared unit winnings, sum of unit amounts wagered)
+    of the rounds played at each true count
+
+    :param outcomes: HandOutcomes
+    '''
+    index = outcomes.true_counts.astype(np.intp) - state_encoding.TRUE_COUNT_MIN
+    size = len(TRUE_COUNTS)
+
+    return (np.bincount(index, minlength=size).astype(float),
+            np.bincount(index, weights=outcomes.winnings, minlength=size),
+            np.bincount(index, weights=outcomes.winnings * outcomes.winnings, minlength=size),
+            np.bincount(index, weights=outcomes.wagered, minlength=size))
+
+def get_ramp_stats(outcomes, ramps, hands_per_hour=HANDS_PER_HOUR):
+    '''
+    Returns a dict of arrays with an entry for each ramp:
+    average_bet: average initial bet per round
+    edge: winnings as a fraction of the amount wagered, like EdgeStats.get_edge
+    ev, sd: expected value and standard deviation of the winnings of a round
+    hourly_ev, hourly_sd: the same over @hands_per_hour rounds
+    n0: rounds needed for the expected winnings to equal one standard deviation, inf without an edge
+
+    :param outcomes: HandOutcomes
+    :param ramps: array of shape (number of ramps, len(TRUE_COUNTS)) of bets
+    :param hands_per_hour: rounds played per hour
+    '''
+    ramps = np.atleast_2d(ramps)
+    rounds, winnings, winnings_squared, wagered = get_count_sums(outcomes)
+    num_rounds = rounds.sum()
+
+    ev = ramps @ winnings / num_rounds
+    variance = np.maximum((ramps * ramps) @ winnings_squared / num_rounds - ev * ev, 0.0)
+    sd = np.sqrt(variance)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        edge = np.where(ramps @ wagered > 0, ramps @ winnings / (ramps @ wagered), 0.0)
+        n0 = np.where(ev > 0, variance / (ev * ev), np.inf)
+
+    return {
+        'average_bet': ramps @ rounds / num_rounds,
+        'edge': edge,
+        'ev': ev,
+        'sd': sd,
+        'hourly_ev': ev * hands_per_hour,
+        'hourly_sd': sd * math.sqrt(hands_per_hour),
+        'n0': n0,
+    }
+
+def get_theoretical_risk(ev, sd, bankroll):
+    '''
+    Returns the risk of ever losing @bankroll while playing forever, exp(-2 * ev * bankroll / sd^2)
+    from the normal approximation, 1 without an edge
+
+    :param ev: expected winnings per round, or array of them
+    :param sd: standard deviation of the winnings per round, or array of them
+    :param bankroll: starting bankroll
+    '''
+    ev = np.asarray(ev, dtype=float)
+    sd = np.asarray(sd, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        risk = np.exp(-2 * ev * bankroll / (sd * sd))
+    return np.where(ev > 0, np.minimum(risk, 1.0), 1.0)
+
+def get_window_minimums(values, length):
+    '''
+    Returns an array of the minimum of every @length consecutive values along the last axis of
+    @values, one for each start where the window fits. Minimums of doubling widths are combined
+    like a sparse table, in log2(@length) vectorized passes.
+
+    :param values: array of values
+    :param length: number of values in each window, at least 1
+    '''
+    minimums = values
+    width = 1
+    while width * 2 <= length:
+        minimums = np.minimum(minimums[..., :-width], minimums[..., width:])
+        width *= 2
+
+    # Two overlapping windows of the largest width cover the whole window
+    shift = length - width
+    return np.minimum(minimums[..., :minimums.shape[-1] - shift], minimums[..., shift:])
+
+def simulate_bankrolls(outcomes, ramps, num_hands, num_trajectories, seed=None, block_size=BLOCK_SIZE):
+    '''
+    Simulates @num_trajectories bankroll trajectories of @num_hands rounds for every ramp, with
+    the same resampled rounds for every ramp. Each trajectory is a chain of blocks of @block_size
+    consecutive rounds starting at random rounds, wrapping around the end of the outcomes. The
+    winnings and lowest point of a block starting at each round come from prefix sums of the
+    outcomes, so a trajectory only adds up its blocks instead of its rounds. Returns a tuple of
+    arrays of shape (number of ramps, @num_trajectories) as:
+    (lowest cumulative winnings of each trajectory, at most 0, final winnings of each trajectory)
+
+    :param outcomes: HandOutcomes to resample
+    :param ramps: array of shape (number of ramps, len(TRUE_COUNTS)) of bets
+    :param num_hands: rounds in each trajectory
+    :param num_trajectories: number of trajectories
+    :param seed: seed of the resampling
+    :param block_size: consecutive rounds resampled together
+    '''
+    if outcomes.num_rounds == 0:
+        raise ValueError("outcomes must have at least one round")
+    if num_hands < 1 or block_size < 1:
+        raise ValueError("num_hands and block_size must be at least 1")
+
+    ramps = np.atleast_2d(ramps)
+    num_rounds = outcomes.num_rounds
+    block_size = min(block_size, num_hands)
+    num_blocks = math.ceil(num_hands / block_size)
+    last_size = num_hands - (num_blocks - 1) * block_size
+
+    # Winnings of each ramp over the outcomes extended by a block, and their prefix sums
+    extended = np.arange(num_rounds + block_size) % num_rounds
+    true_count_index = outcomes.true_counts.astype(np.intp)[extended] - state_encoding.TRUE_COUNT_MIN
+    prefix = np.zeros((len(ramps), len(extended) + 1))
+    np.cumsum(ramps[:, true_count_index] * outcomes.winnings[extended], axis=1, out=prefix[:, 1:])
+
+    # Winnings and lowest point relative to its start of a block starting at each round, for
+    # full blocks and for the last block
+    start_prefix = prefix[:, :num_rounds]
+    block_winnings = prefix[:, block_size:block_size + num_rounds] - start_prefix
+    block_lowest = get_window_minimums(prefix[:, 1:], block_size)[:, :num_rounds] - start_prefix
+    last_winnings = prefix[:, last_size:last_size + num_rounds] - start_prefix
+    last_lowest = get_window_minimums(prefix[:, 1:], last_size)[:, :num_rounds] - start_prefix
+
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, num_rounds, size=(num_trajectories, num_blocks))
+
+    winnings = block_winnings[:, starts]
+    winnings[:, :, -1] = last_winnings[:, starts[:, -1]]
+    lowest = block_lowest[:, starts]
+    lowest[:, :, -1] = last_lowest[:, starts[:, -1]]
+
+    # Bankroll at the end of each block, and the lowest point within each block
+    levels = np.cumsum(winnings, axis=2)
+    lowest += levels - winnings
+
+    return (np.minimum(lowest.min(axis=2), 0.0), levels[:, :, -1])
+
+def get_ruin_curve(lowest, bankrolls):
+    '''
+    Returns an array of shape (number of ramps, len(@bankrolls)) of the fraction of trajectories
+    that lost the whole bankroll, for each starting bankroll
+
+    :param lowest: lowest cumulative winnings of each trajectory from simulate_bankrolls
+    :param bankrolls: starting bankrolls
+    '''
+    bankrolls = np.asarray(bankrolls, dtype=float)
+    return (lowest[:, :, None] <= -bankrolls).mean(axis=1)
+
+def get_best_ramp(stats, risks, max_risk):
+    '''
+    Returns the index of the ramp with the highest expected value whose risk of ruin is at most
+    @max_risk, None if no ramp with an edge is that safe
+
+    :param stats: dict from get_ramp_stats
+    :param risks: array of the risk of ruin of each ramp
+    :param max_risk: largest acceptable risk of ruin
+    '''
+    candidates = np.flatnonzero((risks <= max_risk) & (stats['ev'] > 0))
+    if len(candidates) == 0:
+        return None
+    return int(candidates[np.argmax(stats['ev'][candidates])])
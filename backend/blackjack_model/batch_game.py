@@ -0,0 +1,411 @@
+import numpy as np
+from blackjack_model.rules import Rules
+
+# Card values used by the batched environment, aces are stored as 1
+ACE = 1
+
+# Count changes for each card value (index 0 is unused)
+COUNT_DELTAS = np.array([0, -1, 1, 1, 1, 1, 1, 0, 0, 0, -1], dtype=np.int64)
+
+# Action codes, matching the order of state_encoding.ACTIONS
+HIT = 0
+STAND = 1
+SPLIT = 2
+DOUBLE = 3
+SURRENDER = 4
+
+def create_deck():
+    '''
+    Returns a single deck as an array of card values where tens and face cards are all 10
+    '''
+    ranks = [ACE, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10]
+    return np.repeat(np.array(ranks, dtype=np.int8), 4)
+
+def get_hand_values(totals, has_aces):
+    '''
+    Returns a tuple of arrays as:
+    (the values of the hands, is soft)
+    Values above 21 are set to 22 to represent a bust
+
+    :param totals: hard totals of the hands, counting aces as 1
+    :param has_aces: whether each hand contains an ace
+    '''
+    is_soft = has_aces & (totals + 10 <= 21)
+    values = totals + 10 * is_soft
+    values = np.where(values > 21, 22, values)
+
+    return (values, is_soft)
+
+class BatchBlackjackGame:
+    '''
+    Batched Blackjack Game Environment
+
+    Plays @num_tables independent tables in lockstep, each with its own shoe, following the
+    same rules and payouts as BlackjackGame. Cards are stored as integer values, and every
+    deal, action, and dealer step is applied to all affected tables with array operations.
+    '''
+    def __init__(self, num_tables=1024, num_decks=6, penetration=0.8, seed=None, max_hands=4, rules=None):
+        '''
+        :param num_tables: Number of tables played in parallel
+        :param num_decks: Number of decks in each shoe
+        :param penetration: What portion of cards are dealt before reshuffling
+        :param seed: Seed for the random number generator
+        :param max_hands: Initial number of hand slots per table, grows if players split further
+        :param rules: Rules of the tables, defaults to Rules()
+        '''
+        # Check valid params
+        if not isinstance(num_tables, int):
+            raise TypeError("num_tables must be an int")
+        if num_tables < 1:
+            raise ValueError("num_tables must be at least 1")
+        if not isinstance(num_decks, int):
+            raise TypeError("num_decks must be an int")
+        if num_decks < 1:
+            raise ValueError("num_decks must be at least 1")
+        if not isinstance(penetration, float):
+            raise TypeError("penetration must be a float")
+        if not (0 < penetration < 1):
+            raise ValueError("penetration must be between 0 and 1")
+
+        self.num_tables = num_tables
+        self.num_decks = num_decks
+        self.penetration = penetration
+        self.rng = np.random.default_rng(seed)
+        self.max_hands = max_hands
+        self.rules = rules if rules is not None else Rules()
+
+        # Whether the dealer draws on each hand value, indexed by value * 2 + is soft
+        self.dealer_hits = np.array(self.rules.dealer_hits)
+
+        # Shoes are dealt front to back, with a cursor pointing at the next card
+        self.shoe_size = 52 * num_decks
+        self.shoes = np.tile(create_deck(), (num_tables, num_decks))
+        self.cursors = np.zeros(num_tables, dtype=np.int64)
+        self.counts = np.zeros(num_tables, dtype=np.int64)
+
+        self.reset_hands()
+        self.create_shoes(np.arange(num_tables))
+
+    def create_shoes(self, tables):
+        '''
+        Shuffles the shoes of the given tables and resets their counts
+
+        :param tables: indices of the tables to reshuffle
+        '''
+        self.shoes[tables] = self.rng.permuted(self.shoes[tables], axis=1)
+        self.cursors[tables] = 0
+        self.counts[tables] = 0
+
+    def reset_hands(self):
+        '''
+        Clears all player and dealer hands
+        '''
+        shape = (self.num_tables, self.max_hands)
+
+        # Player hands, indexed by (table, hand)
+        self.hand_totals = np.zeros(shape, dtype=np.int64)
+        self.hand_aces = np.zeros(shape, dtype=bool)
+        self.hand_lengths = np.zeros(shape, dtype=np.int64)
+        self.first_cards = np.zeros(shape, dtype=np.int64)
+        self.second_cards = np.zeros(shape, dtype=np.int64)
+
+        # Tracks payouts for player hands, unused hand slots stay at 0
+        self.payouts = np.zeros(shape)
+        self.payouts[:, 0] = -1
+
+        # Tracks which player hand is active on each table
+        self.current_hands = np.zeros(self.num_tables, dtype=np.int64)
+        self.num_hands = np.ones(self.num_tables, dtype=np.int64)
+        self.hand_over = np.zeros(self.num_tables, dtype=bool)
+        self.playing = np.zeros(self.num_tables, dtype=bool)
+        self.surrendered = np.zeros(self.num_tables, dtype=bool)
+
+        # Dealer hands
+        self.dealer_totals = np.zeros(self.num_tables, dtype=np.int64)
+        self.dealer_aces = np.zeros(self.num_tables, dtype=bool)
+        self.dealer_up_cards = np.zeros(self.num_tables, dtype=np.int64)
+        self.hidden_cards = np.zeros(self.num_tables, dtype=np.int64)
+
+    def draw(self, tables):
+        '''
+        Returns the next card from the shoe of each given table, reshuffling empty shoes first
+
+        :param tables: indices of the tables to draw for
+        '''
+        empty = tables[self.cursors[tables] == self.shoe_size]
+        if empty.size:
+            self.create_shoes(empty)
+
+        cards = self.shoes[tables, self.cursors[tables]].astype(np.int64)
+        self.cursors[tables] += 1
+
+        return cards
+
+    def deal_players(self, tables):
+        '''
+        Deals the active hand of each given table one card
+
+        :param tables: indices of the tables to deal to
+        '''
+        cards = self.draw(tables)
+        self.counts[tables] += COUNT_DELTAS[cards]
+
+        hands = self.current_hands[tables]
+        lengths = self.hand_lengths[tables, hands]
+
+        self.hand_totals[tables, hands] += cards
+        self.hand_aces[tables, hands] |= cards == ACE
+        self.first_cards[tables, hands] = np.where(lengths == 0, cards, self.first_cards[tables, hands])
+        self.second_cards[tables, hands] = np.where(lengths == 1, cards, self.second_cards[tables, hands])
+        self.hand_lengths[tables, hands] = lengths + 1
+
+    def deal_dealers(self, tables):
+        '''
+        Deals the dealer of each given table one shown card
+
+        :param tables: indices of the tables to deal to
+        '''
+        cards = self.draw(tables)
+        self.counts[tables] += COUNT_DELTAS[cards]
+        self.add_dealer_cards(tables, cards)
+
+    def add_dealer_cards(self, tables, cards):
+        '''
+        Adds @cards to the dealer hands of the given tables
+
+        :param tables: indices of the tables
+        :param cards: the card added to each table's dealer hand
+        '''
+        self.dealer_totals[tables] += cards
+        self.dealer_aces[tables] |= cards == ACE
+
+    def deal_hands(self):
+        '''
+        Deals the player and dealer on every table, in the same order as BlackjackAgent.run_episode
+        '''
+        tables = np.arange(self.num_tables)
+
+        self.deal_players(tables)
+        self.dealer_up_cards = self.draw(tables)
+        self.counts += COUNT_DELTAS[self.dealer_up_cards]
+        self.add_dealer_cards(tables, self.dealer_up_cards)
+        self.deal_players(tables)
+        self.hidden_cards = self.draw(tables)
+
+        # Players only act on tables where the dealer doesn't have blackjack
+        self.playing = ~self.is_dealer_blackjack()
+
+    def is_dealer_blackjack(self):
+        '''
+        Returns whether each dealer has blackjack, counting the hidden card
+        '''
+        up_cards = self.dealer_up_cards
+        hidden_cards = self.hidden_cards
+
+        return ((up_cards == ACE) & (hidden_cards == 10)) | ((up_cards == 10) & (hidden_cards == ACE))
+
+    def get_playing_tables(self):
+        '''
+        Returns the indices of tables where the player still has a hand to play
+        '''
+        return np.flatnonzero(self.playing)
+
+    def get_true_counts(self, tables):
+        '''
+        Returns the rounded true counts of the given tables
+
+        :param tables: indices of the tables
+        '''
+        remaining = self.shoe_size - self.cursors[tables]
+        decks_remaining = np.maximum(remaining, 1) / 52
+        true_counts = np.round(self.counts[tables] / decks_remaining).astype(np.int64)
+
+        return np.where(remaining == 0, 0, true_counts)
+
+    def get_dealer_vals(self, tables):
+        '''
+        Returns the values of the shown dealer hands of the given tables
+
+        :param tables: indices of the tables
+        '''
+        return get_hand_values(self.dealer_totals[tables], self.dealer_aces[tables])[0]
+
+    def get_states(self, tables, offset=0):
+        '''
+        Returns the states of the active hands of the given tables as a tuple of arrays
+        in the same layout as BlackjackGame.get_state
+
+        :param tables: indices of the tables
+        :param offset: offset from the active hand, 1 gives the equivalent of BlackjackGame.get_next_state
+        '''
+        hands = self.current_hands[tables] + offset
+        player_vals, is_soft = get_hand_values(self.hand_totals[tables, hands], self.hand_aces[tables, hands])
+
+        can_act = ~self.hand_over[tables]
+        two_cards = can_act & (self.hand_lengths[tables, hands] == 2)
+        first_hand = self.num_hands[tables] == 1
+
+        # Every hand is a split hand once the table has more than one
+        can_double = two_cards & (self.rules.double_after_split | first_hand)
+        can_split = (two_cards & (self.first_cards[tables, hands] == self.second_cards[tables, hands])
+                     & (self.num_hands[tables] < self.rules.get_max_hands()))
+        can_surrender = two_cards & first_hand & self.rules.surrender
+        true_counts = np.clip(self.get_true_counts(tables), -5, 5)
+
+        return (player_vals, is_soft, self.get_dealer_vals(tables), can_split, can_double, can_act, true_counts, can_surrender)
+
+    def step(self, tables, actions):
+        '''
+        Performs one action on the active hand of each given table
+
+        :param tables: indices of the tables acting
+        :param actions: action code for each table
+        '''
+        # Hit and double both take a card
+        hitting = tables[actions == HIT]
+        doubling = tables[actions == DOUBLE]
+        drawing = tables[(actions == HIT) | (actions == DOUBLE)]
+
+        if drawing.size:
+            self.deal_players(drawing)
+
+        # Busted hands end
+        if hitting.size:
+            player_vals = get_hand_values(self.hand_totals[hitting, self.current_hands[hitting]],
+                                          self.hand_aces[hitting, self.current_hands[hitting]])[0]
+            self.hand_over[hitting[player_vals > 21]] = True
+
+        # Doubled hands pay twice and end
+        if doubling.size:
+            self.payouts[doubling, self.current_hands[doubling]] *= 2
+            self.hand_over[doubling] = True
+
+        self.hand_over[tables[actions == STAND]] = True
+
+        # Surrendered hands lose half the bet and end
+        surrendering = tables[actions == SURRENDER]
+        if surrendering.size:
+            self.payouts[surrendering, self.current_hands[surrendering]] = -0.5
+            self.surrendered[surrendering] = True
+            self.hand_over[surrendering] = True
+
+        splitting = tables[actions == SPLIT]
+        if splitting.size:
+            self.split(splitting)
+
+    def split(self, tables):
+        '''
+        Performs split action on the active hand of each given table
+
+        :param tables: indices of the tables splitting
+        '''
+        if self.num_hands[tables].max() >= self.max_hands:
+            self.grow_hands()
+
+        hands = self.current_hands[tables]
+        first_cards = self.first_cards[tables, hands]
+        second_cards = self.second_cards[tables, hands]
+
+        # Shift every later hand right to make room for the new hand
+        slots = np.arange(self.max_hands)
+        sources = np.where(slots > hands[:, None] + 1, slots - 1, slots)
+        for hand_array in (self.hand_totals, self.hand_aces, self.hand_lengths,
+                           self.first_cards, self.second_cards, self.payouts):
+            hand_array[tables] = np.take_along_axis(hand_array[tables], sources, axis=1)
+
+        # Split hands
+        for hand, card in ((hands, first_cards), (hands + 1, second_cards)):
+            self.hand_totals[tables, hand] = card
+            self.hand_aces[tables, hand] = card == ACE
+            self.hand_lengths[tables, hand] = 1
+            self.first_cards[tables, hand] = card
+            self.second_cards[tables, hand] = 0
+        self.payouts[tables, hands + 1] = -1
+        self.num_hands[tables] += 1
+
+        # Deal an extra card to each hand
+        self.deal_players(tables)
+        self.current_hands[tables] += 1
+        self.deal_players(tables)
+        self.current_hands[tables] -= 1
+
+    def grow_hands(self):
+        '''
+        Doubles the number of hand slots available on each table
+        '''
+        padding = ((0, 0), (0, self.max_hands))
+
+        self.hand_totals = np.pad(self.hand_totals, padding)
+        self.hand_aces = np.pad(self.hand_aces, padding)
+        self.hand_lengths = np.pad(self.hand_lengths, padding)
+        self.first_cards = np.pad(self.first_cards, padding)
+        self.second_cards = np.pad(self.second_cards, padding)
+        self.payouts = np.pad(self.payouts, padding)
+        self.max_hands *= 2
+
+    def update_current_hands(self, tables):
+        '''
+        Moves to the next hand on each given table whose active hand ended
+
+        :param tables: indices of the tables
+        '''
+        ended = tables[self.hand_over[tables]]
+        self.hand_over[ended] = False
+        self.current_hands[ended] += 1
+        self.playing[ended] = self.current_hands[ended] < self.num_hands[ended]
+
+    def play_dealers(self, tables):
+        '''
+        Draws cards for the given dealers until they stand under the rules
+
+        :param tables: indices of the tables where the dealer has to play
+        '''
+        while tables.size:
+            dealer_vals, is_soft = get_hand_values(self.dealer_totals[tables], self.dealer_aces[tables])
+            tables = tables[self.dealer_hits[dealer_vals * 2 + is_soft]]
+            if tables.size:
+                self.deal_dealers(tables)
+
+    def evaluate_hands(self):
+        '''
+        Returns an array of factors representing the player's win or loss for each hand, with
+        shape (num_tables, max_hands). Unused hand slots are 0.
+        '''
+        player_vals = get_hand_values(self.hand_totals, self.hand_aces)[0]
+        in_play = np.arange(self.max_hands) < self.num_hands[:, None]
+        player_blackjack = in_play & (player_vals == 21) & (self.hand_lengths == 2)
+
+        # Whether dealer has to play, surrendered hands keep their payout whatever the dealer has
+        dealer_action = (in_play & ((player_vals < 21) | ((player_vals == 21) & ~player_blackjack))).any(axis=1)
+        dealer_action &= ~self.surrendered
+        in_play &= ~self.surrendered[:, None]
+        player_blackjack &= in_play
+
+        # Reveal hidden dealer cards
+        tables = np.arange(self.num_tables)
+        self.counts += COUNT_DELTAS[self.hidden_cards]
+        self.add_dealer_cards(tables, self.hidden_cards)
+
+        # If dealer action, play dealer
+        self.play_dealers(np.flatnonzero(dealer_action))
+        dealer_vals = self.get_dealer_vals(tables)[:, None]
+
+        # Update payouts. Dealer blackjacks are settled by comparing hand values, matching
+        # BlackjackGame.evaluate_hand where the hidden card is revealed before the blackjack check
+        standing = in_play & ~player_blackjack & (player_vals <= 21)
+        wins = standing & ((dealer_vals > 21) | (player_vals > dealer_vals))
+        pushes = standing & (player_vals == dealer_vals)
+
+        factors = np.where(player_blackjack, -self.rules.blackjack_payout, np.where(wins, -1, np.where(pushes, 0, 1)))
+        self.payouts *= factors
+
+        return self.payouts
+
+    def reset(self):
+        '''
+        Resets the hands and reshuffles shoes where necessary
+        '''
+        self.reset_hands()
+
+        remaining = self.shoe_size - self.cursors
+        self.create_shoes(np.flatnonzero(1 - (remaining / self.shoe_size) >= self.penetration))
@@ -1,28 +1,52 @@
 import random
-from collections import defaultdict
+import pickle
+import numpy as np
 from blackjack_model.game import BlackjackGame
+from blackjack_model.q_table import QTable
+from blackjack_model import state_encoding
+
+# Legal actions of every encoded state, used by the batched episodes
+LEGAL_ACTIONS = state_encoding.legal_action_mask()
+
+def load_agent(path):
+    '''
+    Returns the BlackjackAgent pickled at @path, converting agents saved with a dict Q-table
+
+    :param path: path to the pickled agent
+    '''
+    with open(path, "rb") as f:
+        return pickle.load(f)
 
 class BlackjackAgent:
     '''
     Blackjack AI Agent trained by Q-learning where state is a tuple of the form:
-    (player_hand_val, is_soft, dealer_hand_val, can_split, can_double, can_act, true_count)
+    (player_hand_val, is_soft, dealer_hand_val, can_split, can_double, can_act, true_count, can_surrender)
     '''
-    def __init__(self, alpha=0.01, epsilon=1.0, gamma=0.999):
+    def __init__(self, alpha=0.01, epsilon=1.0, gamma=0.999, rules=None):
         '''
         :param alpha: Learning rate
         :param epsilon: Random choice probability
         :param gamma: Discount factor
+        :param rules: Rules of the game the agent learns, defaults to Rules()
         '''
-        self.q_vals = defaultdict(float)
+        self.q_vals = QTable()
         self.alpha = alpha
         self.epsilon = epsilon
         self.gamma = gamma
-        self.game = BlackjackGame()
+        self.game = BlackjackGame(rules=rules)
         self.epsilon_min = 0.01
         self.epsilon_decay = 0.99999999
         self.alpha_min = 0.0001
         self.alpha_decay = 0.99999999
 
+    def __setstate__(self, state):
+        '''
+        Restores a pickled agent, converting a dict Q-table keyed by (state, action) to a QTable
+        '''
+        if isinstance(state['q_vals'], dict):
+            state['q_vals'] = QTable.from_dict(state['q_vals'])
+        self.__dict__.update(state)
+
     def get_q_val(self, state, action):
         '''
         Returns Q(state, action)
@@ -30,9 +54,7 @@ class BlackjackAgent:
         :param state: current state we're in
         :param action: action we're taking from that state
         '''
-        if (state, action) in self.q_vals:
-            return self.q_vals[(state, action)]
-        return 0.0
+        return self.q_vals.get(state, action)
     
     def compute_max_q_val(self, state):
         '''
@@ -69,6 +91,11 @@ class BlackjackAgent:
         if can_double:
             legal_actions.append('double')
 
+        # If we can surrender, add surrender
+        can_surrender = state[7]
+        if can_surrender:
+            legal_actions.append('surrender')
+
         return legal_actions
 
     def compute_best_action(self, state):
@@ -79,10 +106,11 @@ class BlackjackAgent:
         '''
         best_actions = [None]
         best_val = 0.0
+        q_vals = self.q_vals.get_row(state).tolist()
         
         # Iterate over actions and choose the best
         for action in self.get_legal_actions(state):
-            q_val = self.get_q_val(state, action)
+            q_val = q_vals[state_encoding.ACTION_INDEX[action]]
             
             # If we don't have a best action yet or q val is better, update the best action
             if best_actions[0] is None or q_val > best_val:
@@ -132,7 +160,7 @@ class BlackjackAgent:
         sampled_util = reward + (self.gamma * self.compute_max_q_val(next_state))
 
         # Update Q val
-        self.q_vals[(state, action)] = ((1 - learning_rate) * original_q) + (learning_rate * sampled_util)
+        self.q_vals.set(state, action, ((1 - learning_rate) * original_q) + (learning_rate * sampled_util))
 
     def get_policy(self, state):
         '''
@@ -179,6 +207,8 @@ class BlackjackAgent:
                 elif action == 'split':
                     is_split = True
                     game.split()
+                elif action == 'surrender':
+                    game.surrender()
                 
                 hand_over = game.get_hand_over()
                 next_state = game.get_state()
@@ -211,4 +241,137 @@ class BlackjackAgent:
 
         # Update epsilon and alpha
         self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
-        self.alpha = max(self.alpha_min, self.alpha * self.alpha_decay)
\ No newline at end of file
+        self.alpha = max(self.alpha_min, self.alpha * self.alpha_decay)
+
+    def run_batch_episodes(self, batch_game, num_rounds=1):
+        '''
+        Runs batched episodes of blackjack for Q-learning. Each round plays one hand on every
+        table of @batch_game, so @num_rounds * batch_game.num_tables episodes are run in total.
+
+        :param batch_game: BatchBlackjackGame to play on
+        :param num_rounds: number of rounds to play
+        '''
+        for _ in range(num_rounds):
+            self.run_batch_episode(batch_game)
+
+    def run_batch_episode(self, batch_game):
+        '''
+        Runs one hand of blackjack on every table of @batch_game for Q-learning, the batched
+        equivalent of run_episode
+
+        :param batch_game: BatchBlackjackGame to play on
+        '''
+        game = batch_game
+        rng = game.rng
+
+        # Stores (state, action, terminal_state) per table and hand to compute Q-vals with payoffs
+        terminal_values = []
+
+        # Deal player and dealer, tables with a dealer blackjack don't play
+        game.deal_hands()
+
+        # Play every table until all of their hands are over
+        tables = game.get_playing_tables()
+        while tables.size:
+            states = state_encoding.encode_state(*game.get_states(tables))
+            hands = game.current_hands[tables]
+
+            # Perform an action
+            actions = self.get_batch_actions(states, rng)
+            game.step(tables, actions)
+
+            hand_over = game.hand_over[tables]
+            next_states = state_encoding.encode_state(*game.get_states(tables))
+
+            # Update our q-values for hands that are still going
+            ongoing = ~hand_over
+            update_states = [states[ongoing]]
+            update_actions = [actions[ongoing]]
+            update_next_states = [next_states[ongoing]]
+
+            # If split use next hand as well for the calculation
+            is_split = actions == state_encoding.ACTION_INDEX['split']
+            if is_split.any():
+                update_states.append(states[is_split])
+                update_actions.append(actions[is_split])
+                update_next_states.append(state_encoding.encode_state(*game.get_states(tables[is_split], offset=1)))
+
+            update_states = np.concatenate(update_states)
+            self.batch_update(update_states, np.concatenate(update_actions), np.concatenate(update_next_states),
+                              np.zeros(len(update_states)))
+
+            # Hands that ended are updated once the payouts are known
+            terminal_values.append((tables[hand_over], hands[hand_over], states[hand_over],
+                                    actions[hand_over], next_states[hand_over]))
+
+            # Evaluate if the hand ended
+            game.update_current_hands(tables)
+            tables = game.get_playing_tables()
+
+        # Evaluate payouts after playing dealer if needed
+        payouts = game.evaluate_hands()
+
+        if terminal_values:
+            tables, hands, states, actions, next_states = (np.concatenate(values) for values in zip(*terminal_values))
+
+            # Update state based on dealer action
+            self.batch_update(states, actions, next_states, payouts[tables, hands])
+
+        # Reset game to prepare for new hands
+        game.reset()
+
+        # Update epsilon and alpha once per episode played
+        self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay ** game.num_tables)
+        self.alpha = max(self.alpha_min, self.alpha * self.alpha_decay ** game.num_tables)
+
+    def get_batch_actions(self, states, rng):
+        '''
+        Returns an array of action indices chosen with an epsilon-greedy algorithm for each of
+        @states, breaking ties between best actions randomly
+
+        :param states: encoded states we're computing actions from
+        :param rng: numpy random generator
+        '''
+        legal_actions = LEGAL_ACTIONS[states]
+
+        # Mark the best legal actions of each state
+        q_vals = np.where(legal_actions, self.q_vals.values[states], -np.inf)
+        best_actions = q_vals == q_vals.max(axis=1, keepdims=True)
+
+        # With probability epsilon choose among all legal actions, otherwise the best ones
+        explore = rng.random(len(states)) <= self.epsilon
+        choices = np.where(explore[:, None], legal_actions, best_actions)
+
+        # Pick uniformly among the choices
+        return np.argmax((1 - rng.random(choices.shape)) * choices, axis=1)
+
+    def batch_update(self, states, actions, next_states, rewards):
+        '''
+        Updates the q value table with a batch of transitions. Repeated (state, action) pairs
+        are combined as if their updates were applied one after another with the mean sample.
+
+        :param states: encoded states we start in
+        :param actions: action indices we take from @states
+        :param next_states: encoded states we end up in
+        :param rewards: rewards we get for entering @next_states
+        '''
+        if not len(states):
+            return
+
+        # Compute sampled Q-state utilities, states without legal actions are worth 0
+        q_array = self.q_vals.values
+        next_q_vals = np.where(LEGAL_ACTIONS[next_states], q_array[next_states], -np.inf).max(axis=1)
+        next_q_vals[np.isneginf(next_q_vals)] = 0.0
+        sampled_utils = rewards + (self.gamma * next_q_vals)
+
+        # Combine repeated (state, action) pairs
+        flat_q = q_array.reshape(-1)
+        keys = states * state_encoding.NUM_ACTIONS + actions
+        updated, inverse, repeats = np.unique(keys, return_inverse=True, return_counts=True)
+        mean_utils = np.bincount(inverse, weights=sampled_utils) / repeats
+
+        # Update Q vals
+        learning_rate = 1 - (1 - self.alpha) ** repeats
+        flat_q[updated] += learning_rate * (mean_utils - flat_q[updated])
+        if self.q_vals.visits is not None:
+            self.q_vals.visits.reshape(-1)[updated] += repeats
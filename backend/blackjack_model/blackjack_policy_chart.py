@@ -1,125 +1,196 @@
-import pickle
-from blackjack_model.blackjack_agent import BlackjackAgent
-from blackjack_model.game import BlackjackGame
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
+import argparse
+import multiprocessing
 import numpy as np
-import pandas as pd
-
-# Modify these parameters to get different policy charts
-TRUE_COUNT = 0
-IS_SOFT = False
-IS_SPLIT = False
-
-# Load agent
-with open("blackjack_model/blackjack_agent.pkl", "rb") as f:
-    blackjack_agent = pickle.load(f)
-
-ACTION_TO_NUM = {
-    "stand": 0,
-    "hit": 1,
-    "double": 2,
-    "split": 3
-}
+from blackjack_model import state_encoding
+from blackjack_model.model_file import load_policy_table
 
-NUM_TO_ACTION = {
-    0: "S",
-    1: "H",
-    2: "D",
-    3: "SP"
-}
+# Pickled agent, model file from convert_model.py, or policy table from export_policy.py or solve_policy.py
+MODEL_PATH = "blackjack_model/blackjack_agent.pkl"
+OUTPUT_DIR = "blackjack_model/charts"
 
-SPLIT_ACTION_TO_NUM = {
-    "stand": 0,
-    "hit": 0,
-    "double": 0,
-    "split": 1
-}
+CHART_KINDS = ('hard', 'soft', 'pair')
+TRUE_COUNTS = list(range(state_encoding.TRUE_COUNT_MIN, state_encoding.TRUE_COUNT_MIN + state_encoding.TRUE_COUNTS))
 
-NUM_TO_SPLIT = {
-    0: "N",
-    1: "Y",
+CHART_TITLES = {
+    'hard': "Hard Totals",
+    'soft': "Soft Totals",
+    'pair': "Pair Splitting",
 }
 
-def get_player_dealer_totals(is_soft=False, is_split=False):
+# Labels and colors of actions, in state_encoding.ACTIONS order
+ACTION_LABELS = ['H', 'S', 'SP', 'D', 'R']
+ACTION_COLORS = ['#e8554e', '#f6d04d', '#5b8def', '#6cc46c', '#b4b4b4']
+
+# Pair charts only show whether to split
+SPLIT_LABELS = ['N', 'Y']
+SPLIT_COLORS = ['#f6d04d', '#5b8def']
+
+DEALER_VALS = list(range(2, 12))
+
+def get_player_rows(kind):
+    '''
+    Returns a tuple of lists as:
+    (row labels, player hand values, whether each value is soft)
+    for the rows of a chart of @kind
+
+    :param kind: one of CHART_KINDS
+    '''
+    if kind == 'hard':
+        values = list(range(7, 18))
+        return ([str(value) for value in values], values, [False] * len(values))
+    if kind == 'soft':
+        values = list(range(13, 21))
+        return ([f"A,{value - 11}" for value in values], values, [True] * len(values))
+
+    # Pairs of 2s to 10s, then aces, which are a soft 12
+    cards = list(range(2, 11))
+    labels = [f"{card},{card}" for card in cards] + ["A,A"]
+    return (labels, [card * 2 for card in cards] + [12], [False] * len(cards) + [True])
+
+def get_chart_actions(policy, kind, true_counts=TRUE_COUNTS, can_surrender=False):
     '''
-    Returns a tuple where the first index is a list representing the spread of player hand 
-    values based on @is_soft and @is_split, and the second index is a list representing 
-    the spread of dealer hand values.
-    
-    :param is_soft: whether the player hand value is soft or not
-    :param is_split: whether the player hand value is splittable or not
+    Returns an array of shape (len(@true_counts), rows, len(DEALER_VALS)) with the action index of
+    every cell of the charts of @kind, looked up in one vectorized pass
+
+    :param policy: PolicyTable
+    :param kind: one of CHART_KINDS
+    :param true_counts: true counts to chart
+    :param can_surrender: whether first two cards can surrender, for rules with surrender
     '''
-    player_vals = range(7, 18)
-    dealer_vals = range(2, 12)
-
-    # If considering soft_hands, we only care about possible soft values
-    if is_soft:
-        player_vals = range(13, 21)
-    elif is_split:
-        player_vals = range(4, 24, 2)
-    
-    return (list(player_vals), list(dealer_vals))
-
-def generate_policy(is_soft=False, is_split=False, true_count=0):
+    _, values, is_soft = get_player_rows(kind)
+
+    # Broadcast every (true count, player hand, dealer card) cell of the charts
+    true_count = np.array(true_counts)[:, None, None]
+    player_val = np.array(values)[None, :, None]
+    soft = np.array(is_soft)[None, :, None]
+    dealer_val = np.array(DEALER_VALS)[None, None, :]
+
+    indices = state_encoding.encode_state(player_val, soft, dealer_val, kind == 'pair', True, True, true_count, can_surrender)
+    return policy.actions[indices]
+
+def render_chart(task):
     '''
-    Returns a tuple, where each entry is a numpy array. The first entry is used to map player
-    and dealer hand values to actions represented as ints. The second entry is a labeled version of the
-    previous array.
-    
-    :param is_soft: whether or not this is for soft hand values
-    :param is_split: whether or not this is for splittable hand
-    :param true_count: the true count we're checking the policy for
+    Renders a chart to each of the formats and returns the list of file names
+
+    :param task: tuple of (kind, true count, action index array of the chart, output directory, formats)
     '''
-    totals = get_player_dealer_totals(is_soft, is_split)
-    player_totals = totals[0]
-    dealer_totals = totals[1]
-
-    policy = np.zeros((len(player_totals), len(dealer_totals)))
-    labeled_policy = np.empty(policy.shape, dtype=object)
-
-    # Generate our numpy arrays
-    for i, player_val in enumerate(player_totals):
-        for j, dealer_val in enumerate(dealer_totals):
-            if not is_split:
-                policy[i, j] = ACTION_TO_NUM[blackjack_agent.get_policy((player_val, is_soft, dealer_val, False, True, True, true_count))]
-                labeled_policy[i, j] = NUM_TO_ACTION[int(policy[i, j])]
-            else:
-                # Handle splitting aces
-                if i == 22:
-                    policy[i, j] = SPLIT_ACTION_TO_NUM[blackjack_agent.get_policy((12, True, dealer_val, True, True, True, true_count))]
-                else:
-                    policy[i, j] = SPLIT_ACTION_TO_NUM[blackjack_agent.get_policy((player_val, False, dealer_val, True, True, True, true_count))]
-                labeled_policy[i, j] = NUM_TO_SPLIT[int(policy[i, j])]
-    
-    return (policy, labeled_policy)
-
-def generate_heat_map(is_soft, is_split, true_count, policy, labeled_policy):
+    # Import in the worker so rendering is headless and the main process doesn't need a display
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import ListedColormap
+
+    kind, true_count, actions, output_dir, formats = task
+    labels, _, _ = get_player_rows(kind)
+
+    if kind == 'pair':
+        values = (actions == state_encoding.ACTION_INDEX['split']).astype(int)
+        cell_labels, colors = SPLIT_LABELS, SPLIT_COLORS
+    else:
+        values = actions
+        cell_labels, colors = ACTION_LABELS, ACTION_COLORS
+
+    fig, ax = plt.subplots(figsize=(8, 0.45 * len(labels) + 1.5))
+    ax.imshow(values, cmap=ListedColormap(colors), vmin=0, vmax=len(colors) - 1, aspect="auto")
+
+    for i in range(values.shape[0]):
+        for j in range(values.shape[1]):
+            ax.text(j, i, cell_labels[values[i, j]], ha="center", va="center")
+
+    # Black grid lines between cells
+    ax.set_xticks(np.arange(len(DEALER_VALS)), labels=[str(value) if value < 11 else "A" for value in DEALER_VALS])
+    ax.set_yticks(np.arange(len(labels)), labels=labels)
+    ax.set_xticks(np.arange(len(DEALER_VALS) + 1) - 0.5, minor=True)
+    ax.set_yticks(np.arange(len(labels) + 1) - 0.5, minor=True)
+    ax.grid(which="minor", color="black", linewidth=2)
+    ax.tick_params(which="minor", length=0)
+
+    ax.set_title(f"Blackjack Strategy Chart, {CHART_TITLES[kind]}, True Count: {true_count}")
+    ax.set_xlabel("Dealer Hand Value")
+    ax.set_ylabel("Player Hand")
+
+    # Fixed margins instead of tight_layout, which draws the figure an extra time
+    height = fig.get_figheight()
+    fig.subplots_adjust(left=0.1, right=0.98, top=1 - 0.5 / height, bottom=0.6 / height)
+
+    names = []
+    for chart_format in formats:
+        name = f"{kind}_tc{true_count:+d}.{chart_format}"
+        fig.savefig(os.path.join(output_dir, name))
+        names.append(name)
+    plt.close(fig)
+
+    return names
+
+def write_index(output_dir, charts):
     '''
-    Generates a heat map for optimal player actions based on the player and dealer hand values.
-    Assumes a fixed @true_count value.
-    
-    :param is_soft: whether this chart is for soft values
-    :param is_split: whether this chart is for split values
-    :param true_count: the true count being considered
-    :param policy: AI's estimated policy
-    :param labeled_policy: labeled version of the estimated policy
+    Writes index.html to @output_dir, with a section for each chart kind showing its chart for
+    every true count
+
+    :param output_dir: directory holding the charts
+    :param charts: dict of (kind, true count) to the list of file names of that chart
     '''
-    totals = get_player_dealer_totals(is_soft, is_split)
-    player_totals = totals[0]
-    dealer_totals = totals[1]
+    lines = ["<!DOCTYPE html>", "<html>", "<head><meta charset=\"utf-8\"><title>Blackjack Strategy Charts</title></head>", "<body>",
+             "<h1>Blackjack Strategy Charts</h1>"]
+
+    for kind in CHART_KINDS:
+        kind_charts = [(true_count, names) for (chart_kind, true_count), names in sorted(charts.items()) if chart_kind == kind]
+        if not kind_charts:
+            continue
 
-    # Convert to dataframes
-    policy_df = pd.DataFrame(policy, index=player_totals, columns=dealer_totals)
-    labeled_df = pd.DataFrame(labeled_policy, index=player_totals, columns=dealer_totals)
+        lines.append(f"<h2>{CHART_TITLES[kind]}</h2>")
+        for true_count, names in kind_charts:
+            links = " ".join(f"<a href=\"{name}\">{name.rsplit('.', 1)[1]}</a>" for name in names)
+            lines.append(f"<h3>True Count {true_count:+d} ({links})</h3>")
+            lines.append(f"<img src=\"{names[0]}\" alt=\"{CHART_TITLES[kind]}, true count {true_count}\">")
 
-    # Plot
-    sns.heatmap(data=policy_df, fmt="", annot=labeled_df, linewidths=2, linecolor="black", cbar=False)
-    plt.title("Blackjack Strategy Chart, Stand Soft 17, True Count: " + str(true_count))
-    plt.xlabel("Dealer Hand Value")
-    plt.ylabel("Player Hand Value")
-    plt.show()
+    lines.extend(["</body>", "</html>"])
 
-policy_vals, labeled_policy_vals = generate_policy(IS_SOFT, IS_SPLIT, TRUE_COUNT)
-generate_heat_map(IS_SOFT, IS_SPLIT, TRUE_COUNT, policy_vals, labeled_policy_vals)
+    with open(os.path.join(output_dir, "index.html"), "w") as f:
+        f.write("\n".join(lines) + "\n")
 
+def generate_charts(policy, output_dir, formats=("png",), true_counts=TRUE_COUNTS, kinds=CHART_KINDS, can_surrender=False,
+                    num_workers=None):
+    '''
+    Renders the charts of every kind and true count to @output_dir across a process pool, writes
+    an HTML index of them and returns a dict of (kind, true count) to the chart's file names
+
+    :param policy: PolicyTable
+    :param output_dir: directory charts are written to
+    :param formats: image formats, like "png" or "svg"
+    :param true_counts: true counts to chart
+    :param kinds: chart kinds from CHART_KINDS
+    :param can_surrender: whether first two cards can surrender, for rules with surrender
+    :param num_workers: number of processes, defaults to the number of CPUs
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+
+    tasks = []
+    for kind in kinds:
+        actions = get_chart_actions(policy, kind, true_counts, can_surrender)
+        for i, true_count in enumerate(true_counts):
+            tasks.append((kind, true_count, actions[i], output_dir, formats))
+
+    with multiprocessing.Pool(num_workers) as pool:
+        names = pool.map(render_chart, tasks)
+
+    charts = {(kind, true_count): chart_names for (kind, true_count, _, _, _), chart_names in zip(tasks, names)}
+    write_index(output_dir, charts)
+
+    return charts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render strategy charts of a policy for every true count")
+    parser.add_argument("--model", default=MODEL_PATH, help="agent .pkl, model .bjq or policy .npy")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="directory for the charts and index.html")
+    parser.add_argument("--formats", nargs="+", default=["png"], choices=["png", "svg"])
+    parser.add_argument("--true-counts", nargs="+", type=int, default=TRUE_COUNTS, choices=TRUE_COUNTS)
+    parser.add_argument("--kinds", nargs="+", default=list(CHART_KINDS), choices=CHART_KINDS)
+    parser.add_argument("--surrender", action="store_true", help="chart first two cards that can surrender")
+    parser.add_argument("--workers", type=int, help="number of processes, defaults to the number of CPUs")
+    args = parser.parse_args()
+
+    charts = generate_charts(load_policy_table(args.model), args.output, args.formats, args.true_counts, args.kinds,
+                             args.surrender, args.workers)
+    print(f"Rendered {len(charts)} charts to {args.output}, see {os.path.join(args.output, 'index.html')}")
@@ -0,0 +1,16 @@
+import argparse
+from blackjack_model.model_file import MODEL_EXTENSION, agent_to_model, model_to_agent, read_header
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Convert between pickled agents and {MODEL_EXTENSION} model files")
+    parser.add_argument("input", help=f"pickled agent, or {MODEL_EXTENSION} model file")
+    parser.add_argument("output", help=f"{MODEL_EXTENSION} model file, or pickled agent")
+    args = parser.parse_args()
+
+    # Convert in the direction given by the input's extension
+    if args.input.endswith(MODEL_EXTENSION):
+        model_to_agent(args.input, args.output)
+    else:
+        agent_to_model(args.input, args.output)
+        header, _ = read_header(args.output)
+        print(f"Saved {header['shape'][0]} states trained with rules {header['rules']} to {args.output}")
@@ -0,0 +1,169 @@
+'''
+Exact probability distributions of the dealer's final hand value
+
+Distributions are returned as tuples of probabilities in the order of DEALER_TOTALS, and are
+conditioned on the dealer not having blackjack, since players only act when the dealer doesn't.
+'''
+from functools import lru_cache
+
+ACE = 1
+
+# Final dealer values, where 22 represents a bust
+DEALER_TOTALS = (17, 18, 19, 20, 21, 22)
+
+# Number of cards of each value from 1 (ace) to 10 in a single deck
+DECK_COMPOSITION = (4, 4, 4, 4, 4, 4, 4, 4, 4, 16)
+
+# Maximum number of (up card, composition, rules) distributions kept in the cache
+CACHE_SIZE = 4096
+
+def get_dealer_value(total, has_ace):
+    '''
+    Returns a tuple as:
+    (the value of the dealer hand, is soft)
+    If the value is 22, the dealer busted
+
+    :param total: hard total of the hand, counting aces as 1
+    :param has_ace: whether the hand holds an ace
+    '''
+    if has_ace and total + 10 <= 21:
+        return (total + 10, True)
+    if total > 21:
+        return (22, False)
+    return (total, False)
+
+def is_dealer_done(total, has_ace, hits_soft_17):
+    '''
+    Returns whether the dealer stops drawing, along with the final value if so
+
+    :param total: hard total of the hand, counting aces as 1
+    :param has_ace: whether the hand holds an ace
+    :param hits_soft_17: whether the dealer hits soft 17
+    '''
+    value, is_soft = get_dealer_value(total, has_ace)
+
+    if value > 17 or (value == 17 and not (hits_soft_17 and is_soft)):
+        return (True, value)
+    return (False, value)
+
+def get_hidden_cards(up_card):
+    '''
+    Returns the hidden card values that are possible when the dealer doesn't have blackjack
+
+    :param up_card: value of the dealer's shown card
+    '''
+    if up_card == ACE:
+        return range(1, 10)
+    if up_card == 10:
+        return range(2, 11)
+    return range(1, 11)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def get_dealer_probs(up_card, composition, hits_soft_17=False):
+    '''
+    Returns the probability of each of DEALER_TOTALS when the dealer draws without replacement
+    from the remaining shoe. If the shoe runs out the dealer continues drawing from a freshly
+    shuffled deck, as BlackjackGame reshuffles an empty shoe.
+
+    :param up_card: value of the dealer's shown card, 1 for an ace
+    :param composition: tuple with the number of unseen cards of each value from 1 (ace) to 10,
+                        including the dealer's hidden card
+    :param hits_soft_17: whether the dealer hits soft 17
+    '''
+    final_probs = [0.0] * len(DEALER_TOTALS)
+
+    @lru_cache(maxsize=None)
+    def play(total, has_ace, remaining):
+        '''
+        Returns the final value distribution of a dealer hand drawing from @remaining
+        '''
+        done, value = is_dealer_done(total, has_ace, hits_soft_17)
+
+        probs = [0.0] * len(DEALER_TOTALS)
+        if done:
+            probs[value - 17] = 1.0
+            return probs
+
+        num_cards = sum(remaining)
+        if num_cards == 0:
+            remaining = DECK_COMPOSITION
+            num_cards = sum(remaining)
+
+        for card in range(1, 11):
+            count = remaining[card - 1]
+            if count:
+                next_probs = play(total + card, has_ace or card == ACE, take_card(remaining, card))
+                for i, prob in enumerate(next_probs):
+                    probs[i] += prob * count / num_cards
+        return probs
+
+    # The hidden card can't complete a blackjack
+    hidden_cards = [card for card in get_hidden_cards(up_card) if composition[card - 1]]
+    no_blackjack = sum(composition[card - 1] for card in hidden_cards)
+
+    for card in hidden_cards:
+        hand_probs = play(up_card + card, up_card == ACE or card == ACE, take_card(composition, card))
+        for i, prob in enumerate(hand_probs):
+            final_probs[i] += prob * composition[card - 1] / no_blackjack
+
+    return tuple(final_probs)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def get_infinite_deck_probs(up_card, card_probs, hits_soft_17=False):
+    '''
+    Returns the probability of each of DEALER_TOTALS when every card is drawn independently
+    with fixed probabilities, as in an infinite deck
+
+    :param up_card: value of the dealer's shown card, 1 for an ace
+    :param card_probs: tuple with the probability of drawing each card value, indexed by value (index 0 unused)
+    :param hits_soft_17: whether the dealer hits soft 17
+    '''
+    @lru_cache(maxsize=None)
+    def play(total, has_ace):
+        '''
+        Returns the final value distribution of a dealer hand
+        '''
+        done, value = is_dealer_done(total, has_ace, hits_soft_17)
+
+        probs = [0.0] * len(DEALER_TOTALS)
+        if done:
+            probs[value - 17] = 1.0
+            return probs
+
+        for card in range(1, 11):
+            next_probs = play(total + card, has_ace or card == ACE)
+            for i, prob in enumerate(next_probs):
+                probs[i] += prob * card_probs[card]
+        return probs
+
+    # The hidden card can't complete a blackjack
+    hidden_cards = get_hidden_cards(up_card)
+    no_blackjack = sum(card_probs[card] for card in hidden_cards)
+
+    final_probs = [0.0] * len(DEALER_TOTALS)
+    for card in hidden_cards:
+        hand_probs = play(up_card + card, up_card == ACE or card == ACE)
+        for i, prob in enumerate(hand_probs):
+            final_probs[i] += prob * card_probs[card] / no_blackjack
+
+    return tuple(final_probs)
+
+def take_card(composition, card):
+    '''
+    Returns @composition with one card of value @card removed
+
+    :param composition: tuple of card counts for values 1 to 10
+    :param card: value of the removed card
+    '''
+    return composition[:card - 1] + (composition[card - 1] - 1,) + composition[card:]
+
+def get_composition(cards):
+    '''
+    Returns the composition tuple of a collection of card values
+
+    :param cards: iterable of card values from 1 (ace) to 10
+    '''
+    counts = [0] * 10
+    for card in cards:
+        counts[card - 1] += 1
+    return tuple(counts)
@@ -0,0 +1,289 @@
+'''
+Dynamic-programming solver for the expected value of every action in every agent state
+
+For each binned true count the remaining shoe is represented by its composition, where the
+true count shifts the share of low (2-6) and high (10, A) cards. Cards are drawn independently
+from that composition, as from an infinite deck, so the expected values are an infinite-deck
+approximation that ignores the cards already drawn in the round. They follow the same rules and
+payouts as BlackjackGame under the given Rules: players act only when the dealer doesn't have
+blackjack, 2 card 21s are paid as blackjack (including after splits), and split hands are played
+one after another. States that can't double don't tell a 2 card hand split without doubling after
+splitting from a longer hand, so standing on 21 in them is valued as a normal stand. Standing is
+still the best action there, and get_split_ev values the split hands with the blackjack payout.
+'''
+import numpy as np
+from blackjack_model import state_encoding
+from blackjack_model.dealer_outcomes import DEALER_TOTALS, get_infinite_deck_probs
+from blackjack_model.q_table import QTable
+from blackjack_model.rules import Rules
+
+ACE = 1
+
+# Number of cards of each value (1 to 10, index 0 unused) in a single deck
+DECK_COMPOSITION = (0, 4, 4, 4, 4, 4, 4, 4, 4, 4, 16)
+
+LOW_CARDS = (2, 3, 4, 5, 6)
+HIGH_CARDS = (ACE, 10)
+
+BUST = 22
+
+# Expected value of surrendering
+SURRENDER_EV = -0.5
+
+def get_card_probs(true_count):
+    '''
+    Returns a tuple of the probability of drawing each card value (index 0 unused) from a shoe
+    with the given true count. Each remaining deck holds @true_count more high cards than low cards.
+
+    :param true_count: binned true count
+    '''
+    counts = list(DECK_COMPOSITION)
+
+    # Every deck has 20 low and 20 high cards, shift half the true count between them
+    for card in LOW_CARDS:
+        counts[card] *= 1 - true_count / 40
+    for card in HIGH_CARDS:
+        counts[card] *= 1 + true_count / 40
+
+    total = sum(counts)
+    return tuple(count / total for count in counts)
+
+def add_card(total, has_ace, card):
+    '''
+    Returns the (hard total, has ace) of a hand after adding @card
+
+    :param total: hard total of the hand, counting aces as 1
+    :param has_ace: whether the hand holds an ace
+    :param card: value of the added card
+    '''
+    return (total + card, has_ace or card == ACE)
+
+def get_hand_value(total, has_ace):
+    '''
+    Returns a tuple as:
+    (the value of a hand, is soft)
+    If the value is 22, the hand busted
+
+    :param total: hard total of the hand, counting aces as 1
+    :param has_ace: whether the hand holds an ace
+    '''
+    if has_ace and total + 10 <= 21:
+        return (total + 10, True)
+    if total > 21:
+        return (BUST, False)
+    return (total, False)
+
+def get_stand_ev(value, dealer_probs):
+    '''
+    Returns the expected value of standing on @value
+
+    :param value: value of the player hand
+    :param dealer_probs: dealer final value probabilities in the order of DEALER_TOTALS
+    '''
+    if value > 21:
+        return -1.0
+
+    ev = 0.0
+    for dealer_value, prob in zip(DEALER_TOTALS, dealer_probs):
+        if dealer_value > 21 or value > dealer_value:
+            ev += prob
+        elif dealer_value > value:
+            ev -= prob
+    return ev
+
+class HandSolver:
+    '''
+    Computes action expected values for one dealer up card and true count
+    '''
+    def __init__(self, up_card, card_probs, rules=None):
+        '''
+        :param up_card: value of the dealer's shown card
+        :param card_probs: probability of drawing each card value, from get_card_probs
+        :param rules: Rules of the table, defaults to Rules()
+        '''
+        self.card_probs = card_probs
+        self.rules = rules if rules is not None else Rules()
+        self.dealer_probs = get_infinite_deck_probs(up_card, card_probs, self.rules.dealer_hits_soft_17)
+        self.stand_evs = {value: get_stand_ev(value, self.dealer_probs) for value in range(2, BUST + 1)}
+
+        # Memoized values of hands with 3 or more cards, keyed by (hard total, has ace)
+        self.hand_values = {}
+
+    def draws(self, total, has_ace):
+        '''
+        Yields (probability, hard total, has ace) for each card that can be drawn to a hand
+
+        :param total: hard total of the hand, counting aces as 1
+        :param has_ace: whether the hand holds an ace
+        '''
+        for card in range(1, 11):
+            yield (self.card_probs[card],) + add_card(total, has_ace, card)
+
+    def get_hit_ev(self, total, has_ace):
+        '''
+        Returns the expected value of hitting and then playing optimally
+
+        :param total: hard total of the hand, counting aces as 1
+        :param has_ace: whether the hand holds an ace
+        '''
+        return sum(prob * self.get_optimal_ev(next_total, next_ace) for prob, next_total, next_ace in self.draws(total, has_ace))
+
+    def get_double_ev(self, total, has_ace):
+        '''
+        Returns the expected value of doubling down
+
+        :param total: hard total of the hand, counting aces as 1
+        :param has_ace: whether the hand holds an ace
+        '''
+        return 2 * sum(prob * self.stand_evs[get_hand_value(next_total, next_ace)[0]]
+                       for prob, next_total, next_ace in self.draws(total, has_ace))
+
+    def get_optimal_ev(self, total, has_ace):
+        '''
+        Returns the expected value of a hand with 3 or more cards under optimal play
+
+        :param total: hard total of the hand, counting aces as 1
+        :param has_ace: whether the hand holds an ace
+        '''
+        value = get_hand_value(total, has_ace)[0]
+        if value == BUST:
+            return -1.0
+
+        key = (total, has_ace)
+        if key not in self.hand_values:
+            self.hand_values[key] = max(self.stand_evs[value], self.get_hit_ev(total, has_ace))
+        return self.hand_values[key]
+
+    def get_two_card_evs(self, total, has_ace):
+        '''
+        Returns a dict of the expected values of hitting, standing and doubling on a 2 card hand
+
+        :param total: hard total of the hand, counting aces as 1
+        :param has_ace: whether the hand holds an ace
+        '''
+        value, is_soft = get_hand_value(total, has_ace)
+
+        # 2 card 21s are paid as blackjack
+        stand_ev = self.rules.blackjack_payout if value == 21 and is_soft else self.stand_evs[value]
+
+        return {'hit': self.get_hit_ev(total, has_ace), 'stand': stand_ev, 'double': self.get_double_ev(total, has_ace)}
+
+    def get_split_hand_ev(self, total, has_ace):
+        '''
+        Returns the expected value of a 2 card hand made by splitting under optimal play, without resplitting
+
+        :param total: hard total of the hand, counting aces as 1
+        :param has_ace: whether the hand holds an ace
+        '''
+        evs = self.get_two_card_evs(total, has_ace)
+        if not self.rules.double_after_split:
+            del evs['double']
+        return max(evs.values())
+
+    def get_split_ev(self, card):
+        '''
+        Returns the expected value of splitting a pair of @card and then playing optimally,
+        resplitting up to the rules' hand limit
+
+        :param card: value of the paired card
+        '''
+        max_hands = self.rules.max_hands
+        if max_hands is not None and max_hands < 2:
+            return -np.inf
+
+        pair_ev = self.get_split_hand_ev(2 * card, card == ACE)
+        split_prob = self.card_probs[card]
+
+        # Expected value of a split hand that doesn't draw another @card
+        other_ev = 0.0
+        for drawn in range(1, 11):
+            if drawn != card:
+                other_ev += self.card_probs[drawn] * self.get_split_hand_ev(*add_card(card, card == ACE, drawn))
+
+        if max_hands is None:
+            # Each split hand is worth V = split_prob * max(pair_ev, split_ev) + other_ev, and split_ev = 2V
+            resplit_ev = 2 * other_ev / (1 - 2 * split_prob)
+            if resplit_ev > pair_ev:
+                return resplit_ev
+            return 2 * (split_prob * pair_ev + other_ev)
+
+        # Expected value of playing @num_hands split hands in turn with @splits_left resplits allowed,
+        # where a hand drawing another @card either stands as a pair or is resplit
+        hand_values = {}
+
+        def play_split_hands(num_hands, splits_left):
+            if num_hands == 0:
+                return 0.0
+
+            key = (num_hands, splits_left)
+            if key not in hand_values:
+                rest_ev = play_split_hands(num_hands - 1, splits_left)
+                drawn_pair_ev = pair_ev + rest_ev
+                if splits_left:
+                    drawn_pair_ev = max(drawn_pair_ev, play_split_hands(num_hands + 1, splits_left - 1))
+
+                hand_values[key] = other_ev + (1 - split_prob) * rest_ev + split_prob * drawn_pair_ev
+            return hand_values[key]
+
+        return play_split_hands(2, max_hands - 2)
+
+def get_pair_card(player_val, is_soft):
+    '''
+    Returns the card value of the pair making up a splittable hand, None if no pair has that value
+
+    :param player_val: value of the hand
+    :param is_soft: whether the value is soft
+    '''
+    if is_soft:
+        return ACE if player_val == 12 else None
+    if player_val % 2 == 0 and 4 <= player_val <= 20:
+        return player_val // 2
+    return None
+
+def solve(rules=None):
+    '''
+    Returns a QTable holding the expected value of every legal action in every state. Actions
+    that can't be taken from a state, like splitting a hand that isn't a pair, are -inf.
+
+    :param rules: Rules of the table, defaults to Rules()
+    '''
+    q_table = QTable()
+    legal = state_encoding.legal_action_mask()
+
+    for true_count in range(state_encoding.TRUE_COUNT_MIN, state_encoding.TRUE_COUNT_MIN + state_encoding.TRUE_COUNTS):
+        card_probs = get_card_probs(true_count)
+
+        for dealer_val in range(state_encoding.DEALER_MIN, state_encoding.DEALER_MIN + state_encoding.DEALER_VALS):
+            solver = HandSolver(ACE if dealer_val == 11 else dealer_val, card_probs, rules)
+
+            for player_val in range(2, 22):
+                for is_soft in (False, True):
+                    if is_soft and player_val < 12:
+                        continue
+
+                    # Soft hands hold an ace counted as 11
+                    total = player_val - 10 if is_soft else player_val
+                    two_card_evs = solver.get_two_card_evs(total, is_soft)
+                    pair_card = get_pair_card(player_val, is_soft)
+                    split_ev = solver.get_split_ev(pair_card) if pair_card else -np.inf
+
+                    for can_split in (False, True):
+                        for can_double in (False, True):
+                            for can_surrender in (False, True):
+                                state = (player_val, is_soft, dealer_val, can_split, can_double, True, true_count, can_surrender)
+                                index = state_encoding.encode(state)
+
+                                # 2 card hands can double, the rest can only hit or stand
+                                if can_double:
+                                    evs = two_card_evs
+                                else:
+                                    evs = {'hit': solver.get_hit_ev(total, is_soft), 'stand': solver.stand_evs[player_val]}
+                                evs = dict(evs, split=split_ev, surrender=SURRENDER_EV)
+
+                                for action, ev in evs.items():
+                                    action_index = state_encoding.ACTION_INDEX[action]
+                                    if legal[index, action_index]:
+                                        q_table.values[index, action_index] = ev
+
+    q_table.values[~legal] = -np.inf
+    return q_table
@@ -0,0 +1,521 @@
+'''
+Q-learning episodes fused into a single compiled function
+
+run_episode crosses dozens of method calls and tuple allocations per hand. The kernel built by
+build_kernel plays the same episodes, with the same rules, payouts, state encoding and Q-learning
+update, as one loop over the shoe's int8 card array and the dense Q array. With Numba installed it's
+compiled with njit, otherwise (or with backend="python") the same code runs as plain Python.
+
+Random numbers are read from a block of uniforms in the order BlackjackAgent consumes them (one per
+epsilon check, one per random choice), so given the same stream and shoe the kernel makes the same
+decisions and Q-value updates as run_episode. Shoes are reshuffled by their Shoe between calls,
+and a shoe that runs out in the middle of a hand is reshuffled with the order its Shoe's generator
+would shuffle it in, so the kernel deals the same cards as BlackjackGame.
+'''
+import numpy as np
+from blackjack_model import state_encoding
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+BACKENDS = ('numba', 'python')
+
+# Action indices, in state_encoding.ACTIONS order
+HIT, STAND, SPLIT, DOUBLE, SURRENDER = range(state_encoding.NUM_ACTIONS)
+
+# Reasons run_episodes returns
+DONE = 0
+NEEDS_SHUFFLE = 1
+NEEDS_DRAWS = 2
+RESHUFFLED = 3
+
+# Uniforms generated at a time, and the fewest left before an episode starts
+DRAW_BLOCK_SIZE = 1 << 20
+DRAW_RESERVE = 4096
+
+def build_kernel(jit):
+    '''
+    Returns the run_episodes kernel with each of its functions wrapped by @jit
+
+    :param jit: decorator compiling a function, or leaving it as Python
+    '''
+    dealer_min = state_encoding.DEALER_MIN
+    dealer_vals = state_encoding.DEALER_VALS
+    true_count_min = state_encoding.TRUE_COUNT_MIN
+    true_counts = state_encoding.TRUE_COUNTS
+    num_actions = state_encoding.NUM_ACTIONS
+
+    @jit
+    def next_uniform(draws, draw_state):
+        '''
+        Returns the next uniform of the stream, wrapping around if it runs out
+        '''
+        u = draws[draw_state[0] % len(draws)]
+        draw_state[0] += 1
+        return u
+
+    @jit
+    def hand_value(total, aces):
+        '''
+        Returns (value, is soft) of a hand from its hard total and number of aces, 22 if busted
+        '''
+        if aces > 0 and total + 10 <= 21:
+            return (total + 10, True)
+        if total > 21:
+            return (22, False)
+        return (total, False)
+
+    @jit
+    def draw_card(cards, remaining, count_values, full_composition, shoe_state, initial_count, seen, shuffle_order):
+        '''
+        Returns the next card of the shoe, reshuffling an empty shoe into @shuffle_order
+        '''
+        if shoe_state[0] == len(cards):
+            cards[:] = cards[shuffle_order]
+            for value in range(len(remaining)):
+                remaining[value] = full_composition[value]
+            shoe_state[0] = 0
+            shoe_state[1] = initial_count
+            shoe_state[2] = 1
+
+        card = int(cards[shoe_state[0]])
+        shoe_state[0] += 1
+        remaining[card] -= 1
+        if seen:
+            shoe_state[1] += count_values[card]
+        return card
+
+    @jit
+    def get_state(h, hand_over, num_hands, totals, aces, lengths, first_cards, second_cards, dealer_total, dealer_aces,
+                  shoe_state, initial_count, size, max_hands, double_after_split, surrender):
+        '''
+        Returns the encoded state of hand @h, following BlackjackGame.get_state
+        '''
+        player_val, is_soft = hand_value(totals[h], aces[h])
+        dealer_val = hand_value(dealer_total, dealer_aces)[0]
+        can_act = not hand_over
+
+        can_split = can_act and lengths[h] == 2 and first_cards[h] == second_cards[h] and num_hands < max_hands
+        can_double = can_act and lengths[h] == 2 and (double_after_split or num_hands == 1)
+        can_surrender = can_act and surrender and num_hands == 1 and lengths[0] == 2
+
+        # Rounded and binned true count, following Shoe.get_true_count
+        cards_left = size - shoe_state[0]
+        true_count = 0
+        if cards_left > 0:
+            true_count = int(np.rint((shoe_state[1] - initial_count * cards_left / size) / (cards_left / 52)))
+        true_count = min(max(true_count, true_count_min), true_count_min + true_counts - 1)
+
+        index = player_val * 2 + is_soft
+        index = index * dealer_vals + (dealer_val - dealer_min)
+        index = index * 2 + can_split
+        index = index * 2 + can_double
+        index = index * 2 + can_act
+        index = index * true_counts + (true_count - true_count_min)
+        return index * 2 + can_surrender
+
+    @jit
+    def is_legal(state, action):
+        '''
+        Returns whether @action is legal in the encoded @state, following state_encoding.legal_action_mask
+        '''
+        if action == SURRENDER:
+            return state % 2 == 1
+        flags = state // 2 // true_counts
+        if action == HIT or action == STAND:
+            return flags % 2 == 1
+        if action == DOUBLE:
+            return (flags // 2) % 2 == 1
+        return (flags // 4) % 2 == 1
+
+    @jit
+    def best_action(q, state, draws, draw_state):
+        '''
+        Returns a best legal action of @state, -1 if there is none, breaking ties with one uniform
+        like BlackjackAgent.compute_best_action
+        '''
+        num_best = 0
+        best_val = 0.0
+        for action in range(num_actions):
+            if not is_legal(state, action):
+                continue
+            q_val = q[state, action]
+            if num_best == 0 or q_val > best_val:
+                best_val = q_val
+                num_best = 1
+            elif q_val == best_val:
+                num_best += 1
+
+        u = next_uniform(draws, draw_state)
+        if num_best == 0:
+            return -1
+
+        # Second pass to the chosen one of the tied actions, without allocating a list of them
+        chosen = int(u * num_best)
+        for action in range(num_actions):
+            if is_legal(state, action) and q[state, action] == best_val:
+                if chosen == 0:
+                    return action
+                chosen -= 1
+        return -1
+
+    @jit
+    def choose_action(q, state, epsilon, draws, draw_state):
+        '''
+        Returns an action chosen epsilon-greedily like BlackjackAgent.get_action
+        '''
+        if next_uniform(draws, draw_state) <= epsilon:
+            num_legal = 0
+            for action in range(num_actions):
+                if is_legal(state, action):
+                    num_legal += 1
+
+            chosen = int(next_uniform(draws, draw_state) * num_legal)
+            for action in range(num_actions):
+                if is_legal(state, action):
+                    if chosen == 0:
+                        return action
+                    chosen -= 1
+        return best_action(q, state, draws, draw_state)
+
+    @jit
+    def update(q, visits, track_visits, state, action, next_state, reward, alpha, gamma, draws, draw_state):
+        '''
+        Applies one Q-learning update like BlackjackAgent.update
+        '''
+        original_q = q[state, action]
+        next_action = best_action(q, next_state, draws, draw_state)
+        max_q = 0.0 if next_action < 0 else q[next_state, next_action]
+
+        sampled_util = reward + (gamma * max_q)
+        q[state, action] = ((1 - alpha) * original_q) + (alpha * sampled_util)
+        if track_visits:
+            visits[state, action] += 1
+
+    @jit
+    def run_episodes(q, visits, track_visits, cards, remaining, count_values, full_composition, shoe_state, initial_count,
+                     num_decks, penetration, dealer_hits, double_after_split, surrender, max_hands, blackjack_payout,
+                     params, draws, draw_state, shuffle_order, num_episodes):
+        '''
+        Runs up to @num_episodes episodes of Q-learning and returns (episodes played, reason for
+        returning): DONE, NEEDS_SHUFFLE once the shoe passes @penetration, NEEDS_DRAWS when fewer
+        than DRAW_RESERVE uniforms are left, or RESHUFFLED after an episode that ran out of cards.
+        @shoe_state holds the cursor, running count and whether the shoe was reshuffled, @params
+        the agent's epsilon, alpha, gamma, epsilon_min, epsilon_decay, alpha_min and alpha_decay,
+        and @draw_state the index of the next uniform in @draws.
+        '''
+        size = len(cards)
+        capacity = size // 2 + 2
+
+        # Per hand arrays, hands after a split are inserted after the hand that split
+        totals = np.zeros(capacity, dtype=np.int64)
+        aces = np.zeros(capacity, dtype=np.int64)
+        lengths = np.zeros(capacity, dtype=np.int64)
+        first_cards = np.zeros(capacity, dtype=np.int64)
+        second_cards = np.zeros(capacity, dtype=np.int64)
+        payouts = np.zeros(capacity)
+
+        # (state, action, terminal state) of each finished hand, updated once the payouts are known
+        terminal_states = np.zeros(capacity, dtype=np.int64)
+        terminal_actions = np.zeros(capacity, dtype=np.int64)
+        terminal_next_states = np.zeros(capacity, dtype=np.int64)
+
+        epsilon, alpha, gamma, epsilon_min, epsilon_decay, alpha_min, alpha_decay = (params[0], params[1], params[2], params[3],
+                                                                                   params[4], params[5], params[6])
+        played = 0
+        reason = DONE
+
+        while played < num_episodes:
+            if len(draws) - draw_state[0] < DRAW_RESERVE:
+                reason = NEEDS_DRAWS
+                break
+
+            num_hands = 1
+            current = 0
+            hand_over = False
+            surrendered = False
+            num_terminal = 0
+            totals[0] = 0
+            aces[0] = 0
+            lengths[0] = 0
+            payouts[0] = -1.0
+            dealer_total = 0
+            dealer_aces = 0
+            hidden_card = 0
+
+            # Deal player and dealer, the dealer's second card is hidden
+            for deal in range(4):
+                card = draw_card(cards, remaining, count_values, full_composition, shoe_state, initial_count, deal != 3,
+                                 shuffle_order)
+                if deal == 0 or deal == 2:
+                    if lengths[0] == 0:
+                        first_cards[0] = card
+                    else:
+                        second_cards[0] = card
+                    totals[0] += card
+                    aces[0] += 1 if card == 1 else 0
+                    lengths[0] += 1
+                elif deal == 1:
+                    dealer_total += card
+                    dealer_aces += 1 if card == 1 else 0
+                else:
+                    hidden_card = card
+
+            # Check for dealer blackjack
+            if hand_value(dealer_total + hidden_card, dealer_aces + (1 if hidden_card == 1 else 0))[0] != 21:
+                # Iterate over each player hand and let them play actions
+                while current < num_hands:
+                    # Add a card for recently split hands
+                    if lengths[current] == 1:
+                        card = draw_card(cards, remaining, count_values, full_composition, shoe_state, initial_count, True,
+                                         shuffle_order)
+                        second_cards[current] = card
+                        totals[current] += card
+                        aces[current] += 1 if card == 1 else 0
+                        lengths[current] += 1
+
+                    state = get_state(current, hand_over, num_hands, totals, aces, lengths, first_cards, second_cards,
+                                      dealer_total, dealer_aces, shoe_state, initial_count, size, max_hands, double_after_split, surrender)
+
+                    # Perform an action
+                    action = choose_action(q, state, epsilon, draws, draw_state)
+                    if action == HIT or action == DOUBLE:
+                        card = draw_card(cards, remaining, count_values, full_composition, shoe_state, initial_count, True,
+                                         shuffle_order)
+                        if lengths[current] == 1:
+                            second_cards[current] = card
+                        totals[current] += card
+                        aces[current] += 1 if card == 1 else 0
+                        lengths[current] += 1
+
+                        if action == DOUBLE:
+                            payouts[current] *= 2
+                            hand_over = True
+                        elif hand_value(totals[current], aces[current])[0] > 21:
+                            hand_over = True
+                    elif action == STAND:
+                        hand_over = True
+                    elif action == SURRENDER:
+                        payouts[current] = -0.5
+                        surrendered = True
+                        hand_over = True
+                    else:
+                        # Insert the second card as a new hand after this one
+                        for h in range(num_hands, current + 1, -1):
+                            totals[h] = totals[h - 1]
+                            aces[h] = aces[h - 1]
+                            lengths[h] = lengths[h - 1]
+                            first_cards[h] = first_cards[h - 1]
+                            second_cards[h] = second_cards[h - 1]
+                            payouts[h] = payouts[h - 1]
+                        num_hands += 1
+
+                        pair_card = second_cards[current]
+                        for h in (current, current + 1):
+                            first_cards[h] = pair_card
+                            totals[h] = pair_card
+                            aces[h] = 1 if pair_card == 1 else 0
+                            lengths[h] = 1
+                        payouts[current + 1] = -1.0
+
+                        # Deal an extra card to each hand
+                        for h in (current, current + 1):
+                            card = draw_card(cards, remaining, count_values, full_composition, shoe_state, initial_count,
+                                             True, shuffle_order)
+                            second_cards[h] = card
+                            totals[h] += card
+                            aces[h] += 1 if card == 1 else 0
+                            lengths[h] += 1
+
+                    next_state = get_state(current, hand_over, num_hands, totals, aces, lengths, first_cards, second_cards,
+                                           dealer_total, dealer_aces, shoe_state, initial_count, size, max_hands, double_after_split,
+                                           surrender)
+
+                    # Update our q-values
+                    if not hand_over:
+                        update(q, visits, track_visits, state, action, next_state, 0.0, alpha, gamma, draws, draw_state)
+
+                        # If split use next hand as well for the calculation
+                        if action == SPLIT:
+                            split_state = get_state(current + 1, hand_over, num_hands, totals, aces, lengths, first_cards,
+                                                    second_cards, dealer_total, dealer_aces, shoe_state, initial_count, size, max_hands,
+                                                    double_after_split, surrender)
+                            update(q, visits, track_visits, state, action, split_state, 0.0, alpha, gamma, draws, draw_state)
+                    else:
+                        terminal_states[num_terminal] = state
+                        terminal_actions[num_terminal] = action
+                        terminal_next_states[num_terminal] = next_state
+                        num_terminal += 1
+
+                        # Move on to the next hand
+                        hand_over = False
+                        current += 1
+
+            # Whether the dealer has to play
+            dealer_action = False
+            for h in range(num_hands):
+                value = hand_value(totals[h], aces[h])[0]
+                if value < 21 or (value == 21 and lengths[h] != 2):
+                    dealer_action = True
+
+            # Reveal hidden dealer card
+            dealer_total += hidden_card
+            dealer_aces += 1 if hidden_card == 1 else 0
+            shoe_state[1] += count_values[hidden_card]
+
+            # Surrendered hands lose half the bet whatever the dealer has
+            if not surrendered:
+                if dealer_action:
+                    value, is_soft = hand_value(dealer_total, dealer_aces)
+                    while dealer_hits[value * 2 + is_soft]:
+                        card = draw_card(cards, remaining, count_values, full_composition, shoe_state, initial_count, True,
+                                         shuffle_order)
+                        dealer_total += card
+                        dealer_aces += 1 if card == 1 else 0
+                        value, is_soft = hand_value(dealer_total, dealer_aces)
+
+                # Update payouts, the hidden card is revealed so dealer blackjacks play as a 21
+                dealer_val = hand_value(dealer_total, dealer_aces)[0]
+                for h in range(num_hands):
+                    value = hand_value(totals[h], aces[h])[0]
+                    if value == 21 and lengths[h] == 2:
+                        payouts[h] *= -blackjack_payout
+                    elif value <= 21:
+                        if dealer_val > 21 or value > dealer_val:
+                            payouts[h] *= -1
+                        elif dealer_val == value:
+                            payouts[h] *= 0
+
+            # Update state based on dealer action
+            for i in range(num_terminal):
+                update(q, visits, track_visits, terminal_states[i], terminal_actions[i], terminal_next_states[i], payouts[i],
+                       alpha, gamma, draws, draw_state)
+
+            # Update epsilon and alpha
+            epsilon = max(epsilon_min, epsilon * epsilon_decay)
+            alpha = max(alpha_min, alpha * alpha_decay)
+            played += 1
+
+            # Reshuffle outside of the kernel once the shoe passes the penetration
+            if 1 - ((size - shoe_state[0]) / (52 * num_decks)) >= penetration:
+                reason = NEEDS_SHUFFLE
+                break
+
+            # The next reshuffle needs a new order
+            if shoe_state[2]:
+                reason = RESHUFFLED
+                break
+
+        params[0] = epsilon
+        params[1] = alpha
+        return (played, reason)
+
+    return run_episodes
+
+# Kernels are built on first use, compiling the Numba one takes a few seconds
+KERNELS = {}
+
+def get_kernel(backend):
+    '''
+    Returns the run_episodes kernel of @backend
+
+    :param backend: "numba" for the compiled kernel or "python" for the same code as plain Python
+    '''
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {list(BACKENDS)}")
+    if backend == 'numba' and not HAVE_NUMBA:
+        raise ValueError("The numba backend needs Numba installed, use the python backend instead")
+
+    if backend not in KERNELS:
+        KERNELS[backend] = build_kernel(njit if backend == 'numba' else lambda function: function)
+    return KERNELS[backend]
+
+class EpisodeKernel:
+    '''
+    Trains a BlackjackAgent with the fused episode kernel, keeping the random stream between calls
+    so runs with the same seed are reproducible and can be checkpointed
+    '''
+    def __init__(self, backend="numba", seed=None):
+        '''
+        :param backend: one of BACKENDS, "numba" falls back to "python" if Numba isn't installed
+        :param seed: seed of the random stream
+        '''
+        self.set_backend(backend)
+        self.rng = np.random.default_rng(seed)
+        self.draws = np.zeros(0)
+        self.draw_state = np.zeros(1, dtype=np.int64)
+
+    def set_backend(self, backend):
+        '''
+        Switches the backend episodes run on, which doesn't change their results
+
+        :param backend: one of BACKENDS, "numba" falls back to "python" if Numba isn't installed
+        '''
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {list(BACKENDS)}")
+
+        self.backend = backend if HAVE_NUMBA else 'python'
+
+    def refill(self):
+        '''
+        Starts a new block of uniforms, keeping the ones not used yet
+        '''
+        unused = self.draws[self.draw_state[0]:]
+        self.draws = np.concatenate([unused, self.rng.random(DRAW_BLOCK_SIZE)])
+        self.draw_state[0] = 0
+
+    def run_episodes(self, agent, num_episodes):
+        '''
+        Runs @num_episodes episodes of Q-learning on @agent and its game, like calling
+        agent.run_episode @num_episodes times
+
+        :param agent: BlackjackAgent to train
+        :param num_episodes: number of episodes to run
+        '''
+        kernel = get_kernel(self.backend)
+        game = agent.game
+        shoe = game.shoe
+        rules = game.rules
+        q_vals = agent.q_vals
+
+        track_visits = q_vals.visits is not None
+        visits = q_vals.visits if track_visits else np.zeros((1, 1), dtype=np.int64)
+        cards = np.frombuffer(shoe.cards, dtype=np.int8)
+        count_values = np.array(shoe.count_values, dtype=np.int64)
+        full_composition = np.array(shoe.full_composition, dtype=np.int64)
+        dealer_hits = np.array(rules.dealer_hits)
+        max_hands = len(cards) if rules.max_hands is None else rules.max_hands
+        params = np.array([agent.epsilon, agent.alpha, agent.gamma, agent.epsilon_min, agent.epsilon_decay, agent.alpha_min,
+                           agent.alpha_decay])
+
+        while num_episodes > 0:
+            if len(self.draws) - self.draw_state[0] < DRAW_RESERVE:
+                self.refill()
+
+            remaining = np.array(shoe.remaining, dtype=np.int64)
+            shoe_state = np.array([shoe.cursor, shoe.running_count, 0], dtype=np.int64)
+
+            # Order the shoe's generator would shuffle the cards into if they run out mid hand, the
+            # generator is rewound unless the kernel used it
+            rng_state = shoe.rng.bit_generator.state
+            shuffle_order = np.arange(len(cards))
+            shoe.rng.shuffle(shuffle_order)
+
+            played, reason = kernel(q_vals.values, visits, track_visits, cards, remaining, count_values, full_composition,
+                                    shoe_state, shoe.initial_count, game.num_decks, game.penetration, dealer_hits,
+                                    rules.double_after_split, rules.surrender, max_hands, rules.blackjack_payout, params,
+                                    self.draws, self.draw_state, shuffle_order, num_episodes)
+
+            shoe.cursor, shoe.running_count = int(shoe_state[0]), int(shoe_state[1])
+            shoe.remaining[:] = remaining.tolist()
+            if not shoe_state[2]:
+                shoe.rng.bit_generator.state = rng_state
+            num_episodes -= played
+
+            if reason == NEEDS_SHUFFLE:
+                game.create_shoe()
+
+        agent.epsilon, agent.alpha = float(params[0]), float(params[1])
@@ -0,0 +1,624 @@
+'''
+Parallel Monte Carlo evaluation of a blackjack policy
+
+Hands are played in chunks, each on a fresh BlackjackGame with its own seeded shoe, so results
+are reproducible for a fixed seed and chunk size no matter how many processes play them. Chunks
+are merged in order and the run stops early once the edge is known to the target precision.
+Several policies can also be compared on identical cards, which pairs their results round by round.
+The outcome of every round can also be collected, for bankroll simulations in bankroll.py.
+'''
+import json
+import math
+import random
+import multiprocessing
+from statistics import NormalDist
+import numpy as np
+from blackjack_model.game import BlackjackGame
+from blackjack_model.shoe import Shoe
+
+MIN_BET = 10
+MAX_BET = 1000
+SPREAD = 5
+
+# Number of hands played by a worker for each task
+CHUNK_SIZE = 100000
+
+# Policy used by this worker process, set by init_worker
+worker_policy = None
+
+def get_bet_sizing(true_count, min_bet=MIN_BET, max_bet=MAX_BET, spread=SPREAD):
+    '''
+    Returns a bet size based on @true_count that scales linearly between min and max bets
+
+    :param true_count: true count of deck
+    :param min_bet: bet at a true count of 0 or less
+    :param max_bet: largest bet
+    :param spread: true count at which the bet reaches @max_bet
+    '''
+    if true_count <= 0:
+        return min_bet
+    return min(min_bet + ((max_bet - min_bet) / spread * true_count), max_bet)
+
+def flat_bet(true_count):
+    '''
+    Returns a bet of 1 regardless of @true_count
+
+    :param true_count: true count of deck
+    '''
+    return 1
+
+class EdgeStats:
+    '''
+    Running sums of the winnings and amount bet each round, used to estimate the player edge
+    '''
+    def __init__(self):
+        self.num_rounds = 0
+        self.total_winnings = 0.0
+        self.total_bet = 0.0
+        self.winnings_squared = 0.0
+        self.bet_squared = 0.0
+        self.winnings_bet = 0.0
+
+    def add_round(self, winnings, bet):
+        '''
+        Adds the result of one round
+
+        :param winnings: net amount won in the round, negative for a loss
+        :param bet: amount bet in the round
+        '''
+        self.num_rounds += 1
+        self.total_winnings += winnings
+        self.total_bet += bet
+        self.winnings_squared += winnings * winnings
+        self.bet_squared += bet * bet
+        self.winnings_bet += winnings * bet
+
+    def merge(self, other):
+        '''
+        Adds the rounds of another EdgeStats
+
+        :param other: EdgeStats to add
+        '''
+        self.num_rounds += other.num_rounds
+        self.total_winnings += other.total_winnings
+        self.total_bet += other.total_bet
+        self.winnings_squared += other.winnings_squared
+        self.bet_squared += other.bet_squared
+        self.winnings_bet += other.winnings_bet
+
+    def get_edge(self):
+        '''
+        Returns the player edge, total winnings as a fraction of the total amount bet
+        '''
+        if self.total_bet == 0:
+            return 0.0
+        return self.total_winnings / self.total_bet
+
+    def get_standard_error(self):
+        '''
+        Returns the standard error of the edge, estimated with the delta method for a ratio
+        '''
+        if self.num_rounds < 2 or self.total_bet == 0:
+            return math.inf
+
+        edge = self.get_edge()
+
+        # Sample variance of winnings - edge * bet, which has a mean of 0
+        residual_squared = self.winnings_squared - 2 * edge * self.winnings_bet + edge * edge * self.bet_squared
+        variance = max(residual_squared, 0.0) / (self.num_rounds - 1)
+        mean_bet = self.total_bet / self.num_rounds
+
+        return math.sqrt(variance / self.num_rounds) / mean_bet
+
+    def get_confidence_interval(self, confidence=0.95):
+        '''
+        Returns a tuple of the (low, high) bounds of the edge's normal confidence interval
+
+        :param confidence: confidence level between 0 and 1
+        '''
+        half_width = get_z_score(confidence) * self.get_standard_error()
+        edge = self.get_edge()
+        return (edge - half_width, edge + half_width)
+
+class PairedStats:
+    '''
+    Running sums of the winnings and amount bet each round by several policies playing the same
+    cards, used to estimate each edge and the paired differences between them
+    '''
+    def __init__(self, num_policies):
+        '''
+        :param num_policies: number of policies compared
+        '''
+        self.num_policies = num_policies
+        self.num_rounds = 0
+
+        # Each round's results are the winnings of every policy followed by the amounts bet
+        self.totals = np.zeros(2 * num_policies)
+        self.products = np.zeros((2 * num_policies, 2 * num_policies))
+
+    def add_rounds(self, winnings, bets):
+        '''
+        Adds the results of several rounds
+
+        :param winnings: array of shape (rounds, num_policies) of net amounts won
+        :param bets: array of shape (rounds, num_policies) of amounts bet
+        '''
+        results = np.hstack([winnings, bets])
+        self.num_rounds += len(results)
+        self.totals += results.sum(axis=0)
+        self.products += results.T @ results
+
+    def merge(self, other):
+        '''
+        Adds the rounds of another PairedStats
+
+        :param other: PairedStats of the same policies
+        '''
+        self.num_rounds += other.num_rounds
+        self.totals += other.totals
+        self.products += other.products
+
+    def get_edges(self):
+        '''
+        Returns an array of each policy's edge, total winnings as a fraction of the total amount bet
+        '''
+        total_bets = self.totals[self.num_policies:]
+        return np.divide(self.totals[:self.num_policies], total_bets, out=np.zeros(self.num_policies), where=total_bets != 0)
+
+    def get_linearized_error(self, weights):
+        '''
+        Returns the standard error of a weighted sum of the edges, estimated with the delta method
+
+        :param weights: weight of each policy's edge
+        '''
+        total_bets = self.totals[self.num_policies:]
+        if self.num_rounds < 2 or not total_bets.all():
+            return math.inf
+
+        # Each edge's residual per round is (winnings - edge * bet) / mean bet, which has a mean of 0
+        mean_bets = total_bets / self.num_rounds
+        coefficients = np.concatenate([weights / mean_bets, -weights * self.get_edges() / mean_bets])
+        variance = max(coefficients @ self.products @ coefficients, 0.0) / (self.num_rounds - 1)
+
+        return math.sqrt(variance / self.num_rounds)
+
+    def get_standard_error(self, policy):
+        '''
+        Returns the standard error of one policy's edge
+
+        :param policy: index of the policy
+        '''
+        weights = np.zeros(self.num_policies)
+        weights[policy] = 1
+        return self.get_linearized_error(weights)
+
+    def get_difference(self, policy, baseline):
+        '''
+        Returns the edge of @policy minus the edge of @baseline
+
+        :param policy: index of the policy
+        :param baseline: index of the policy it is compared to
+        '''
+        edges = self.get_edges()
+        return edges[policy] - edges[baseline]
+
+    def get_difference_standard_error(self, policy, baseline):
+        '''
+        Returns the standard error of the paired difference between two policies' edges
+
+        :param policy: index of the policy
+        :param baseline: index of the policy it is compared to
+        '''
+        weights = np.zeros(self.num_policies)
+        weights[policy] += 1
+        weights[baseline] -= 1
+        return self.get_linearized_error(weights)
+
+    def get_variance_reduction(self, policy, baseline):
+        '''
+        Returns how many times more rounds two independent runs would need to estimate the
+        difference between two policies' edges as precisely as the paired rounds
+
+        :param policy: index of the policy
+        :param baseline: index of the policy it is compared to
+        '''
+        independent_variance = self.get_standard_error(policy) ** 2 + self.get_standard_error(baseline) ** 2
+        paired_variance = self.get_difference_standard_error(policy, baseline) ** 2
+        if paired_variance == 0:
+            return math.inf
+        return independent_variance / paired_variance
+
+class HandOutcomes:
+    '''
+    True count and result of a bet of 1 of every round, in the order they were played. Every bet
+    sizing places its bet before the round and doesn't change the cards, so the rounds of any bet
+    sizing on the same shoes are these outcomes scaled by its bet at each true count.
+    '''
+    def __init__(self, true_counts=None, winnings=None, wagered=None, settings=None):
+        '''
+        :param true_counts: int8 array of the binned true count before each round
+        :param winnings: array of the net amount won by a bet of 1 in each round
+        :param wagered: array of the amount bet in each round by a bet of 1, counting doubles and
+                        splits, as in get_round_result
+        :param settings: JSON serializable dict describing how the rounds were played, saved with them
+        '''
+        self.true_counts = np.zeros(0, dtype=np.int8) if true_counts is None else true_counts
+        self.winnings = np.zeros(0) if winnings is None else winnings
+        self.wagered = np.zeros(0) if wagered is None else wagered
+        self.settings = {} if settings is None else settings
+        self.num_rounds = len(self.winnings)
+
+    def merge(self, other):
+        '''
+        Appends the rounds of another HandOutcomes
+
+        :param other: HandOutcomes to add
+        '''
+        self.true_counts = np.concatenate([self.true_counts, other.true_counts])
+        self.winnings = np.concatenate([self.winnings, other.winnings])
+        self.wagered = np.concatenate([self.wagered, other.wagered])
+        self.num_rounds = len(self.winnings)
+
+    def save(self, path):
+        '''
+        Saves the outcomes and their settings to @path as a .npz file
+
+        :param path: output path
+        '''
+        np.savez(path, true_counts=self.true_counts, winnings=self.winnings, wagered=self.wagered,
+                 settings=np.array(json.dumps(self.settings, sort_keys=True)))
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Returns the HandOutcomes saved at @path
+
+        :param path: path to a .npz file from save
+        '''
+        with np.load(path) as data:
+            settings = json.loads(str(data['settings'])) if 'settings' in data else {}
+            return cls(data['true_counts'], data['winnings'], data['wagered'], settings)
+
+def get_z_score(confidence):
+    '''
+    Returns the z score of a two sided normal confidence interval
+
+    :param confidence: confidence level between 0 and 1
+    '''
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+def play_round(game, policy):
+    '''
+    Plays one round of @game following @policy and returns the payout factor of each hand
+
+    :param game: BlackjackGame with no hand in progress
+    :param policy: object whose get_policy(state) returns an action name
+    '''
+    # Deal player and dealer
+    game.deal_player()
+    game.deal_dealer(False)
+    game.deal_player()
+    game.deal_dealer(True)
+
+    # Check for dealer blackjack
+    if not game.is_dealer_blackjack():
+        # Iterate over each player hand and let them play actions
+        while game.get_current_hand() < game.get_num_hands():
+            # Add a card for recently split hands
+            if game.get_current_hand_length() == 1:
+                game.deal_player()
+
+            # Perform an action
+            action = policy.get_policy(game.get_state())
+
+            if action == 'hit':
+                game.hit()
+            elif action == 'stand':
+                game.stand()
+            elif action == 'double':
+                game.double_down()
+            elif action == 'split':
+                game.split()
+            elif action == 'surrender':
+                game.surrender()
+
+            # Evaluate if the hand ended
+            game.update_current_hand()
+
+    # Evaluate payouts after playing dealer if needed
+    return game.evaluate_hand()
+
+def get_round_result(payouts, bet):
+    '''
+    Returns a tuple as:
+    (net amount won in a round, amount bet in the round)
+    where the amount bet on each hand is the amount won or lost on it
+
+    :param payouts: payout factor of each hand from BlackjackGame.evaluate_hand
+    :param bet: bet placed at the start of the round
+    '''
+    winnings = 0.0
+    total_bet = 0.0
+    for payout in payouts:
+        winnings += payout * bet
+        total_bet += abs(payout) * bet
+
+    return (winnings, total_bet)
+
+def play_hands(policy, num_hands, bet_sizing, num_decks=6, penetration=0.8, seed=None, rules=None):
+    '''
+    Returns an EdgeStats of @num_hands rounds played by @policy on a new game
+
+    :param policy: object whose get_policy(state) returns an action name
+    :param num_hands: number of rounds to play
+    :param bet_sizing: function returning the bet for a binned true count
+    :param num_decks: number of decks in the shoe
+    :param penetration: portion of the shoe dealt before reshuffling
+    :param seed: seed of the shoe and of the policy's tie breaking
+    :param rules: Rules of the table, defaults to Rules()
+    '''
+    game = BlackjackGame(num_decks=num_decks, penetration=penetration, seed=seed, rules=rules)
+    random.seed(seed)
+    stats = EdgeStats()
+
+    for _ in range(num_hands):
+        # Get our bet sizing
+        bet = bet_sizing(game.bin_true_count(game.get_true_count()))
+
+        stats.add_round(*get_round_result(play_round(game, policy), bet))
+
+        # Reset game to prepare for a new hand
+        game.reset()
+
+    return stats
+
+def play_outcomes(policy, num_hands, num_decks=6, penetration=0.8, seed=None, rules=None):
+    '''
+    Returns the HandOutcomes of @num_hands rounds played by @policy on a new game, the same rounds
+    play_hands plays with the same arguments
+
+    :param policy: object whose get_policy(state) returns an action name
+    :param num_hands: number of rounds to play
+    :param num_decks: number of decks in the shoe
+    :param penetration: portion of the shoe dealt before reshuffling
+    :param seed: seed of the shoe and of the policy's tie breaking
+    :param rules: Rules of the table, defaults to Rules()
+    '''
+    game = BlackjackGame(num_decks=num_decks, penetration=penetration, seed=seed, rules=rules)
+    random.seed(seed)
+
+    true_counts = np.zeros(num_hands, dtype=np.int8)
+    winnings = np.zeros(num_hands)
+    wagered = np.zeros(num_hands)
+
+    for i in range(num_hands):
+        true_counts[i] = game.bin_true_count(game.get_true_count())
+        winnings[i], wagered[i] = get_round_result(play_round(game, policy), 1)
+
+        # Reset game to prepare for a new hand
+        game.reset()
+
+    return HandOutcomes(true_counts, winnings, wagered)
+
+def play_paired_hands(policies, num_hands, bet_sizing, num_decks=6, penetration=0.8, seed=None, rules=None):
+    '''
+    Returns a PairedStats of @num_hands rounds where every policy plays each round from the same
+    shoe state, after which the shoe continues from the first policy's round
+
+    :param policies: list of objects whose get_policy(state) returns an action name
+    :param num_hands: number of rounds to play
+    :param bet_sizing: function returning the bet for a binned true count
+    :param num_decks: number of decks in the shoe
+    :param penetration: portion of the shoe dealt before reshuffling
+    :param seed: seed of the shoe and of the policies' tie breaking
+    :param rules: Rules of the table, defaults to Rules()
+    '''
+    shoe = Shoe(num_decks, seed=seed)
+    games = [BlackjackGame(num_decks=num_decks, penetration=penetration, shoe=shoe, rules=rules) for _ in policies]
+    random.seed(seed)
+
+    winnings = np.zeros((num_hands, len(policies)))
+    bets = np.zeros((num_hands, len(policies)))
+
+    for i in range(num_hands):
+        # Every policy sees the same true count, so they all place the same bet
+        bet = bet_sizing(games[0].bin_true_count(shoe.get_true_count()))
+        position = shoe.save_position()
+
+        # Play the first policy last so the shoe continues from its round
+        for j in range(len(policies) - 1, -1, -1):
+            if j < len(policies) - 1:
+                shoe.restore_position(position)
+
+            winnings[i, j], bets[i, j] = get_round_result(play_round(games[j], policies[j]), bet)
+
+            if j > 0:
+                games[j].reset_hand()
+
+        # Reset game to prepare for a new hand
+        games[0].reset()
+
+    stats = PairedStats(len(policies))
+    stats.add_rounds(winnings, bets)
+    return stats
+
+def init_worker(policy):
+    '''
+    Sets the policy played by this worker process
+
+    :param policy: policy to evaluate, or list of policies to compare
+    '''
+    global worker_policy
+    worker_policy = policy
+
+def run_chunk(task):
+    '''
+    Plays one chunk of hands with this worker's policy and returns its EdgeStats
+
+    :param task: tuple of (num_hands, bet_sizing, num_decks, penetration, seed, rules)
+    '''
+    return play_hands(worker_policy, *task)
+
+def run_paired_chunk(task):
+    '''
+    Plays one chunk of hands with this worker's list of policies and returns its PairedStats
+
+    :param task: tuple of (num_hands, bet_sizing, num_decks, penetration, seed, rules)
+    '''
+    return play_paired_hands(worker_policy, *task)
+
+def run_outcome_chunk(task):
+    '''
+    Plays one chunk of hands with this worker's policy and returns its HandOutcomes
+
+    :param task: tuple of (num_hands, bet_sizing, num_decks, penetration, seed, rules), the bet
+                 sizing isn't used
+    '''
+    num_hands, _, num_decks, penetration, seed, rules = task
+    return play_outcomes(worker_policy, num_hands, num_decks, penetration, seed, rules)
+
+def get_chunk_seeds(seed, num_chunks):
+    '''
+    Returns an independent seed for each chunk, derived from @seed
+
+    :param seed: seed of the evaluation
+    :param num_chunks: number of chunks
+    '''
+    return [int(stream.generate_state(1)[0]) for stream in np.random.SeedSequence(seed).spawn(num_chunks)]
+
+def run_chunks(chunk_function, policy, stats, is_done, num_hands, bet_sizing, num_decks, penetration,
+               num_workers, seed, chunk_size, rules):
+    '''
+    Plays up to @num_hands rounds in chunks across a process pool, merging each chunk's results
+    into @stats in chunk order until @is_done(stats), and returns @stats
+
+    :param chunk_function: run_chunk or run_paired_chunk
+    :param policy: policy, or list of policies, set in every worker
+    :param stats: EdgeStats or PairedStats the chunks are merged into
+    :param is_done: function of @stats returning whether to stop early
+    :param num_hands: maximum number of rounds to play
+    :param bet_sizing: picklable function returning the bet for a binned true count
+    :param num_decks: number of decks in the shoe
+    :param penetration: portion of the shoe dealt before reshuffling
+    :param num_workers: number of worker processes, defaults to the number of CPUs
+    :param seed: seed used to derive each chunk's shoe
+    :param chunk_size: number of rounds in each chunk
+    :param rules: Rules of the table, None for the default rules
+    '''
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if num_workers < 1:
+        raise ValueError("num_workers must be at least 1")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    num_chunks = math.ceil(num_hands / chunk_size)
+    tasks = []
+    for i, chunk_seed in enumerate(get_chunk_seeds(seed, num_chunks)):
+        tasks.append((min(chunk_size, num_hands - i * chunk_size), bet_sizing, num_decks, penetration, chunk_seed, rules))
+
+    # Play in this process when there is a single worker
+    if num_workers == 1:
+        init_worker(policy)
+        results = map(chunk_function, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(num_workers, initializer=init_worker, initargs=(policy,))
+        results = pool.imap(chunk_function, tasks)
+
+    try:
+        # Merge in chunk order so early stopping doesn't depend on the number of workers
+        for chunk_stats in results:
+            stats.merge(chunk_stats)
+            if is_done(stats):
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return stats
+
+def evaluate_policy(policy, num_hands, bet_sizing=get_bet_sizing, num_decks=6, penetration=0.8,
+                    num_workers=None, seed=0, precision=None, confidence=0.95, chunk_size=CHUNK_SIZE, rules=None):
+    '''
+    Plays up to @num_hands rounds with @policy across a process pool and returns the merged EdgeStats.
+    With a @precision, stops after the first chunk at which the confidence interval's half width is
+    at most @precision.
+
+    :param policy: picklable object whose get_policy(state) returns an action name, like a
+                   BlackjackAgent or PolicyTable
+    :param num_hands: maximum number of rounds to play
+    :param bet_sizing: picklable function returning the bet for a binned true count
+    :param num_decks: number of decks in the shoe
+    :param penetration: portion of the shoe dealt before reshuffling
+    :param num_workers: number of worker processes, defaults to the number of CPUs
+    :param seed: seed used to derive each chunk's shoe
+    :param precision: target half width of the edge's confidence interval, None to play every hand
+    :param confidence: confidence level of the interval used for @precision
+    :param chunk_size: number of rounds in each chunk
+    :param rules: Rules of the table, defaults to Rules()
+    '''
+    z_score = get_z_score(confidence)
+
+    def is_done(stats):
+        return precision is not None and z_score * stats.get_standard_error() <= precision
+
+    return run_chunks(run_chunk, policy, EdgeStats(), is_done, num_hands, bet_sizing, num_decks,
+                      penetration, num_workers, seed, chunk_size, rules)
+
+def compare_policies(policies, num_hands, bet_sizing=get_bet_sizing, num_decks=6, penetration=0.8,
+                     num_workers=None, seed=0, precision=None, confidence=0.95, chunk_size=CHUNK_SIZE, rules=None):
+    '''
+    Plays up to @num_hands rounds with every policy on the same cards (common random numbers) and
+    returns the merged PairedStats. Because each round is dealt identically to every policy, the
+    difference between their edges has a much smaller variance than with independent runs. With a
+    @precision, stops after the first chunk at which the confidence interval of every policy's
+    difference from the first policy has a half width of at most @precision.
+
+    :param policies: list of at least 2 picklable objects whose get_policy(state) returns an action name
+    :param num_hands: maximum number of rounds to play
+    :param bet_sizing: picklable function returning the bet for a binned true count
+    :param num_decks: number of decks in the shoe
+    :param penetration: portion of the shoe dealt before reshuffling
+    :param num_workers: number of worker processes, defaults to the number of CPUs
+    :param seed: seed used to derive each chunk's shoe
+    :param precision: target half width of the differences' confidence intervals, None to play every hand
+    :param confidence: confidence level of the intervals used for @precision
+    :param chunk_size: number of rounds in each chunk
+    :param rules: Rules of the table, defaults to Rules()
+    '''
+    if len(policies) < 2:
+        raise ValueError("policies must hold at least 2 policies")
+
+    z_score = get_z_score(confidence)
+
+    def is_done(stats):
+        if precision is None:
+            return False
+        return all(z_score * stats.get_difference_standard_error(i, 0) <= precision for i in range(1, len(policies)))
+
+    return run_chunks(run_paired_chunk, list(policies), PairedStats(len(policies)), is_done, num_hands,
+                      bet_sizing, num_decks, penetration, num_workers, seed, chunk_size, rules)
+
+def collect_outcomes(policy, num_hands, num_decks=6, penetration=0.8, num_workers=None, seed=0, chunk_size=CHUNK_SIZE,
+                     rules=None):
+    '''
+    Plays @num_hands rounds with @policy across a process pool and returns their HandOutcomes in
+    chunk order. The chunks are dealt from the same shoes as evaluate_policy with the same seed
+    and chunk size, so scaling the outcomes by a bet sizing gives the same rounds it plays.
+
+    :param policy: picklable object whose get_policy(state) returns an action name
+    :param num_hands: number of rounds to play
+    :param num_decks: number of decks in the shoe
+    :param penetration: portion of the shoe dealt before reshuffling
+    :param num_workers: number of worker processes, defaults to the number of CPUs
+    :param seed: seed used to derive each chunk's shoe
+    :param chunk_size: number of rounds in each chunk
+    :param rules: Rules of the table, defaults to Rules()
+    '''
+    def is_done(outcomes):
+        return False
+
+    return run_chunks(run_outcome_chunk, policy, HandOutcomes(), is_done, num_hands, None, num_decks,
+                      penetration, num_workers, seed, chunk_size, rules)
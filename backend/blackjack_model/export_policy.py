@@ -0,0 +1,11 @@
+from blackjack_model.blackjack_agent import load_agent
+from blackjack_model.policy_table import compile_policy, save_policy
+
+AGENT_PATH = "blackjack_model/blackjack_agent.pkl"
+POLICY_PATH = "blackjack_model/blackjack_policy.npy"
+
+# Compile the trained agent's greedy policy into a lookup table
+policy = compile_policy(load_agent(AGENT_PATH).q_vals)
+save_policy(policy, POLICY_PATH)
+
+print(f"Saved policy for {len(policy.actions)} states to {POLICY_PATH}")
@@ -0,0 +1,20 @@
+import argparse
+from blackjack_model.model_file import load_policy_table
+from blackjack_model.policy_export import EXPORT_FORMATS, export_policy
+
+MODEL_PATH = "blackjack_model/blackjack_policy.npy"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a policy as a gzip-compressed table for client-side lookups")
+    parser.add_argument("--model", default=MODEL_PATH, help="agent .pkl, model .bjq or policy .npy")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="json")
+    parser.add_argument("--output", help="defaults to blackjack_model/policy_table.json.gz or .bin.gz")
+    args = parser.parse_args()
+
+    output = args.output or f"blackjack_model/policy_table.{'json' if args.format == 'json' else 'bin'}.gz"
+    data = export_policy(load_policy_table(args.model), args.format)
+
+    with open(output, "wb") as f:
+        f.write(data)
+
+    print(f"Exported policy to {output} ({len(data)} bytes)")
@@ -1,15 +1,22 @@
-import random
+from blackjack_model import dealer_outcomes
+from blackjack_model.rules import Rules
+from blackjack_model.shoe import Shoe
+
+# Cards are stored as their values, aces are 1 and face cards are 10
+ACE = 1
 
 class BlackjackGame:
     '''
     Blackjack Game Environment
     '''
-    ranks = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
-
-    def __init__(self, num_decks=6, penetration=0.8):
+    def __init__(self, num_decks=6, penetration=0.8, counting_system='hi-lo', seed=None, shoe=None, rules=None):
         '''
         :param num_decks: Number of decks in the shoe
         :param penetration: What portion of cards are dealt before reshuffling
+        :param counting_system: Card counting system used for the true count, see shoe.COUNTING_SYSTEMS
+        :param seed: Seed for shuffling the shoe
+        :param shoe: Shoe to deal from in place of a new one, which lets games share a shoe
+        :param rules: Rules of the table, defaults to Rules()
         '''
         # Check valid params
         if not isinstance(num_decks, int):
@@ -23,8 +30,7 @@ class BlackjackGame:
         
         self.num_decks = num_decks
         self.penetration = penetration
-
-        self.count = 0
+        self.rules = rules if rules is not None else Rules()
 
         # Tracks which player hand is active
         self.current_hand = 0
@@ -32,13 +38,37 @@ class BlackjackGame:
         self.hand_over = False
         self.player_hands = [[]]
         self.dealer_hand = []
-        self.hidden_card = ""
+        self.hidden_card = 0
+
+        # Running hard totals (aces counted as 1) and ace counts for each hand
+        self.player_totals = [0]
+        self.player_aces = [0]
+        self.dealer_total = 0
+        self.dealer_aces = 0
 
         # Tracks payouts for player hands
         self.payouts = [-1]
+        self.surrendered = False
+
+        if shoe is None:
+            shoe = Shoe(num_decks, counting_system, seed)
+        elif shoe.num_decks != num_decks:
+            raise ValueError("shoe must have num_decks decks")
+        self.shoe = shoe
 
-        self.shoe = []
-        self.create_shoe()
+    def __setstate__(self, state):
+        '''
+        Restores a pickled game, giving games pickled with a list shoe a new shuffled
+        Shoe and clearing the hand in progress. Games pickled without rules get the default rules.
+        '''
+        self.rules = Rules()
+        self.surrendered = False
+        self.__dict__.update(state)
+
+        if not isinstance(self.shoe, Shoe):
+            self.__dict__.pop('count', None)
+            self.shoe = Shoe(self.num_decks)
+            self.reset_hand()
 
     def get_hand_over(self):
         '''
@@ -73,7 +103,7 @@ class BlackjackGame:
 
         active_hand = self.player_hands[self.current_hand]
             
-        return len(active_hand) == 2 and self.get_val(active_hand[0]) == self.get_val(active_hand[1])
+        return len(active_hand) == 2 and active_hand[0] == active_hand[1] and len(self.player_hands) < self.rules.get_max_hands()
     
     def can_double(self):
         '''
@@ -84,59 +114,66 @@ class BlackjackGame:
         
         active_hand = self.player_hands[self.current_hand]
 
-        return len(active_hand) == 2
+        # Every hand is a split hand once the player has more than one
+        return len(active_hand) == 2 and (self.rules.double_after_split or len(self.player_hands) == 1)
+
+    def can_surrender(self):
+        '''
+        Returns whether the player can surrender, which is only allowed on the first two cards
+        '''
+        if self.hand_over:
+            return False
+
+        return self.rules.surrender and len(self.player_hands) == 1 and len(self.player_hands[0]) == 2
 
     def get_val(self, card):
         '''
         Returns the value of a card
         '''
-        tens = ['10', 'J', 'Q', 'K']
-
-        if card == 'A':
-            return 1
-        elif card in tens:
-            return 10
-        else:
-            return int(card)
+        return card
 
     def create_shoe(self):
         '''
-        Sets and shuffles the shoe of the game, where each rank appears 4 times for each deck
+        Shuffles all cards back into the shoe, where each rank appears 4 times for each deck
         '''
-        res = []
-        self.count = 0
+        self.shoe.shuffle()
 
-        # Create all cards
-        for deck in range(self.num_decks):
-            for rank in BlackjackGame.ranks:
-                for suit in range(4):
-                    res.append(rank)
-        
-        # Shuffle and set shoe
-        random.shuffle(res)
-        self.shoe = res
+    def get_composition(self):
+        '''
+        Returns a tuple with the number of unseen cards of each value from 1 (ace) to 10,
+        including the dealer's hidden card
+        '''
+        composition = list(self.shoe.get_composition())
+        if self.hidden_card:
+            composition[self.hidden_card - 1] += 1
+
+        return tuple(composition)
+
+    def get_dealer_probs(self):
+        '''
+        Returns the exact probability of each of dealer_outcomes.DEALER_TOTALS given the dealer's
+        shown card and the unseen cards, assuming the dealer doesn't have blackjack, with the
+        dealer hitting or standing on soft 17 as this game's rules say
+        '''
+        up_card = self.dealer_hand[0]
+
+        return dealer_outcomes.get_dealer_probs(up_card, self.get_composition(), self.rules.dealer_hits_soft_17)
 
     def get_true_count(self):
         '''
         Returns the rounded true count of the deck
         '''
-        if len(self.shoe) == 0:
-            return 0
-        
-        decks_remaining = len(self.shoe) / 52
-        
-        return round(self.count / decks_remaining)
+        return self.shoe.get_true_count()
 
     def deal_player(self):
         '''
         Deals the active player hand one card
         '''
-        if len(self.shoe) == 0:
-            self.create_shoe()
-
-        card = self.shoe.pop()
-        self.update_count(card)
+        card = self.shoe.draw()
         self.player_hands[self.current_hand].append(card)
+        self.player_totals[self.current_hand] += card
+        if card == ACE:
+            self.player_aces[self.current_hand] += 1
     
     def deal_dealer(self, hidden):
         '''
@@ -144,30 +181,31 @@ class BlackjackGame:
 
         :param hidden: Whether the card is hidden to the player
         '''
-        if len(self.shoe) == 0:
-            self.create_shoe()
-
-        card = self.shoe.pop()
+        card = self.shoe.draw(seen=not hidden)
 
         if not hidden:
-            self.update_count(card)
-            self.dealer_hand.append(card)
+            self.add_dealer_card(card)
         else:
             self.hidden_card = card
 
+    def add_dealer_card(self, card):
+        '''
+        Adds @card to the dealer's shown hand
+
+        :param card: the card added
+        '''
+        self.dealer_hand.append(card)
+        self.dealer_total += card
+        if card == ACE:
+            self.dealer_aces += 1
+
     def update_count(self, card):
         '''
         Updates the count based on the given @card
         
         :param card: the card to be added to the count
         '''
-        low = ['2', '3', '4', '5', '6']
-        high = ['10', 'J', 'Q', 'K', 'A']
-
-        if card in low:
-            self.count += 1
-        elif card in high:
-            self.count -= 1
+        self.shoe.count_card(card)
 
     def update_current_hand(self):
         '''
@@ -201,16 +239,31 @@ class BlackjackGame:
         # End current hand
         self.hand_over = True
 
+    def surrender(self):
+        '''
+        Performs surrender action, giving up half the bet
+        '''
+        self.payouts[self.current_hand] = -0.5
+        self.surrendered = True
+
+        # End current hand
+        self.hand_over = True
+
     def split(self):
         '''
         Performs split action
         '''
         # Split hands
-        self.payouts.insert(self.current_hand + 1, -1)
-        first_val = self.player_hands[self.current_hand][0]
-        second_val = self.player_hands[self.current_hand][1]
-        self.player_hands[self.current_hand] = [first_val]
-        self.player_hands.insert(self.current_hand + 1, [second_val])
+        hand = self.current_hand
+        self.payouts.insert(hand + 1, -1)
+        first_val = self.player_hands[hand][0]
+        second_val = self.player_hands[hand][1]
+        self.player_hands[hand] = [first_val]
+        self.player_hands.insert(hand + 1, [second_val])
+        self.player_totals[hand] = first_val
+        self.player_totals.insert(hand + 1, second_val)
+        self.player_aces[hand] = int(first_val == ACE)
+        self.player_aces.insert(hand + 1, int(second_val == ACE))
 
         # Deal an extra card to each hand
         self.deal_player()
@@ -226,35 +279,11 @@ class BlackjackGame:
 
         :param hand: the hand to get the value of
         '''
-        value = 0
-        is_soft = False
-        ace_count = 0
-
         # If we aren't given a hand, assume they want the value of the active hand
         if hand is None:
             hand = self.current_hand
 
-        # Count # of aces and sum all other values
-        for card in self.player_hands[hand]:
-            if card == 'A':
-                ace_count += 1
-            elif card in ['J', 'Q', 'K']:
-                value += 10
-            else:
-                value += int(card)
-
-        # Handle aces
-        for _ in range(ace_count):
-            value += 1
-        if ace_count > 0 and value + 10 <= 21:
-            value += 10
-            is_soft = True
-
-        # Special value for bust
-        if value > 21:
-            value = 22
-
-        return (value, is_soft)
+        return self.get_hand_val(self.player_totals[hand], self.player_aces[hand])
 
     def get_dealer_val(self, hidden):
         '''
@@ -263,39 +292,35 @@ class BlackjackGame:
         
         :param hidden: Whether to include the hidden card in the hand value
         '''
-        value = 0
-        ace_count = 0
-
-        # Count # of aces and sum all other values
-        for card in self.dealer_hand:
-            if card == 'A':
-                ace_count += 1
-            elif card in ['J', 'Q', 'K']:
-                value += 10
-            else:
-                value += int(card)
+        value = self.dealer_total
+        ace_count = self.dealer_aces
 
         # Manage hidden card
         if hidden:
-            card = self.hidden_card
-            if card == 'A':
+            value += self.hidden_card
+            if self.hidden_card == ACE:
                 ace_count += 1
-            elif card in ['J', 'Q', 'K']:
-                value += 10
-            else:
-                value += int(card)
 
+        return self.get_hand_val(value, ace_count)[0]
+
+    def get_hand_val(self, value, ace_count):
+        '''
+        Returns a tuple as:
+        (the value of a hand, is soft)
+        If the value is 22, the hand busted
+
+        :param value: the hard total of the hand, counting aces as 1
+        :param ace_count: the number of aces in the hand
+        '''
         # Handle aces
-        for _ in range(ace_count):
-            value += 1
         if ace_count > 0 and value + 10 <= 21:
-            value += 10
-            
+            return (value + 10, True)
+
         # Special value for bust
         if value > 21:
-            value = 22
-            
-        return value
+            return (22, False)
+
+        return (value, False)
 
     def check_bust(self):
         '''
@@ -308,16 +333,18 @@ class BlackjackGame:
         '''
         Returns whether or not the dealer's turn is over
         '''
-        return self.get_dealer_val(False) >= 17
+        value, is_soft = self.get_hand_val(self.dealer_total, self.dealer_aces)
+
+        return not self.rules.dealer_hits[value * 2 + is_soft]
     
     def reveal_card(self):
         '''
         Adds the hidden card to the dealer's hand and updates the count
         '''
         card = self.hidden_card
-        self.dealer_hand.append(card)
+        self.add_dealer_card(card)
         self.update_count(card)
-        self.hidden_card = ""
+        self.hidden_card = 0
     
     def is_player_blackjack(self, hand):
         '''
@@ -355,12 +382,20 @@ class BlackjackGame:
         # Reveal hidden dealer card
         self.reveal_card()
 
-        # If dealer action, play dealer
+        # Surrendered hands lose half the bet whatever the dealer has
+        if self.surrendered:
+            return self.payouts
+
+        # If dealer action, play dealer, looking up whether the dealer hits each value under the rules
         if dealer_action:
-            while self.get_dealer_val(False) < 17:
+            dealer_hits = self.rules.dealer_hits
+            value, is_soft = self.get_hand_val(self.dealer_total, self.dealer_aces)
+            while dealer_hits[value * 2 + is_soft]:
                 self.deal_dealer(False)
+                value, is_soft = self.get_hand_val(self.dealer_total, self.dealer_aces)
 
         dealer_val = self.get_dealer_val(False)
+        blackjack_factor = -self.rules.blackjack_payout
 
         # Update payouts
         for i in range(len(player_hand_vals)):
@@ -371,7 +406,7 @@ class BlackjackGame:
                 if self.is_player_blackjack(i):
                     self.payouts[i] *= 0
             elif self.is_player_blackjack(i):
-                self.payouts[i] *= -1.5
+                self.payouts[i] *= blackjack_factor
 
             # Handle payouts for hands that didn't bust
             elif player_hand_val <= 21:
@@ -386,16 +421,26 @@ class BlackjackGame:
         '''
         Resets the hand and reshuffles the shoe if necessary
         '''
-        # Resetting variables to defaults
+        self.reset_hand()
+
+        if 1 - (len(self.shoe) / (52 * self.num_decks)) >= self.penetration:
+            self.create_shoe()
+
+    def reset_hand(self):
+        '''
+        Resets the player and dealer hands to defaults
+        '''
         self.current_hand = 0
         self.hand_over = False
         self.player_hands = [[]]
         self.dealer_hand = []
-        self.hidden_card = ""
+        self.hidden_card = 0
+        self.player_totals = [0]
+        self.player_aces = [0]
+        self.dealer_total = 0
+        self.dealer_aces = 0
         self.payouts = [-1]
-
-        if 1 - (len(self.shoe) / (52 * self.num_decks)) >= self.penetration:
-            self.create_shoe()
+        self.surrendered = False
 
     def get_state(self):
         '''
@@ -403,7 +448,8 @@ class BlackjackGame:
         '''
         player_val = self.get_player_val()
 
-        return (player_val[0], player_val[1], self.get_dealer_val(False), self.can_split(), self.can_double(), not self.hand_over, self.bin_true_count(self.get_true_count()))
+        return (player_val[0], player_val[1], self.get_dealer_val(False), self.can_split(), self.can_double(), not self.hand_over, self.bin_true_count(self.get_true_count()),
+                self.can_surrender())
 
     def get_next_state(self):
         '''
@@ -412,7 +458,8 @@ class BlackjackGame:
         self.current_hand += 1
 
         player_val = self.get_player_val()
-        state = (player_val[0], player_val[1], self.get_dealer_val(False), self.can_split(), self.can_double(), not self.hand_over, self.bin_true_count(self.get_true_count()))
+        state = (player_val[0], player_val[1], self.get_dealer_val(False), self.can_split(), self.can_double(), not self.hand_over, self.bin_true_count(self.get_true_count()),
+                 self.can_surrender())
         self.current_hand -= 1
 
         return state
@@ -0,0 +1,71 @@
+import argparse
+import time
+from blackjack_model.blackjack_agent import BlackjackAgent
+from blackjack_model.batch_game import BatchBlackjackGame
+from blackjack_model.episode_kernel import BACKENDS, HAVE_NUMBA, EpisodeKernel, get_kernel
+
+def hands_per_second(play, num_episodes):
+    '''
+    Returns the hands per second of calling @play(@num_episodes) on a fresh agent
+
+    :param play: function of (agent, number of episodes) playing that many episodes
+    :param num_episodes: number of episodes timed
+    '''
+    agent = BlackjackAgent()
+    start = time.perf_counter()
+    play(agent, num_episodes)
+    return num_episodes / (time.perf_counter() - start)
+
+def run_episodes(agent, num_episodes):
+    '''
+    Plays @num_episodes episodes one hand at a time with run_episode
+
+    :param agent: BlackjackAgent to train
+    :param num_episodes: number of episodes to run
+    '''
+    for _ in range(num_episodes):
+        agent.run_episode()
+
+def run_benchmark(num_episodes, backends=BACKENDS, batch_tables=16384):
+    '''
+    Returns a dict of the hands per second of each way of training, and of the seconds spent
+    compiling each kernel backend before it was timed
+
+    :param num_episodes: number of episodes timed for each way of training
+    :param backends: kernel backends to time
+    :param batch_tables: number of tables of the batched environment, 0 skips it
+    '''
+    results = {"run_episode": hands_per_second(run_episodes, num_episodes)}
+
+    if batch_tables:
+        def run_batch(agent, num_episodes):
+            batch_game = BatchBlackjackGame(num_tables=batch_tables, seed=0)
+            agent.run_batch_episodes(batch_game, max(num_episodes // batch_tables, 1))
+
+        results["batch"] = hands_per_second(run_batch, max(num_episodes - num_episodes % batch_tables, batch_tables))
+
+    for backend in backends:
+        # Build (and for Numba compile) the kernel on a short run so it isn't timed
+        start = time.perf_counter()
+        get_kernel(backend)
+        EpisodeKernel(backend, seed=0).run_episodes(BlackjackAgent(), 1)
+        results[f"{backend}_compile_s"] = time.perf_counter() - start
+
+        kernel = EpisodeKernel(backend, seed=0)
+        results[f"kernel_{backend}"] = hands_per_second(kernel.run_episodes, num_episodes)
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time Q-learning hands per second with and without the episode kernel")
+    parser.add_argument("--episodes", type=int, default=200000, help="episodes timed for each way of training")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS) if HAVE_NUMBA else ['python'])
+    parser.add_argument("--batch-tables", type=int, default=16384, help="tables of the batched environment, 0 skips it")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.episodes, args.backends, args.batch_tables)
+    for name, value in results.items():
+        if name.endswith("_compile_s"):
+            print(f"{name[:-len('_compile_s')]} kernel compiled in {value:.2f} s")
+        else:
+            print(f"{name}: {value:,.0f} hands/s")
@@ -0,0 +1,122 @@
+import argparse
+import numpy as np
+from blackjack_model import blackjack_agent
+from blackjack_model.blackjack_agent import BlackjackAgent
+from blackjack_model.episode_kernel import BACKENDS, HAVE_NUMBA, EpisodeKernel
+from blackjack_model.rules import Rules
+
+# Rules the kernel is checked under
+RULESETS = [
+    Rules(),
+    Rules(dealer_hits_soft_17=True, double_after_split=False, surrender=True),
+    Rules(max_hands=2, blackjack_payout=1.2),
+]
+
+class StreamRandom:
+    '''
+    Stands in for the random module in blackjack_agent, reading from the same stream of uniforms
+    as the kernel so both make the same choices
+    '''
+    def __init__(self, draws):
+        '''
+        :param draws: array of uniforms in [0, 1)
+        '''
+        self.draws = draws.tolist()
+        self.index = 0
+
+    def random(self):
+        '''
+        Returns the next uniform
+        '''
+        u = self.draws[self.index]
+        self.index += 1
+        return u
+
+    def choice(self, seq):
+        '''
+        Returns an element of @seq chosen with the next uniform, like the kernel does
+        '''
+        return seq[int(self.random() * len(seq))]
+
+def new_agent(rules, seed, num_decks, counting_system='hi-lo'):
+    '''
+    Returns an agent that explores half the time and learns quickly, so that Q-values and
+    decisions depend on each other within a short run
+
+    :param rules: Rules of the game
+    :param seed: seed of the game's shoe
+    :param num_decks: number of decks in the shoe
+    :param counting_system: counting system of the true count, see shoe.COUNTING_SYSTEMS
+    '''
+    agent = BlackjackAgent(alpha=0.1, epsilon=0.5, rules=rules)
+    agent.game = blackjack_agent.BlackjackGame(num_decks=num_decks, counting_system=counting_system, seed=seed, rules=rules)
+    agent.epsilon_decay = 0.9999
+    return agent
+
+def check_parity(rules, seed, num_episodes, backend, num_decks=6, counting_system='hi-lo'):
+    '''
+    Returns a list of the differences between running @num_episodes with run_episode and with the
+    kernel of @backend from the same shoe and random stream, empty if they match exactly
+
+    :param rules: Rules of the game
+    :param seed: seed of the shoe and the random stream
+    :param num_episodes: number of episodes to run
+    :param backend: kernel backend
+    :param num_decks: number of decks in the shoe
+    :param counting_system: counting system of the true count, see shoe.COUNTING_SYSTEMS
+    '''
+    draws = np.random.default_rng(seed).random(num_episodes * 64 + (1 << 16))
+
+    # Reference episodes, with the agent's random choices read from the stream
+    reference = new_agent(rules, seed, num_decks, counting_system)
+    stream = StreamRandom(draws)
+    original_random = blackjack_agent.random
+    blackjack_agent.random = stream
+    try:
+        for _ in range(num_episodes):
+            reference.run_episode()
+    finally:
+        blackjack_agent.random = original_random
+
+    # Kernel episodes from the same stream
+    agent = new_agent(rules, seed, num_decks, counting_system)
+    kernel = EpisodeKernel(backend)
+    kernel.draws = draws
+    kernel.run_episodes(agent, num_episodes)
+
+    differences = []
+    if not np.array_equal(reference.q_vals.values, agent.q_vals.values):
+        changed = np.count_nonzero(reference.q_vals.values != agent.q_vals.values)
+        differences.append(f"{changed} Q-values differ, largest by {np.abs(reference.q_vals.values - agent.q_vals.values).max():.3g}")
+    if stream.index != kernel.draw_state[0]:
+        differences.append(f"used {kernel.draw_state[0]} uniforms instead of {stream.index}")
+
+    reference_shoe, shoe = reference.game.shoe, agent.game.shoe
+    if (reference_shoe.cursor, reference_shoe.running_count, reference_shoe.remaining) != (shoe.cursor, shoe.running_count, shoe.remaining):
+        differences.append("shoe positions differ")
+    if (reference.epsilon, reference.alpha) != (agent.epsilon, agent.alpha):
+        differences.append("epsilon or alpha differ")
+
+    return differences
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the episode kernel matches run_episode on seeded shoes")
+    parser.add_argument("--episodes", type=int, default=2000, help="episodes per seed")
+    parser.add_argument("--seeds", type=int, default=5)
+    parser.add_argument("--decks", type=int, nargs="+", default=[6, 1])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS) if HAVE_NUMBA else ['python'])
+    args = parser.parse_args()
+
+    failures = 0
+    for backend in args.backends:
+        for rules in RULESETS:
+            for num_decks in args.decks:
+                for seed in range(args.seeds):
+                    differences = check_parity(rules, seed, args.episodes, backend, num_decks)
+                    if differences:
+                        failures += 1
+                        print(f"{backend} {rules.get_name()} {num_decks} decks seed {seed}: {'; '.join(differences)}")
+
+        print(f"{backend}: checked {len(RULESETS) * len(args.decks) * args.seeds} runs of {args.episodes} episodes")
+
+    print("Kernel matches run_episode" if not failures else f"{failures} runs differ")
@@ -0,0 +1,191 @@
+'''
+Versioned binary file format for trained Q-tables
+
+A model file starts with MAGIC and the length of a JSON header as a little-endian uint32, followed
+by the header and then the Q-values as a flat little-endian float32 array, aligned to DATA_ALIGNMENT
+bytes. The header records the format and state encoding versions, the action set, the shape of the
+array and the rules of the game the agent was trained on, so files can be checked before use and
+loaded with a single memory map instead of unpickling a whole agent.
+'''
+import json
+import pickle
+import struct
+import numpy as np
+from blackjack_model import state_encoding
+from blackjack_model.blackjack_agent import BlackjackAgent, load_agent
+from blackjack_model.game import BlackjackGame
+from blackjack_model.policy_table import compile_policy, load_policy
+from blackjack_model.q_table import QTable
+from blackjack_model.rules import Rules
+
+MAGIC = b"BJQTABLE"
+FORMAT_VERSION = 1
+MODEL_EXTENSION = ".bjq"
+
+DATA_ALIGNMENT = 64
+DTYPE = "<f4"
+
+# Rules in the header that configure the game rather than the table Rules
+GAME_SETTINGS = ('num_decks', 'penetration', 'counting_system')
+
+# Agent settings kept in the header so converting back to a pickle restores them
+AGENT_SETTINGS = ('alpha', 'epsilon', 'gamma', 'epsilon_min', 'epsilon_decay', 'alpha_min', 'alpha_decay')
+
+def get_rules(game):
+    '''
+    Returns a dict of the rules of @game stored in model file headers, its GAME_SETTINGS along
+    with its table Rules
+
+    :param game: BlackjackGame the agent was trained on
+    '''
+    rules = {
+        'num_decks': game.num_decks,
+        'penetration': game.penetration,
+        'counting_system': game.shoe.counting_system,
+    }
+    rules.update(game.rules.to_dict())
+    return rules
+
+def get_table_rules(rules):
+    '''
+    Returns the table Rules in a header's dict of rules
+
+    :param rules: dict of rules from get_rules
+    '''
+    return Rules.from_dict({name: value for name, value in rules.items() if name not in GAME_SETTINGS})
+
+def save_model(q_table, path, rules=None, agent_settings=None):
+    '''
+    Saves the values of @q_table to @path as a model file
+
+    :param q_table: QTable to save
+    :param path: output path
+    :param rules: dict of game rules from get_rules
+    :param agent_settings: dict of AGENT_SETTINGS of the agent that learned @q_table
+    '''
+    header = {
+        'format_version': FORMAT_VERSION,
+        'encoding_version': state_encoding.ENCODING_VERSION,
+        'actions': list(state_encoding.ACTIONS),
+        'shape': [state_encoding.NUM_STATES, state_encoding.NUM_ACTIONS],
+        'dtype': DTYPE,
+        'rules': rules or {},
+        'agent': agent_settings or {},
+    }
+    header_bytes = json.dumps(header).encode()
+
+    # Pad the header with spaces so the array starts on an aligned offset
+    prefix_size = len(MAGIC) + 4
+    padding = -(prefix_size + len(header_bytes)) % DATA_ALIGNMENT
+    header_bytes += b" " * padding
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(np.ascontiguousarray(q_table.values, dtype=DTYPE).tobytes())
+
+def read_header(path):
+    '''
+    Returns a tuple as:
+    (the header dict of the model file at @path, offset of its Q-values)
+    Raises ValueError if the file isn't a model file this version can read. Files from state encoding
+    version 1 are accepted and upgraded by load_q_table.
+
+    :param path: path to a model file
+    '''
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a model file")
+        (header_size,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_size))
+
+    if header['format_version'] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model file version {header['format_version']}")
+    if header['encoding_version'] == 1:
+        actions, shape = state_encoding.ACTIONS[:state_encoding.V1_NUM_ACTIONS], (state_encoding.V1_NUM_STATES, state_encoding.V1_NUM_ACTIONS)
+    elif header['encoding_version'] == state_encoding.ENCODING_VERSION:
+        actions, shape = state_encoding.ACTIONS, (state_encoding.NUM_STATES, state_encoding.NUM_ACTIONS)
+    else:
+        raise ValueError(f"Model file uses state encoding version {header['encoding_version']}, "
+                         f"expected {state_encoding.ENCODING_VERSION}")
+
+    if tuple(header['actions']) != actions:
+        raise ValueError(f"Model file actions {header['actions']} don't match {list(actions)}")
+    if tuple(header['shape']) != shape:
+        raise ValueError(f"Model file shape {header['shape']} doesn't match the state encoding")
+
+    return (header, len(MAGIC) + 4 + header_size)
+
+def load_q_table(path):
+    '''
+    Returns a read-only QTable whose values are memory mapped from the model file at @path.
+    Files from state encoding version 1 are copied into the current encoding instead.
+
+    :param path: path to a model file
+    '''
+    header, offset = read_header(path)
+
+    q_table = QTable()
+    q_table.values = np.memmap(path, dtype=header['dtype'], mode="r", offset=offset, shape=tuple(header['shape']))
+
+    if header['encoding_version'] == 1:
+        q_table.values = state_encoding.upgrade_v1_values(q_table.values)
+
+    return q_table
+
+def agent_to_model(agent_path, model_path):
+    '''
+    Converts the agent pickled at @agent_path to a model file at @model_path
+
+    :param agent_path: path to a pickled BlackjackAgent
+    :param model_path: output path
+    '''
+    agent = load_agent(agent_path)
+    agent_settings = {setting: getattr(agent, setting) for setting in AGENT_SETTINGS}
+    save_model(agent.q_vals, model_path, get_rules(agent.game), agent_settings)
+
+def model_to_agent(model_path, agent_path):
+    '''
+    Converts the model file at @model_path to a pickled BlackjackAgent at @agent_path, with a
+    new game following the file's rules
+
+    :param model_path: path to a model file
+    :param agent_path: output path
+    '''
+    header, _ = read_header(model_path)
+
+    agent = BlackjackAgent()
+    for setting, value in header['agent'].items():
+        setattr(agent, setting, value)
+    rules = header['rules']
+    game_settings = {setting: rules[setting] for setting in GAME_SETTINGS if setting in rules}
+    agent.game = BlackjackGame(**game_settings, rules=get_table_rules(rules))
+    agent.q_vals.values[:] = load_q_table(model_path).values
+
+    with open(agent_path, "wb") as f:
+        pickle.dump(agent, f)
+
+def load_model(path):
+    '''
+    Returns an object whose get_policy(state) plays the model saved at @path: a PolicyTable for a
+    policy .npy or model file, or the BlackjackAgent of a pickle
+
+    :param path: path to a policy .npy, model file or pickled agent
+    '''
+    if path.endswith(".npy"):
+        return load_policy(path)
+    if path.endswith(MODEL_EXTENSION):
+        return compile_policy(load_q_table(path))
+    return load_agent(path)
+
+def load_policy_table(path):
+    '''
+    Returns the PolicyTable of the model saved at @path, compiling the greedy policy of pickled agents
+
+    :param path: path to a policy .npy, model file or pickled agent
+    '''
+    model = load_model(path)
+    if isinstance(model, BlackjackAgent):
+        return compile_policy(model.q_vals)
+    return model
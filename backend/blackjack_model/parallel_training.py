@@ -0,0 +1,147 @@
+import random
+import multiprocessing
+import numpy as np
+from blackjack_model.blackjack_agent import BlackjackAgent
+from blackjack_model.game import BlackjackGame
+
+MERGE_METHODS = ('average', 'visits')
+
+def get_worker_seeds(seed, num_workers):
+    '''
+    Returns a tuple of independent (agent seed, shoe seed) for each worker, derived from @seed
+
+    :param seed: seed of the training run
+    :param num_workers: number of worker processes
+    '''
+    streams = np.random.SeedSequence(seed).spawn(num_workers)
+    return [tuple(int(worker_seed) for worker_seed in stream.generate_state(2)) for stream in streams]
+
+def run_worker(task):
+    '''
+    Trains a local copy of the Q-table for one sync interval and returns a tuple as:
+    (local QTable with visit counts, game, random state)
+
+    :param task: tuple of (q_vals, game, random_state, alpha, epsilon, settings, num_episodes)
+                 where settings holds the master's gamma, minimums and per-worker decay factors
+    '''
+    q_vals, game, random_state, alpha, epsilon, settings, num_episodes = task
+
+    agent = BlackjackAgent(alpha=alpha, epsilon=epsilon, gamma=settings['gamma'])
+    agent.q_vals = q_vals
+    agent.q_vals.visits = np.zeros(q_vals.values.shape, dtype=np.int64)
+    agent.game = game
+    agent.epsilon_min = settings['epsilon_min']
+    agent.epsilon_decay = settings['epsilon_decay']
+    agent.alpha_min = settings['alpha_min']
+    agent.alpha_decay = settings['alpha_decay']
+
+    # Continue this worker's own random stream
+    random.setstate(random_state)
+
+    for _ in range(num_episodes):
+        agent.run_episode()
+
+    return (agent.q_vals, agent.game, random.getstate())
+
+def merge_q_vals(q_vals, results, method):
+    '''
+    Returns the master QTable merged from the workers' local tables
+
+    :param q_vals: master QTable the workers started from
+    :param results: list of each worker's local QTable with visit counts
+    :param method: 'average' for a plain mean, 'visits' to weight each worker by its visit counts
+    '''
+    local_values = np.stack([local_q_vals.values for local_q_vals in results])
+    merged = q_vals.copy()
+
+    if method == 'average':
+        merged.values = local_values.mean(axis=0)
+    else:
+        visits = np.stack([local_q_vals.visits for local_q_vals in results])
+        total_visits = visits.sum(axis=0)
+
+        # Keep the master value for pairs no worker visited
+        weighted = (local_values * visits).sum(axis=0)
+        merged.values = np.where(total_visits > 0, weighted / np.maximum(total_visits, 1), q_vals.values)
+
+    return merged
+
+def train_parallel(agent, num_episodes, num_workers=None, sync_interval=1000000, merge='average', seed=0, callback=None):
+    '''
+    Trains @agent with Q-learning across multiple processes and returns it. Each worker plays its
+    own BlackjackGame on a local copy of the Q-table, and every @sync_interval episodes per worker
+    the local tables are merged into @agent. Epsilon and alpha follow the same decay schedule as
+    running @num_episodes episodes serially, and runs are reproducible for a fixed @seed.
+
+    :param agent: BlackjackAgent to train
+    :param num_episodes: total number of episodes across all workers
+    :param num_workers: number of worker processes, defaults to the number of CPUs
+    :param sync_interval: number of episodes each worker plays between merges
+    :param merge: 'average' or 'visits' (visit-weighted merging)
+    :param seed: seed used to derive each worker's random stream
+    :param callback: function called with (agent, episodes played) after every merge, returning True
+                     to stop training early
+    '''
+    if merge not in MERGE_METHODS:
+        raise ValueError(f"merge must be one of {MERGE_METHODS}")
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    if num_workers < 1:
+        raise ValueError("num_workers must be at least 1")
+    if sync_interval < 1:
+        raise ValueError("sync_interval must be at least 1")
+
+    # Give each worker its own game and random stream
+    games = []
+    random_states = []
+    for agent_seed, shoe_seed in get_worker_seeds(seed, num_workers):
+        games.append(BlackjackGame(num_decks=agent.game.num_decks, penetration=agent.game.penetration,
+                                   counting_system=agent.game.shoe.counting_system, seed=shoe_seed,
+                                   rules=agent.game.rules))
+        random.seed(agent_seed)
+        random_states.append(random.getstate())
+
+    # Workers interleave episodes, so each local step covers num_workers episodes of the schedule
+    settings = {
+        'gamma': agent.gamma,
+        'epsilon_min': agent.epsilon_min,
+        'epsilon_decay': agent.epsilon_decay ** num_workers,
+        'alpha_min': agent.alpha_min,
+        'alpha_decay': agent.alpha_decay ** num_workers,
+    }
+
+    # The first num_episodes % num_workers workers play one extra episode in the last interval
+    worker_episodes = [num_episodes // num_workers + (i < num_episodes % num_workers) for i in range(num_workers)]
+    episodes_played = 0
+
+    with multiprocessing.Pool(num_workers) as pool:
+        for start in range(0, worker_episodes[0], sync_interval):
+            intervals = [min(sync_interval, episodes - start) for episodes in worker_episodes]
+            workers = [i for i in range(num_workers) if intervals[i] > 0]
+            q_vals = agent.q_vals
+
+            # Worker i starts i episodes into the interval
+            tasks = []
+            for i in workers:
+                epsilon = max(agent.epsilon_min, agent.epsilon * agent.epsilon_decay ** i)
+                alpha = max(agent.alpha_min, agent.alpha * agent.alpha_decay ** i)
+                tasks.append((q_vals, games[i], random_states[i], alpha, epsilon, settings, intervals[i]))
+
+            results = pool.map(run_worker, tasks)
+
+            # Merge local tables into the master table
+            agent.q_vals = merge_q_vals(q_vals, [local_q_vals for local_q_vals, _, _ in results], merge)
+            for i, (_, game, random_state) in zip(workers, results):
+                games[i] = game
+                random_states[i] = random_state
+
+            # Update epsilon and alpha for every episode played
+            interval_episodes = sum(intervals[i] for i in workers)
+            episodes_played += interval_episodes
+            agent.epsilon = max(agent.epsilon_min, agent.epsilon * agent.epsilon_decay ** interval_episodes)
+            agent.alpha = max(agent.alpha_min, agent.alpha * agent.alpha_decay ** interval_episodes)
+
+            if callback is not None and callback(agent, episodes_played):
+                break
+
+    return agent
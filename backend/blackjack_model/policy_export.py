@@ -0,0 +1,82 @@
+'''
+Compact gzip-compressed exports of a PolicyTable, so clients can look policies up locally
+
+Both formats hold the best action of every encoded state along with a header recording the export
+and state encoding versions and the action names:
+- "json": the header as a JSON object whose "policy" is a string with one character per state,
+  the action's index in "actions" or NO_ACTION_CHAR if there is no legal action
+- "binary": MAGIC, the length of the JSON header as a little-endian uint32, the header, then one
+  int8 action index per state, NO_ACTION if there is no legal action
+'''
+import gzip
+import json
+import struct
+import numpy as np
+from blackjack_model import state_encoding
+from blackjack_model.policy_table import NO_ACTION
+
+EXPORT_VERSION = 1
+EXPORT_FORMATS = ('json', 'binary')
+
+MAGIC = b"BJPOLICY"
+NO_ACTION_CHAR = "-"
+
+def get_export_header():
+    '''
+    Returns the header dict of a policy export
+    '''
+    return {
+        'export_version': EXPORT_VERSION,
+        'encoding_version': state_encoding.ENCODING_VERSION,
+        'actions': list(state_encoding.ACTIONS),
+        'num_states': state_encoding.NUM_STATES,
+    }
+
+def export_policy(policy, export_format="json"):
+    '''
+    Returns the gzip-compressed export of @policy
+
+    :param policy: PolicyTable to export
+    :param export_format: one of EXPORT_FORMATS
+    '''
+    header = get_export_header()
+
+    if export_format == "json":
+        # Map each action index to its character, with NO_ACTION as the last entry
+        chars = np.array([str(i) for i in range(state_encoding.NUM_ACTIONS)] + [NO_ACTION_CHAR])
+        header['policy'] = "".join(chars[policy.actions].tolist())
+        data = json.dumps(header, separators=(",", ":")).encode()
+    elif export_format == "binary":
+        header_bytes = json.dumps(header, separators=(",", ":")).encode()
+        data = MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + policy.actions.astype(np.int8).tobytes()
+    else:
+        raise ValueError(f"Unknown export format {export_format}, must be one of {list(EXPORT_FORMATS)}")
+
+    # No timestamp so the same policy always exports to the same bytes
+    return gzip.compress(data, mtime=0)
+
+def read_export(data):
+    '''
+    Returns the action index array of a policy exported by export_policy, in either format
+
+    :param data: gzip-compressed export
+    '''
+    data = gzip.decompress(data)
+
+    if data.startswith(MAGIC):
+        (header_size,) = struct.unpack("<I", data[len(MAGIC):len(MAGIC) + 4])
+        offset = len(MAGIC) + 4 + header_size
+        header = json.loads(data[len(MAGIC) + 4:offset])
+        actions = np.frombuffer(data, dtype=np.int8, offset=offset)
+    else:
+        header = json.loads(data)
+        codes = np.frombuffer(header['policy'].encode(), dtype=np.uint8)
+        actions = np.where(codes == ord(NO_ACTION_CHAR), NO_ACTION, codes.astype(np.int16) - ord("0")).astype(np.int8)
+
+    if header['export_version'] != EXPORT_VERSION:
+        raise ValueError(f"Unsupported policy export version {header['export_version']}")
+    if header['encoding_version'] != state_encoding.ENCODING_VERSION:
+        raise ValueError(f"Policy export uses state encoding version {header['encoding_version']}, "
+                         f"expected {state_encoding.ENCODING_VERSION}")
+
+    return actions
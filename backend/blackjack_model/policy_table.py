@@ -0,0 +1,80 @@
+import numpy as np
+from blackjack_model import state_encoding
+
+# Marks states without legal actions
+NO_ACTION = -1
+
+class PolicyTable:
+    '''
+    Frozen greedy policy compiled from a trained agent, stored as the best action index
+    for every encoded state
+    '''
+    def __init__(self, actions):
+        '''
+        :param actions: array of action indices indexed by encoded state, NO_ACTION if there is no legal action
+        '''
+        if actions.shape != (state_encoding.NUM_STATES,):
+            raise ValueError(f"Policy must have {state_encoding.NUM_STATES} entries")
+
+        self.actions = np.asarray(actions, dtype=np.int8)
+        self.actions.flags.writeable = False
+
+        # Python list for fast scalar lookups
+        self.action_list = self.actions.tolist()
+
+    def get_action(self, state_index):
+        '''
+        Returns the best action name at an encoded state, None if there is no legal action
+
+        :param state_index: encoded state
+        '''
+        action = self.action_list[state_index]
+        if action == NO_ACTION:
+            return None
+        return state_encoding.ACTIONS[action]
+
+    def get_policy(self, state):
+        '''
+        Returns optimal policy at a given state
+
+        :param state: state tuple we want the best action from
+        '''
+        return self.get_action(state_encoding.encode(state))
+
+def compile_policy(q_table):
+    '''
+    Returns a PolicyTable with the greedy action of @q_table in every state. Ties are broken
+    deterministically by taking the first tied action in state_encoding.ACTIONS order.
+
+    :param q_table: QTable of a trained BlackjackAgent, or of expected values from dp_solver
+    '''
+    legal = state_encoding.legal_action_mask()
+    q_vals = np.where(legal, q_table.values, -np.inf)
+
+    actions = np.argmax(q_vals, axis=1)
+    actions[~legal.any(axis=1)] = NO_ACTION
+
+    return PolicyTable(actions)
+
+def save_policy(policy, path):
+    '''
+    Saves a PolicyTable to @path as a .npy file
+
+    :param policy: PolicyTable to save
+    :param path: output path
+    '''
+    np.save(path, policy.actions)
+
+def load_policy(path):
+    '''
+    Returns the PolicyTable saved at @path
+
+    :param path: path to a policy saved with save_policy
+    '''
+    actions = np.load(path, allow_pickle=False)
+
+    # Policies saved with state encoding version 1 play the same action whether or not they can surrender
+    if actions.shape == (state_encoding.V1_NUM_STATES,):
+        actions = np.repeat(actions, 2)
+
+    return PolicyTable(actions)
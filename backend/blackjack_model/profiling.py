@@ -0,0 +1,250 @@
+'''
+Per-phase timing and profiling of training and evaluation runs
+
+Phase timing wraps the methods of BlackjackGame, BatchBlackjackGame, Shoe, BlackjackAgent and the
+policies in timed versions only while it's installed, so runs without it have no overhead at all. Each phase records
+its number of calls, its total time and its self time, which leaves out the time of other phases
+called inside it, so the self times add up to the time of the run. The wrappers add about a
+microsecond per call, roughly doubling the time of an episode, so read the breakdown as where the
+time goes rather than as absolute timings.
+
+A run can also be profiled with cProfile into a .prof file (for pstats or snakeviz), or sampled
+into collapsed stacks that flamegraph.pl and speedscope turn into a flame graph.
+'''
+import os
+import sys
+import time
+import cProfile
+import functools
+import threading
+from contextlib import contextmanager
+from blackjack_model import evaluation, state_encoding
+from blackjack_model.batch_game import BatchBlackjackGame
+from blackjack_model.blackjack_agent import BlackjackAgent
+from blackjack_model.game import BlackjackGame
+from blackjack_model.policy_table import PolicyTable
+from blackjack_model.q_table import QTable
+from blackjack_model.shoe import Shoe
+
+# Set to 1 to print the phase breakdown, and to a path to profile the run, like the
+# --profile-phases and --profile flags
+PHASES_ENV = "BLACKJACK_PROFILE_PHASES"
+PROFILE_ENV = "BLACKJACK_PROFILE"
+
+# Seconds between stack samples of the sampling profiler
+SAMPLE_INTERVAL = 0.005
+
+# Functions timed in each phase, as (class or module, function name), for one hand at a time
+# and for the batched environment
+PHASES = {
+    'shoe': [(Shoe, 'draw'), (Shoe, 'shuffle'), (BatchBlackjackGame, 'draw'), (BatchBlackjackGame, 'create_shoes')],
+    'deal': [(BlackjackGame, 'deal_player'), (BlackjackGame, 'deal_dealer'), (BatchBlackjackGame, 'deal_hands')],
+    'state': [(BlackjackGame, 'get_state'), (BlackjackGame, 'get_next_state'), (BatchBlackjackGame, 'get_states'),
+              (state_encoding, 'encode_state')],
+    'action choice': [(BlackjackAgent, 'get_action'), (BlackjackAgent, 'get_policy'), (PolicyTable, 'get_policy'),
+                      (BlackjackAgent, 'get_batch_actions')],
+    'q lookup': [(BlackjackAgent, 'compute_best_action'), (QTable, 'get')],
+    'q update': [(BlackjackAgent, 'update'), (BlackjackAgent, 'batch_update')],
+    'player action': [(BlackjackGame, 'hit'), (BlackjackGame, 'stand'), (BlackjackGame, 'double_down'), (BlackjackGame, 'split'),
+                      (BlackjackGame, 'surrender'), (BatchBlackjackGame, 'step'), (BatchBlackjackGame, 'update_current_hands')],
+    'dealer play': [(BlackjackGame, 'evaluate_hand'), (BatchBlackjackGame, 'play_dealers'), (BatchBlackjackGame, 'evaluate_hands')],
+    'reset': [(BlackjackGame, 'reset'), (BatchBlackjackGame, 'reset')],
+    'episode': [(BlackjackAgent, 'run_episode'), (BlackjackAgent, 'run_batch_episode'), (evaluation, 'play_round')],
+}
+
+class PhaseTimer:
+    '''
+    Accumulates the calls, total time and self time of each of PHASES while installed
+    '''
+    def __init__(self):
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.total_times = dict.fromkeys(PHASES, 0.0)
+        self.self_times = dict.fromkeys(PHASES, 0.0)
+
+        # Time spent in timed calls made by each timed call in progress
+        self.child_times = []
+        self.originals = []
+        self.start_time = None
+        self.wall_time = 0.0
+
+    def wrap(self, phase, function):
+        '''
+        Returns @function timed in @phase
+
+        :param phase: name of the phase in PHASES
+        :param function: function to time
+        '''
+        child_times = self.child_times
+        perf_counter = time.perf_counter
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            child_times.append(0.0)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                self.calls[phase] += 1
+                self.total_times[phase] += elapsed
+                self.self_times[phase] += elapsed - child_times.pop()
+                if child_times:
+                    child_times[-1] += elapsed
+
+        return timed
+
+    def install(self):
+        '''
+        Replaces the functions of every phase with timed versions
+        '''
+        if self.originals:
+            raise ValueError("PhaseTimer is already installed")
+
+        for phase, targets in PHASES.items():
+            for owner, name in targets:
+                original = owner.__dict__[name]
+                self.originals.append((owner, name, original))
+                setattr(owner, name, self.wrap(phase, original))
+        self.start_time = time.perf_counter()
+
+    def uninstall(self):
+        '''
+        Restores the original functions
+        '''
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+        self.wall_time += time.perf_counter() - self.start_time
+
+    def get_breakdown(self):
+        '''
+        Returns a list of (phase, calls, self seconds, total seconds) of the phases that were
+        called, by decreasing self time, followed by ('untimed', None, seconds, seconds) of the rest
+        of the run's wall time
+        '''
+        rows = [(phase, self.calls[phase], self.self_times[phase], self.total_times[phase]) for phase in PHASES
+                if self.calls[phase]]
+        rows.sort(key=lambda row: row[2], reverse=True)
+
+        untimed = max(self.wall_time - sum(self.self_times.values()), 0.0)
+        rows.append(('untimed', None, untimed, untimed))
+        return rows
+
+    def print_breakdown(self, file=sys.stdout):
+        '''
+        Prints the breakdown of get_breakdown as a table
+
+        :param file: file to print to
+        '''
+        print(f"{'Phase':<15}{'Calls':>12}{'Self s':>10}{'Self %':>8}{'Total s':>10}{'Self us/call':>14}", file=file)
+        for phase, calls, self_time, total_time in self.get_breakdown():
+            percent = self_time / self.wall_time * 100 if self.wall_time else 0.0
+            per_call = f"{self_time / calls * 1e6:.2f}" if calls else ""
+            calls = "" if calls is None else calls
+            print(f"{phase:<15}{calls:>12}{self_time:>10.3f}{percent:>8.1f}{total_time:>10.3f}{per_call:>14}", file=file)
+        print(f"{'wall time':<15}{'':>12}{self.wall_time:>10.3f}", file=file)
+
+class StackSampler:
+    '''
+    Samples the stack of a thread every @interval seconds from a background thread and counts
+    each distinct stack
+    '''
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        '''
+        :param interval: seconds between samples
+        '''
+        self.interval = interval
+        self.counts = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self, thread_id):
+        '''
+        Samples the stack of @thread_id until stopped
+
+        :param thread_id: ident of the sampled thread
+        '''
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+
+            key = ";".join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        '''
+        Starts sampling the calling thread
+        '''
+        self.thread = threading.Thread(target=self.sample, args=(threading.get_ident(),), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        '''
+        Stops sampling
+        '''
+        self.stop_event.set()
+        self.thread.join()
+
+    def save(self, path):
+        '''
+        Writes the samples to @path as collapsed stacks, one "frame;frame;... count" line per stack
+
+        :param path: output path
+        '''
+        with open(path, "w") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+def add_profile_arguments(parser):
+    '''
+    Adds --profile-phases and --profile to @parser, defaulting to PHASES_ENV and PROFILE_ENV
+
+    :param parser: argparse.ArgumentParser
+    '''
+    parser.add_argument("--profile-phases", action="store_true", default=os.environ.get(PHASES_ENV, "") not in ("", "0"),
+                        help=f"print the time spent in each phase of the run (or set {PHASES_ENV}=1)")
+    parser.add_argument("--profile", default=os.environ.get(PROFILE_ENV) or None, metavar="PATH",
+                        help="profile the run with cProfile to a .prof file, or sample it into collapsed stacks "
+                             f"for a flame graph with any other extension (or set {PROFILE_ENV})")
+
+@contextmanager
+def profile_run(phases=False, output=None):
+    '''
+    Context manager timing the phases of the code it runs and printing the breakdown, and
+    profiling it to @output. Does nothing if neither is asked for.
+
+    :param phases: whether to time each phase
+    :param output: path of a cProfile .prof file, or of collapsed stacks with any other extension,
+                   None to not profile
+    '''
+    timer = PhaseTimer() if phases else None
+    profiler = None
+    if output is not None:
+        profiler = cProfile.Profile() if output.endswith(".prof") else StackSampler()
+
+    if timer is not None:
+        timer.install()
+    if isinstance(profiler, cProfile.Profile):
+        profiler.enable()
+    elif profiler is not None:
+        profiler.start()
+
+    try:
+        yield timer
+    finally:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            profiler.dump_stats(output)
+        elif profiler is not None:
+            profiler.stop()
+            profiler.save(output)
+        if profiler is not None:
+            print(f"Wrote profile to {output}")
+
+        if timer is not None:
+            timer.uninstall()
+            timer.print_breakdown()
@@ -0,0 +1,127 @@
+import numpy as np
+from blackjack_model import state_encoding
+
+class QTable:
+    '''
+    Dense Q-table backed by a numpy array indexed by (encoded state, action index),
+    with an optional array counting how often each entry was updated
+    '''
+    def __init__(self, track_visits=False):
+        '''
+        :param track_visits: Whether to count updates to each (state, action) pair
+        '''
+        self.values = np.zeros((state_encoding.NUM_STATES, state_encoding.NUM_ACTIONS))
+        self.visits = None
+
+        if track_visits:
+            self.visits = np.zeros(self.values.shape, dtype=np.int64)
+
+    def get(self, state, action):
+        '''
+        Returns Q(state, action), 0 if there is no action
+
+        :param state: state tuple
+        :param action: action name
+        '''
+        if action is None:
+            return 0.0
+        return self.values.item(state_encoding.encode_state(*state), state_encoding.ACTION_INDEX[action])
+
+    def get_row(self, state):
+        '''
+        Returns the Q values of every action from @state, in the order of state_encoding.ACTIONS
+
+        :param state: state tuple
+        '''
+        return self.values[state_encoding.encode_state(*state)]
+
+    def set(self, state, action, q_val):
+        '''
+        Sets Q(state, action) to @q_val and counts the visit if visits are tracked
+
+        :param state: state tuple
+        :param action: action name
+        :param q_val: new Q value
+        '''
+        index = (state_encoding.encode_state(*state), state_encoding.ACTION_INDEX[action])
+        self.values[index] = q_val
+
+        if self.visits is not None:
+            self.visits[index] += 1
+
+    def get_learned(self):
+        '''
+        Returns a boolean array marking the entries that have been learned
+        '''
+        learned = self.values != 0
+        if self.visits is not None:
+            learned |= self.visits > 0
+        return learned
+
+    def items(self):
+        '''
+        Yields ((state, action), q_val) for every learned entry
+        '''
+        for state_index, action_index in zip(*np.nonzero(self.get_learned())):
+            state = state_encoding.decode(int(state_index))
+            yield ((state, state_encoding.ACTIONS[action_index]), float(self.values[state_index, action_index]))
+
+    def copy(self):
+        '''
+        Returns a copy of the Q-table
+        '''
+        q_table = QTable()
+        q_table.values = self.values.copy()
+        if self.visits is not None:
+            q_table.visits = self.visits.copy()
+        return q_table
+
+    def __len__(self):
+        '''
+        Returns the number of learned (state, action) pairs
+        '''
+        return int(np.count_nonzero(self.get_learned()))
+
+    def __getstate__(self):
+        '''
+        Pickles only the learned entries
+        '''
+        learned = np.flatnonzero(self.get_learned()).astype(np.uint32)
+        state = {'indices': learned, 'values': self.values.reshape(-1)[learned], 'visits': None,
+                 'encoding_version': state_encoding.ENCODING_VERSION}
+
+        if self.visits is not None:
+            state['visits'] = self.visits.reshape(-1)[learned]
+
+        return state
+
+    def __setstate__(self, state):
+        '''
+        Restores a Q-table pickled by __getstate__, moving entries pickled with state encoding
+        version 1 to their current indices
+        '''
+        self.__init__(track_visits=state['visits'] is not None)
+        indices = state['indices'].astype(np.int64)
+
+        if state.get('encoding_version', 1) == 1:
+            states, actions = divmod(indices, state_encoding.V1_NUM_ACTIONS)
+            indices = state_encoding.upgrade_v1_states(states) * state_encoding.NUM_ACTIONS + actions
+
+        self.values.reshape(-1)[indices] = state['values']
+
+        if self.visits is not None:
+            self.visits.reshape(-1)[indices] = state['visits']
+
+    @classmethod
+    def from_dict(cls, q_vals):
+        '''
+        Returns a QTable holding the entries of a dict keyed by (state, action), as used by
+        agents pickled before the QTable existed
+
+        :param q_vals: dict mapping (state, action) to Q values, where states have no can_surrender component
+        '''
+        q_table = cls()
+        for (state, action), q_val in q_vals.items():
+            if action is not None:
+                q_table.values[state_encoding.encode(state + (False,)), state_encoding.ACTION_INDEX[action]] = q_val
+        return q_table
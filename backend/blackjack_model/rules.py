@@ -0,0 +1,87 @@
+class Rules:
+    '''
+    Table rules of a blackjack game. Rules are compared and hashed by value, so they can be used
+    as keys when keeping policies for several rulesets.
+    '''
+    def __init__(self, dealer_hits_soft_17=False, double_after_split=True, surrender=False, max_hands=None, blackjack_payout=1.5):
+        '''
+        :param dealer_hits_soft_17: Whether the dealer hits soft 17 (H17) instead of standing (S17)
+        :param double_after_split: Whether hands can be doubled after splitting (DAS)
+        :param surrender: Whether late surrender of the first two cards is allowed
+        :param max_hands: Largest number of hands a player can split into, None for unlimited resplits
+        :param blackjack_payout: Payout of a blackjack for each unit bet, 1.5 for 3:2
+        '''
+        # Check valid params
+        if max_hands is not None:
+            if not isinstance(max_hands, int):
+                raise TypeError("max_hands must be an int or None")
+            if max_hands < 1:
+                raise ValueError("max_hands must be at least 1")
+        if not isinstance(blackjack_payout, (int, float)):
+            raise TypeError("blackjack_payout must be a number")
+        if blackjack_payout <= 0:
+            raise ValueError("blackjack_payout must be positive")
+
+        self.dealer_hits_soft_17 = bool(dealer_hits_soft_17)
+        self.double_after_split = bool(double_after_split)
+        self.surrender = bool(surrender)
+        self.max_hands = max_hands
+        self.blackjack_payout = float(blackjack_payout)
+
+        # Whether the dealer draws on each hand value (0 to 22), indexed by value * 2 + is soft
+        self.dealer_hits = tuple(value < 17 or (value == 17 and is_soft and self.dealer_hits_soft_17)
+                                 for value in range(23) for is_soft in (False, True))
+
+    def get_max_hands(self):
+        '''
+        Returns the largest number of hands a player can split into, infinite for unlimited resplits
+        '''
+        if self.max_hands is None:
+            return float('inf')
+        return self.max_hands
+
+    def to_dict(self):
+        '''
+        Returns the rules as a dict of the constructor's parameters
+        '''
+        return {
+            'dealer_hits_soft_17': self.dealer_hits_soft_17,
+            'double_after_split': self.double_after_split,
+            'surrender': self.surrender,
+            'max_hands': self.max_hands,
+            'blackjack_payout': self.blackjack_payout,
+        }
+
+    @classmethod
+    def from_dict(cls, rules):
+        '''
+        Returns the Rules described by a dict from to_dict, where missing rules take their defaults
+
+        :param rules: dict of rule names to values
+        '''
+        unknown = set(rules) - set(cls().to_dict())
+        if unknown:
+            raise ValueError(f"Unknown rules {sorted(unknown)}")
+        return cls(**rules)
+
+    def get_name(self):
+        '''
+        Returns a short name of the rules, like "s17-das-nls-spu-3:2"
+        '''
+        names = [
+            'h17' if self.dealer_hits_soft_17 else 's17',
+            'das' if self.double_after_split else 'ndas',
+            'ls' if self.surrender else 'nls',
+            'spu' if self.max_hands is None else f'sp{self.max_hands}',
+            '3:2' if self.blackjack_payout == 1.5 else '6:5' if self.blackjack_payout == 1.2 else f'bj{self.blackjack_payout:g}',
+        ]
+        return '-'.join(names)
+
+    def __eq__(self, other):
+        return isinstance(other, Rules) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash(tuple(self.to_dict().items()))
+
+    def __repr__(self):
+        return f"Rules({', '.join(f'{name}={value!r}' for name, value in self.to_dict().items())})"
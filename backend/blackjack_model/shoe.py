@@ -0,0 +1,132 @@
+from array import array
+import numpy as np
+
+# Card values of each rank, aces are 1 and face cards are 10
+RANKS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10]
+
+# Count change of each card value (index 0 is unused) and the initial running count per deck,
+# which is -4 for KO so it adds up to 0 once the shoe is dealt
+COUNTING_SYSTEMS = {
+    'hi-lo': ([0, -1, 1, 1, 1, 1, 1, 0, 0, 0, -1], 0),
+    'ko': ([0, -1, 1, 1, 1, 1, 1, 1, 0, 0, -1], -4),
+    'omega-ii': ([0, 0, 1, 1, 2, 2, 2, 1, 0, -1, -2], 0),
+}
+
+class Shoe:
+    '''
+    Shoe of cards stored in a preallocated array and dealt front to back with a cursor.
+    Tracks the number of remaining cards of each value and the running count as cards are dealt.
+    '''
+    def __init__(self, num_decks=6, counting_system='hi-lo', seed=None):
+        '''
+        :param num_decks: Number of decks in the shoe
+        :param counting_system: Name of the counting system in COUNTING_SYSTEMS
+        :param seed: Seed for the shoe's random number generator
+        '''
+        # Check valid params
+        if not isinstance(num_decks, int):
+            raise TypeError("num_decks must be an int")
+        if num_decks < 1:
+            raise ValueError("num_decks must be at least 1")
+        if counting_system not in COUNTING_SYSTEMS:
+            raise ValueError(f"counting_system must be one of {list(COUNTING_SYSTEMS)}")
+
+        self.num_decks = num_decks
+        self.counting_system = counting_system
+        self.count_values, initial_count = COUNTING_SYSTEMS[counting_system]
+        self.initial_count = initial_count * num_decks
+        self.rng = np.random.default_rng(seed)
+
+        # Each rank appears 4 times for each deck
+        self.cards = array('b', RANKS * (4 * num_decks))
+        self.size = len(self.cards)
+        self.full_composition = [0] * 11
+        for card in self.cards:
+            self.full_composition[card] += 1
+
+        self.cursor = 0
+        self.remaining = list(self.full_composition)
+        self.running_count = self.initial_count
+        self.shuffle()
+
+    def shuffle(self):
+        '''
+        Shuffles every card back into the shoe in place and resets the count
+        '''
+        self.rng.shuffle(np.frombuffer(self.cards, dtype=np.int8))
+        self.cursor = 0
+        self.remaining[:] = self.full_composition
+        self.running_count = self.initial_count
+
+    def draw(self, seen=True):
+        '''
+        Returns the next card of the shoe, reshuffling first if the shoe is empty
+
+        :param seen: Whether the card is seen and added to the count
+        '''
+        if self.cursor == self.size:
+            self.shuffle()
+
+        card = self.cards[self.cursor]
+        self.cursor += 1
+        self.remaining[card] -= 1
+
+        if seen:
+            self.running_count += self.count_values[card]
+
+        return card
+
+    def save_position(self):
+        '''
+        Returns the state of the shoe, to deal the same cards again with restore_position
+        '''
+        return (self.cursor, list(self.remaining), self.running_count, self.cards[:], self.rng.bit_generator.state)
+
+    def restore_position(self, position):
+        '''
+        Returns the shoe to a state from save_position
+
+        :param position: state returned by save_position
+        '''
+        self.cursor, remaining, self.running_count, cards, self.rng.bit_generator.state = position
+        self.remaining[:] = remaining
+        self.cards[:] = cards
+
+    def count_card(self, card):
+        '''
+        Updates the running count with a card that was seen
+
+        :param card: the card to be added to the count
+        '''
+        self.running_count += self.count_values[card]
+
+    def get_true_count(self):
+        '''
+        Returns the rounded true count of the shoe, the running count per remaining deck. Unbalanced
+        systems like KO drift from their initial count towards 0 as the shoe is dealt, so the
+        running count they expect with this many cards left is taken off first, centering every
+        system's true count on 0.
+        '''
+        cards_left = self.size - self.cursor
+        if cards_left == 0:
+            return 0
+
+        return round((self.running_count - self.initial_count * cards_left / self.size) / (cards_left / 52))
+
+    def get_composition(self):
+        '''
+        Returns a tuple with the number of remaining cards of each value from 1 (ace) to 10
+        '''
+        return tuple(self.remaining[1:])
+
+    def get_penetration(self):
+        '''
+        Returns the portion of the shoe that has been dealt
+        '''
+        return self.cursor / self.size
+
+    def __len__(self):
+        '''
+        Returns the number of cards left in the shoe
+        '''
+        return self.size - self.cursor
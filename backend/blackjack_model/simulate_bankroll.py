@@ -0,0 +1,144 @@
+import os
+import time
+import argparse
+import numpy as np
+from blackjack_model import bankroll
+from blackjack_model.model_file import load_model
+from blackjack_model.rules import Rules
+from blackjack_model.evaluation import MIN_BET, MAX_BET, SPREAD, HandOutcomes, collect_outcomes
+from blackjack_model.test_agent import MODEL_PATH, load_bet_sizing
+
+# Rounds played once and resampled into every trajectory
+NUM_HANDS = 1000000
+
+# Outcomes of the played rounds, reused by later runs with the same path and settings
+OUTCOMES_PATH = "blackjack_model/outcomes.npz"
+
+# Starting bankrolls in units of the minimum bet
+BANKROLLS = [50, 100, 200, 300, 400, 500, 750, 1000]
+
+def plot_ruin_curves(path, bankrolls, curves, labels):
+    '''
+    Plots the risk of ruin of each ramp against the starting bankroll to @path
+
+    :param path: output image path
+    :param bankrolls: starting bankrolls
+    :param curves: array of shape (number of ramps, len(@bankrolls)) from bankroll.get_ruin_curve
+    :param labels: label of each ramp
+    '''
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    for curve, label in zip(curves, labels):
+        ax.plot(bankrolls, curve * 100, marker="o", label=label)
+
+    ax.set_title("Risk of Ruin by Starting Bankroll")
+    ax.set_xlabel("Starting Bankroll")
+    ax.set_ylabel("Risk of Ruin (%)")
+    ax.grid(alpha=0.3)
+    ax.legend(fontsize="small")
+    fig.savefig(path)
+    plt.close(fig)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the bankroll and risk of ruin of count-based bet ramps")
+    parser.add_argument("--model", default=MODEL_PATH, help="agent .pkl, model .bjq or policy .npy")
+    parser.add_argument("--outcomes", default=OUTCOMES_PATH,
+                        help="outcomes .npz to reuse if it was played with the same model and settings, "
+                             "otherwise the played rounds are saved to it")
+    parser.add_argument("--hands", type=int, default=NUM_HANDS, help="number of rounds played for the outcomes")
+    parser.add_argument("--decks", type=int, default=6)
+    parser.add_argument("--penetration", type=float, default=0.8)
+    parser.add_argument("--h17", action="store_true", help="dealer hits soft 17")
+    parser.add_argument("--no-das", action="store_true", help="no doubling after splitting")
+    parser.add_argument("--surrender", action="store_true", help="allow late surrender")
+    parser.add_argument("--max-hands", type=int, help="largest number of hands after splitting, unlimited by default")
+    parser.add_argument("--blackjack-payout", type=float, default=1.5)
+    parser.add_argument("--workers", type=int, help="number of processes, defaults to the number of CPUs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-bet", type=float, default=MIN_BET)
+    parser.add_argument("--max-bets", nargs="+", type=float, default=[MIN_BET * 4, MIN_BET * 8, MIN_BET * 12, MAX_BET / 10],
+                        help="largest bets of the linear ramps")
+    parser.add_argument("--spreads", nargs="+", type=float, default=[SPREAD - 2, SPREAD],
+                        help="true counts at which the linear ramps reach their max bet")
+    parser.add_argument("--bet-sizing", nargs="+", default=[], metavar="MODULE:FUNCTION",
+                        help="bet sizing functions taking the true count, compared alongside the linear ramps")
+    parser.add_argument("--bankrolls", nargs="+", type=float, help="starting bankrolls, defaults to multiples of --min-bet")
+    parser.add_argument("--sim-hands", type=int, default=100000, help="rounds in each simulated trajectory")
+    parser.add_argument("--trajectories", type=int, default=10000)
+    parser.add_argument("--block-size", type=int, default=bankroll.BLOCK_SIZE,
+                        help="consecutive rounds resampled together, keeping the count's correlation")
+    parser.add_argument("--max-risk", type=float, default=5, help="largest acceptable risk of ruin in percent")
+    parser.add_argument("--hands-per-hour", type=float, default=bankroll.HANDS_PER_HOUR)
+    parser.add_argument("--plot", metavar="PATH", help="plot the risk of ruin curves to this image")
+    args = parser.parse_args()
+
+    rules = Rules(dealer_hits_soft_17=args.h17, double_after_split=not args.no_das, surrender=args.surrender,
+                  max_hands=args.max_hands, blackjack_payout=args.blackjack_payout)
+
+    # Everything the outcomes depend on, a retrained model at the same path changes its modification time
+    settings = {
+        'model': os.path.abspath(args.model),
+        'model_mtime': os.path.getmtime(args.model),
+        'hands': args.hands,
+        'decks': args.decks,
+        'penetration': args.penetration,
+        'seed': args.seed,
+        'rules': rules.to_dict(),
+    }
+
+    # Play the rounds once, every ramp is a scaling of them
+    start = time.perf_counter()
+    outcomes = HandOutcomes.load(args.outcomes) if os.path.exists(args.outcomes) else None
+    if outcomes is not None and outcomes.settings == settings:
+        print(f"Loaded {outcomes.num_rounds} rounds from {args.outcomes} in {time.perf_counter() - start:.1f}s")
+    else:
+        if outcomes is not None:
+            print(f"{args.outcomes} was played with other settings, playing the rounds again")
+        outcomes = collect_outcomes(load_model(args.model), args.hands, num_decks=args.decks, penetration=args.penetration,
+                                    num_workers=args.workers, seed=args.seed, rules=rules)
+        outcomes.settings = settings
+        outcomes.save(args.outcomes)
+        print(f"Played {outcomes.num_rounds} rounds in {time.perf_counter() - start:.1f}s, saved to {args.outcomes}")
+
+    ramps, labels = bankroll.get_linear_ramps(args.min_bet, args.max_bets, args.spreads)
+    if args.bet_sizing:
+        ramps = np.vstack([ramps] + [bankroll.get_ramp(load_bet_sizing(name)) for name in args.bet_sizing])
+        labels += args.bet_sizing
+
+    bankrolls = args.bankrolls or [args.min_bet * units for units in BANKROLLS]
+    max_risk = args.max_risk / 100
+
+    start = time.perf_counter()
+    stats = bankroll.get_ramp_stats(outcomes, ramps, args.hands_per_hour)
+    lowest, final = bankroll.simulate_bankrolls(outcomes, ramps, args.sim_hands, args.trajectories, seed=args.seed,
+                                                block_size=args.block_size)
+    curves = bankroll.get_ruin_curve(lowest, bankrolls)
+    print(f"Simulated {args.trajectories} trajectories of {args.sim_hands} rounds for {len(ramps)} ramps "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    print(f"\n{'Ramp':<24}{'Avg bet':>9}{'Edge %':>8}{'EV/hr':>9}{'SD/hr':>9}{'N0':>11}{'Mean final':>12}")
+    for i, label in enumerate(labels):
+        print(f"{label:<24}{stats['average_bet'][i]:>9.2f}{stats['edge'][i] * 100:>8.2f}{stats['hourly_ev'][i]:>9.2f}"
+              f"{stats['hourly_sd'][i]:>9.1f}{stats['n0'][i]:>11.0f}{final[i].mean():>12.0f}")
+
+    print(f"\nRisk of ruin (%) within {args.sim_hands} rounds, simulated / normal approximation forever")
+    print(f"{'Ramp':<24}" + "".join(f"{amount:>14g}" for amount in bankrolls))
+    for i, label in enumerate(labels):
+        risks = [f"{curves[i, j] * 100:.1f}/{bankroll.get_theoretical_risk(stats['ev'][i], stats['sd'][i], amount) * 100:.1f}"
+                 for j, amount in enumerate(bankrolls)]
+        print(f"{label:<24}" + "".join(f"{risk:>14}" for risk in risks))
+
+    print(f"\nBest ramp by EV with at most {args.max_risk:g}% risk of ruin:")
+    for j, amount in enumerate(bankrolls):
+        best = bankroll.get_best_ramp(stats, curves[:, j], max_risk)
+        if best is None:
+            print(f"  {amount:g}: no ramp with an edge is that safe")
+        else:
+            print(f"  {amount:g}: {labels[best]}, {stats['hourly_ev'][best]:.2f}/hr, {curves[best, j] * 100:.1f}% risk")
+
+    if args.plot:
+        plot_ruin_curves(args.plot, bankrolls, curves, labels)
+        print(f"Wrote risk of ruin curves to {args.plot}")
@@ -0,0 +1,29 @@
+import os
+import time
+from blackjack_model.dp_solver import solve
+from blackjack_model.game import BlackjackGame
+from blackjack_model.model_file import MODEL_EXTENSION, get_rules, save_model
+from blackjack_model.policy_table import compile_policy, save_policy
+from blackjack_model.rules import Rules
+
+POLICY_PATH = "blackjack_model/solver_policy.npy"
+
+# Table rules the policy is solved for
+RULES = Rules()
+
+# The expected values are also saved as a model file here, named after the rules, which the
+# backend serves for requests with these rules
+POLICY_DIR = "blackjack_model/policies"
+
+# Compute expected values and keep the best action of each state
+start = time.time()
+values = solve(RULES)
+policy = compile_policy(values)
+save_policy(policy, POLICY_PATH)
+
+game = BlackjackGame(rules=RULES)
+model_path = os.path.join(POLICY_DIR, f"solver-{game.num_decks}d-{RULES.get_name().replace(':', 'to')}{MODEL_EXTENSION}")
+os.makedirs(POLICY_DIR, exist_ok=True)
+save_model(values, model_path, get_rules(game))
+
+print(f"Solved policy for {len(policy.actions)} states in {time.time() - start:.1f}s, saved to {POLICY_PATH} and {model_path}")
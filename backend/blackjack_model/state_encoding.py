@@ -0,0 +1,126 @@
+'''
+Maps agent states of the form
+(player_hand_val, is_soft, dealer_hand_val, can_split, can_double, can_act, true_count, can_surrender)
+to dense integer indices so they can be used to index flat arrays
+'''
+import numpy as np
+
+# Version of the encoding, stored with saved models and bumped whenever indices change.
+# Version 1 had no surrender action and no can_surrender component.
+ENCODING_VERSION = 2
+
+# Actions in the order BlackjackAgent.get_legal_actions lists them
+ACTIONS = ('hit', 'stand', 'split', 'double', 'surrender')
+ACTION_INDEX = {action: i for i, action in enumerate(ACTIONS)}
+NUM_ACTIONS = len(ACTIONS)
+
+# Ranges of each state component
+PLAYER_VALS = 23    # 0 to 22, where 22 represents a bust
+DEALER_MIN = 2
+DEALER_VALS = 10    # 2 to 11
+TRUE_COUNT_MIN = -5
+TRUE_COUNTS = 11    # -5 to 5
+
+NUM_STATES = PLAYER_VALS * 2 * DEALER_VALS * 2 * 2 * 2 * TRUE_COUNTS * 2
+
+# Number of states and actions of encoding version 1, which had no surrender
+V1_NUM_STATES = NUM_STATES // 2
+V1_NUM_ACTIONS = 4
+
+def encode_state(player_val, is_soft, dealer_val, can_split, can_double, can_act, true_count, can_surrender):
+    '''
+    Returns the dense index of a state. Works on plain values as well as
+    numpy arrays of equal shape, in which case an array of indices is returned
+
+    :param player_val: value of the player hand, 22 if busted
+    :param is_soft: whether the player hand value is soft
+    :param dealer_val: value of the dealer's shown card
+    :param can_split: whether the player can split
+    :param can_double: whether the player can double down
+    :param can_act: whether the player can act
+    :param true_count: binned true count in the range [-5, 5]
+    :param can_surrender: whether the player can surrender
+    '''
+    index = player_val * 2 + is_soft
+    index = index * DEALER_VALS + (dealer_val - DEALER_MIN)
+    index = index * 2 + can_split
+    index = index * 2 + can_double
+    index = index * 2 + can_act
+    index = index * TRUE_COUNTS + (true_count - TRUE_COUNT_MIN)
+    return index * 2 + can_surrender
+
+def encode(state):
+    '''
+    Returns the dense index of a state tuple, raises a ValueError if the state is
+    outside of the encodable range
+
+    :param state: state tuple to encode
+    '''
+    player_val, is_soft, dealer_val, can_split, can_double, can_act, true_count, can_surrender = state
+
+    if not 0 <= player_val < PLAYER_VALS:
+        raise ValueError(f"Player value of {player_val} is invalid, must be in the range [0, {PLAYER_VALS - 1}]")
+    if not DEALER_MIN <= dealer_val < DEALER_MIN + DEALER_VALS:
+        raise ValueError(f"Dealer value of {dealer_val} is invalid, must be in the range [{DEALER_MIN}, {DEALER_MIN + DEALER_VALS - 1}]")
+    if not TRUE_COUNT_MIN <= true_count < TRUE_COUNT_MIN + TRUE_COUNTS:
+        raise ValueError(f"True count of {true_count} is invalid, must be in the range [{TRUE_COUNT_MIN}, {TRUE_COUNT_MIN + TRUE_COUNTS - 1}]")
+
+    return encode_state(player_val, bool(is_soft), dealer_val, bool(can_split), bool(can_double), bool(can_act), true_count,
+                        bool(can_surrender))
+
+def decode(index):
+    '''
+    Returns the state tuple represented by a dense index
+
+    :param index: index to decode
+    '''
+    if not 0 <= index < NUM_STATES:
+        raise ValueError(f"State index {index} is invalid, must be in the range [0, {NUM_STATES - 1}]")
+
+    index, can_surrender = divmod(index, 2)
+    index, true_count = divmod(index, TRUE_COUNTS)
+    index, can_act = divmod(index, 2)
+    index, can_double = divmod(index, 2)
+    index, can_split = divmod(index, 2)
+    index, dealer_val = divmod(index, DEALER_VALS)
+    player_val, is_soft = divmod(index, 2)
+
+    return (player_val, bool(is_soft), dealer_val + DEALER_MIN, bool(can_split), bool(can_double), bool(can_act), true_count + TRUE_COUNT_MIN,
+            bool(can_surrender))
+
+def legal_action_mask():
+    '''
+    Returns a boolean array of shape (NUM_STATES, NUM_ACTIONS) marking the legal actions of
+    every state, following BlackjackAgent.get_legal_actions
+    '''
+    index = np.arange(NUM_STATES)
+    can_surrender = index % 2 == 1
+
+    index = index // 2 // TRUE_COUNTS
+    can_act = index % 2 == 1
+    can_double = (index // 2) % 2 == 1
+    can_split = (index // 4) % 2 == 1
+
+    return np.stack([can_act, can_act, can_split, can_double, can_surrender], axis=1)
+
+def upgrade_v1_states(indices):
+    '''
+    Returns the indices of states encoded with version 1, which have no can_surrender
+    component, in the current encoding
+
+    :param indices: version 1 state indices
+    '''
+    return indices * 2
+
+def upgrade_v1_values(values, fill=0.0):
+    '''
+    Returns an array of shape (NUM_STATES, NUM_ACTIONS) holding per (state, action) values of
+    shape (V1_NUM_STATES, V1_NUM_ACTIONS) from encoding version 1. States that can surrender and
+    the surrender action, which version 1 didn't have, are set to @fill.
+
+    :param values: version 1 values, like Q-values
+    :param fill: value of the new entries
+    '''
+    upgraded = np.full((NUM_STATES, NUM_ACTIONS), fill, dtype=values.dtype)
+    upgraded[upgrade_v1_states(np.arange(V1_NUM_STATES)), :V1_NUM_ACTIONS] = values
+    return upgraded
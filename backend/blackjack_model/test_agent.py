@@ -1,79 +1,102 @@
-import pickle
-from blackjack_model.blackjack_agent import BlackjackAgent
-from blackjack_model.game import BlackjackGame
-
-# Load agent
-with open("blackjack_model/blackjack_agent.pkl", "rb") as f:
-    blackjack_agent = pickle.load(f)
+import argparse
+import importlib
+from functools import partial
+from blackjack_model.model_file import load_model
+from blackjack_model.profiling import add_profile_arguments, profile_run
+from blackjack_model.rules import Rules
+from blackjack_model.evaluation import MIN_BET, MAX_BET, SPREAD, evaluate_policy, compare_policies, get_bet_sizing, get_z_score
 
 MAX_ITER = 10000000
-MIN_BET = 10
-MAX_BET = 1000
-SPREAD = 5
-
-total_winnings = 0
-total_bet = 0
-game = BlackjackGame(num_decks=6, penetration=0.8)
 
-BETTING_UNIT = (MAX_BET - MIN_BET) / SPREAD
+# Pickled agent, model file from convert_model.py, or policy table from export_policy.py or solve_policy.py
+MODEL_PATH = "blackjack_model/blackjack_agent.pkl"
 
-def get_bet_sizing(true_count):
+def load_bet_sizing(name):
     '''
-    Returns a bet size based on @true_count that scales linearly between min and max bets
-    
-    :param true_count: true count of deck
-    '''
-    if true_count <= 0:
-        return MIN_BET
-    return min(MIN_BET + (BETTING_UNIT * (true_count)), MAX_BET)
-
-# Test our agent MAX_ITER times
-for _ in range(MAX_ITER):
-    # Get our bet sizing
-    bet = get_bet_sizing(game.bin_true_count(game.get_true_count()))
-
-    # Deal player and dealer
-    game.deal_player()
-    game.deal_dealer(False)
-    game.deal_player()
-    game.deal_dealer(True)
-
-    # Check for dealer blackjack
-    if not game.is_dealer_blackjack():
-        # Iterate over each player hand and let them play actions
-        while game.get_current_hand() < game.get_num_hands():
-            # Add a card for recently split hands
-            if game.get_current_hand_length() == 1:
-                game.deal_player()
-
-            state = game.get_state()
-            
-            # Perform an action
-            action = blackjack_agent.get_policy(state)
+    Returns the bet sizing function named by @name
 
-            if action == 'hit':
-                game.hit()
-            elif action == 'stand':
-                game.stand()
-            elif action == 'double':
-                game.double_down()
-            elif action == 'split':
-                game.split()
-
-            # Evaluate if the hand ended
-            game.update_current_hand()
-
-    # Evaluate payouts after playing dealer if needed
-    payouts = game.evaluate_hand()
-    total_payoff = 0
-
-    for payout in payouts:
-        total_bet += abs(payout) * bet
-        total_payoff += payout
-
-    total_winnings += total_payoff * bet
-
-    # Reset game to prepare for a new hand
-    game.reset()
-
-print(f"Player Edge over {MAX_ITER} hands: {((total_winnings / total_bet) * 100):.2f}%")
+    :param name: "module:function", like "blackjack_model.evaluation:flat_bet"
+    '''
+    module_name, _, function_name = name.partition(":")
+    if not function_name:
+        raise ValueError("bet sizing must be given as module:function")
+    return getattr(importlib.import_module(module_name), function_name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate the player edge of an agent or policy table")
+    parser.add_argument("--model", default=MODEL_PATH, help="agent .pkl, model .bjq or policy .npy")
+    parser.add_argument("--hands", type=int, default=MAX_ITER, help="maximum number of hands")
+    parser.add_argument("--decks", type=int, default=6)
+    parser.add_argument("--penetration", type=float, default=0.8)
+    parser.add_argument("--h17", action="store_true", help="dealer hits soft 17")
+    parser.add_argument("--no-das", action="store_true", help="no doubling after splitting")
+    parser.add_argument("--surrender", action="store_true", help="allow late surrender")
+    parser.add_argument("--max-hands", type=int, help="largest number of hands after splitting, unlimited by default")
+    parser.add_argument("--blackjack-payout", type=float, default=1.5)
+    parser.add_argument("--min-bet", type=float, default=MIN_BET)
+    parser.add_argument("--max-bet", type=float, default=MAX_BET)
+    parser.add_argument("--spread", type=float, default=SPREAD, help="true count at which the max bet is reached")
+    parser.add_argument("--bet-sizing", help="module:function taking the true count, replaces the linear spread")
+    parser.add_argument("--workers", type=int, help="number of processes, defaults to the number of CPUs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--precision", type=float, help="stop once the confidence interval is within this many percent")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--compare", nargs="+", metavar="MODEL",
+                        help="models played on the same cards as --model to compare against it")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    # Phase timing and profiling only see this process, so profiled runs play in it unless --workers is given
+    workers = args.workers
+    if workers is None and (args.profile_phases or args.profile):
+        workers = 1
+
+    if args.bet_sizing:
+        bet_sizing = load_bet_sizing(args.bet_sizing)
+    else:
+        bet_sizing = partial(get_bet_sizing, min_bet=args.min_bet, max_bet=args.max_bet, spread=args.spread)
+
+    rules = Rules(dealer_hits_soft_17=args.h17, double_after_split=not args.no_das, surrender=args.surrender,
+                  max_hands=args.max_hands, blackjack_payout=args.blackjack_payout)
+
+    precision = None if args.precision is None else args.precision / 100
+    settings = {
+        'bet_sizing': bet_sizing,
+        'num_decks': args.decks,
+        'penetration': args.penetration,
+        'rules': rules,
+        'num_workers': workers,
+        'seed': args.seed,
+        'precision': precision,
+        'confidence': args.confidence,
+    }
+
+    # Compare models on the same cards
+    if args.compare:
+        paths = [args.model] + args.compare
+        policies = [load_model(path) for path in paths]
+        with profile_run(args.profile_phases, args.profile):
+            stats = compare_policies(policies, args.hands, **settings)
+
+        print(f"Player Edge over {stats.num_rounds} hands on the same cards:")
+        edges = stats.get_edges()
+        for i, path in enumerate(paths):
+            print(f"  {path}: {(edges[i] * 100):.2f}% (standard error {(stats.get_standard_error(i) * 100):.3f}%)")
+
+        z_score = get_z_score(args.confidence)
+        for i in range(1, len(paths)):
+            difference = stats.get_difference(i, 0)
+            half_width = z_score * stats.get_difference_standard_error(i, 0)
+            print(f"{paths[i]} - {paths[0]}: {(difference * 100):+.3f}% ± {(half_width * 100):.3f}% "
+                  f"({args.confidence:.0%} confidence), {stats.get_variance_reduction(i, 0):.1f}x fewer hands than independent runs")
+
+    # Test our agent
+    else:
+        policy = load_model(args.model)
+        with profile_run(args.profile_phases, args.profile):
+            stats = evaluate_policy(policy, args.hands, **settings)
+
+        low, high = stats.get_confidence_interval(args.confidence)
+        print(f"Player Edge over {stats.num_rounds} hands: {(stats.get_edge() * 100):.2f}%")
+        print(f"Standard error: {(stats.get_standard_error() * 100):.3f}%, "
+              f"{args.confidence:.0%} confidence interval: [{(low * 100):.2f}%, {(high * 100):.2f}%]")
@@ -0,0 +1,160 @@
+'''
+Convergence metrics and checkpoints for long training runs
+'''
+import os
+import csv
+import json
+import time
+import pickle
+import tempfile
+import numpy as np
+from blackjack_model import state_encoding
+from blackjack_model.policy_table import compile_policy
+
+METRIC_FIELDS = ('episodes', 'episodes_per_sec', 'q_delta_norm', 'greedy_changed_pct', 'coverage_pct', 'epsilon', 'alpha')
+
+# States with at least one legal action, the states a policy is defined on
+POLICY_STATES = state_encoding.legal_action_mask().any(axis=1)
+
+def save_checkpoint(path, checkpoint):
+    '''
+    Atomically pickles @checkpoint to @path, so a crash while saving leaves the previous checkpoint intact
+
+    :param path: checkpoint path
+    :param checkpoint: dict of everything needed to resume training
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+
+    # Write to a temporary file in the same directory, then replace the checkpoint in one step
+    with tempfile.NamedTemporaryFile("wb", dir=directory, prefix=".checkpoint-", delete=False) as f:
+        try:
+            pickle.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            os.remove(f.name)
+            raise
+
+    os.replace(f.name, path)
+
+def load_checkpoint(path):
+    '''
+    Returns the checkpoint saved at @path, None if there is no checkpoint
+
+    :param path: checkpoint path
+    '''
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+class TrainingMonitor:
+    '''
+    Records convergence metrics of an agent at intervals and decides when its policy has stopped changing
+    '''
+    def __init__(self, metrics_path=None, stable_intervals=0, tolerance=0.1):
+        '''
+        :param metrics_path: .csv or .jsonl file metrics are appended to, None to not write metrics
+        :param stable_intervals: stop once the greedy policy has been stable for this many intervals, 0 to never stop
+        :param tolerance: largest percentage of states whose greedy action can change in a stable interval
+        '''
+        self.metrics_path = metrics_path
+        self.stable_intervals = stable_intervals
+        self.tolerance = tolerance
+
+        self.last_values = None
+        self.last_actions = None
+        self.last_episodes = 0
+        self.last_time = None
+        self.stable_count = 0
+
+    def __getstate__(self):
+        '''
+        Pickles the monitor without its timer, which restarts when training resumes
+        '''
+        state = dict(self.__dict__)
+        state['last_time'] = None
+        return state
+
+    def start(self, agent, episodes=0):
+        '''
+        Takes the starting snapshot that the first interval is compared to
+
+        :param agent: BlackjackAgent being trained
+        :param episodes: number of episodes already played
+        '''
+        if self.last_values is None:
+            self.last_values = agent.q_vals.values.copy()
+            self.last_actions = compile_policy(agent.q_vals).actions
+        self.last_episodes = episodes
+        self.last_time = time.perf_counter()
+
+    def get_metrics(self, agent, episodes):
+        '''
+        Returns a dict of METRIC_FIELDS since the last snapshot and takes a new snapshot
+
+        :param agent: BlackjackAgent being trained
+        :param episodes: total number of episodes played
+        '''
+        now = time.perf_counter()
+        values = agent.q_vals.values
+        actions = compile_policy(agent.q_vals).actions
+
+        changed = (actions != self.last_actions) & POLICY_STATES
+        learned = agent.q_vals.get_learned().any(axis=1) & POLICY_STATES
+
+        metrics = {
+            'episodes': episodes,
+            'episodes_per_sec': (episodes - self.last_episodes) / max(now - self.last_time, 1e-9),
+            'q_delta_norm': float(np.linalg.norm(values - self.last_values)),
+            'greedy_changed_pct': 100 * np.count_nonzero(changed) / np.count_nonzero(POLICY_STATES),
+            'coverage_pct': 100 * np.count_nonzero(learned) / np.count_nonzero(POLICY_STATES),
+            'epsilon': agent.epsilon,
+            'alpha': agent.alpha,
+        }
+
+        self.last_values = values.copy()
+        self.last_actions = actions
+        self.last_episodes = episodes
+        self.last_time = now
+
+        return metrics
+
+    def write_metrics(self, metrics):
+        '''
+        Appends @metrics to the metrics file as a CSV row or a JSON line
+
+        :param metrics: dict of METRIC_FIELDS
+        '''
+        if self.metrics_path is None:
+            return
+
+        if self.metrics_path.endswith(".csv"):
+            is_new = not os.path.exists(self.metrics_path) or os.path.getsize(self.metrics_path) == 0
+            with open(self.metrics_path, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=METRIC_FIELDS)
+                if is_new:
+                    writer.writeheader()
+                writer.writerow(metrics)
+        else:
+            with open(self.metrics_path, "a") as f:
+                f.write(json.dumps(metrics) + "\n")
+
+    def update(self, agent, episodes):
+        '''
+        Records the metrics of the interval that just ended and returns them along with whether
+        training should stop, as a tuple of (metrics, is converged)
+
+        :param agent: BlackjackAgent being trained
+        :param episodes: total number of episodes played
+        '''
+        metrics = self.get_metrics(agent, episodes)
+        self.write_metrics(metrics)
+
+        if metrics['greedy_changed_pct'] <= self.tolerance:
+            self.stable_count += 1
+        else:
+            self.stable_count = 0
+
+        return (metrics, bool(self.stable_intervals) and self.stable_count >= self.stable_intervals)
@@ -0,0 +1,54 @@
+import argparse
+import json
+import random
+import time
+from load_test import random_hand
+from optimal_policy import app, model, parse_hand
+
+def time_per_call(function, args_list):
+    '''
+    Returns the mean time in microseconds of calling @function once on each of @args_list
+
+    :param function: function to time
+    :param args_list: list of argument tuples
+    '''
+    start = time.perf_counter()
+    for args in args_list:
+        function(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1e6
+
+def run_benchmark(num_calls):
+    '''
+    Returns a dict of the mean microseconds per call of parsing and looking up random hands, and
+    of the whole /get_policy handler through Flask's test client, without any network
+
+    :param num_calls: number of calls timed for each measurement
+    '''
+    hands = [random_hand() for _ in range(num_calls)]
+    client = app.test_client()
+
+    def lookup(hand):
+        state_index, _ = parse_hand(hand)
+        return model.get_action(state_index)
+
+    def handle(body):
+        return client.post('/get_policy', data=body, content_type='application/json')
+
+    return {
+        "parse_us": time_per_call(parse_hand, [(hand,) for hand in hands]),
+        "parse_and_lookup_us": time_per_call(lookup, [(hand,) for hand in hands]),
+        "handler_us": time_per_call(handle, [(json.dumps(hand),) for hand in hands]),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the /get_policy request handler in process")
+    parser.add_argument("--calls", type=int, default=20000, help="number of calls per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results = run_benchmark(args.calls)
+
+    print(f"parse_hand: {results['parse_us']:.2f} us")
+    print(f"parse_hand + policy lookup: {results['parse_and_lookup_us']:.2f} us")
+    print(f"/get_policy handler: {results['handler_us']:.1f} us")
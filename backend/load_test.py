@@ -0,0 +1,73 @@
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib import request
+
+RANKS = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "0", "J", "Q", "K"]
+SUITS = ["H", "D", "C", "S"]
+
+def random_hand():
+    '''
+    Returns a random /get_policy request body
+    '''
+    def card():
+        return random.choice(RANKS) + random.choice(SUITS)
+
+    return {"player_cards": [card(), card()], "dealer_card": card(), "true_count": random.randint(-5, 5)}
+
+def timed_request(url, body):
+    '''
+    Returns the latency in seconds of posting @body to @url
+
+    :param url: endpoint to post to
+    :param body: encoded JSON request body
+    '''
+    req = request.Request(url, data=body, headers={"Content-Type": "application/json"})
+
+    start = time.perf_counter()
+    with request.urlopen(req) as response:
+        response.read()
+    return time.perf_counter() - start
+
+def percentile(values, fraction):
+    '''
+    Returns the value at @fraction of the sorted @values
+
+    :param values: sorted list of values
+    :param fraction: percentile as a fraction between 0 and 1
+    '''
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def run_load_test(url, num_requests, concurrency):
+    '''
+    Sends @num_requests random hands to @url from @concurrency threads and returns a dict of
+    latency percentiles in milliseconds and requests per second
+
+    :param url: /get_policy endpoint
+    :param num_requests: total number of requests
+    :param concurrency: number of requests in flight at once
+    '''
+    bodies = [json.dumps(random_hand()).encode() for _ in range(num_requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = sorted(executor.map(lambda body: timed_request(url, body), bodies))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "rps": num_requests / elapsed,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the /get_policy endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/get_policy")
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    results = run_load_test(args.url, args.requests, args.concurrency)
+    print(f"p50: {results['p50_ms']:.2f} ms, p99: {results['p99_ms']:.2f} ms, {results['rps']:.0f} requests/s")
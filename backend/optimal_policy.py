@@ -1,22 +1,34 @@
-import pickle
+import os
 import sys
+import gzip
+import json
+import time
+import weakref
+import zlib
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from blackjack_model.game import BlackjackGame
-from blackjack_model.blackjack_agent import BlackjackAgent
+from blackjack_model import state_encoding
+from blackjack_model.model_file import load_policy_table
+from blackjack_model.policy_export import EXPORT_FORMATS, export_policy
+from blackjack_model.rules import Rules
+from policy_registry import DEFAULT_NUM_DECKS, PolicyRegistry, get_key, parse_rules
+from response_cache import ResponseCache
+from server_metrics import ServerMetrics
 
 app = Flask(__name__)
 
 # Allows frontend to access @app
 CORS(app)
 
-# Read in our trained agent's policy
-POLICY_PATH = "backend/blackjack_model/blackjack_agent.pkl"
+# Read in our trained agent's compiled policy, created by blackjack_model/export_policy.py. A .bjq
+# model file is memory mapped and compiled at startup, and a pickled agent is also accepted
+POLICY_PATH = "backend/blackjack_model/blackjack_policy.npy"
 
 try: 
-    with open(POLICY_PATH, "rb") as file:
-        model = pickle.load(file)
+    load_start = time.perf_counter()
+    model = load_policy_table(POLICY_PATH)
+    model_load_seconds = time.perf_counter() - load_start
 except FileNotFoundError:
     print(f"Policy model could not be found at {POLICY_PATH}")
     sys.exit(1)
@@ -24,107 +36,333 @@ except Exception as e:
     print(f"Failed to load policy model: {e}")
     sys.exit(1)
 
-# Send state information to get policy
-@app.route('/get_policy', methods=['POST'])
+# Model files for other rules and deck counts, chosen with the rules field of a request. Only their
+# headers are read at startup, each policy is loaded on first use and at most MAX_LOADED_POLICIES
+# are kept in memory at once, evicting the least recently used
+POLICY_DIR = "backend/blackjack_model/policies"
+MAX_LOADED_POLICIES = 8
+
+# The default policy is served for requests without rules and is never evicted
+DEFAULT_KEY = get_key(DEFAULT_NUM_DECKS, Rules())
+
+registry = PolicyRegistry(MAX_LOADED_POLICIES)
+registry.pin(DEFAULT_KEY, model, model_load_seconds, os.path.getsize(POLICY_PATH))
+registry.discover(POLICY_DIR)
+
+# Serialized /get_policy responses, cached by encoded state. Responses carry an ETag and may be
+# cached by browsers and proxies for CACHE_MAX_AGE seconds. With WARM_RESPONSE_CACHE, every state of
+# the default policy is rendered at startup (serve.py --warm-cache does the same)
+CACHE_MAX_AGE = 3600
+CACHE_CONTROL = f"public, max-age={CACHE_MAX_AGE}"
+WARM_RESPONSE_CACHE = False
+
+response_cache = ResponseCache()
+if WARM_RESPONSE_CACHE:
+    response_cache.warm(model)
+
+# Request latencies, errors and policies sent, exported in the Prometheus text format by /metrics.
+# Like the caches, they're per worker process under serve.py
+metrics = ServerMetrics()
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(registry.get_load_info()), mimetype="text/plain; version=0.0.4")
+
+def error_response(error, error_type):
+    '''
+    Returns a 400 response with @error, counting it under @error_type
+
+    :param error: error message
+    :param error_type: label of the error in /metrics
+    '''
+    metrics.count_error(error_type)
+    return jsonify({"error": error}), 400
+
+# Readiness check, the policy is loaded before the app starts serving
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok", "states": len(model.actions)})
+
+# Registered and loaded policies with cache hit and miss counts, which are per worker process under serve.py
+@app.route('/policy_stats', methods=['GET'])
+def policy_stats():
+    return jsonify(registry.get_stats())
+
+# Hits, misses and hit rate of the response cache, per worker process under serve.py
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.get_stats())
+
+def get_model(hand):
+    '''
+    Returns a tuple as:
+    (policy table for the rules of @hand, the Rules)
+    Raises ValueError if the rules are invalid or have no policy
+
+    :param hand: a request dict, with an optional rules field
+    '''
+    if hand.get('rules') is None:
+        return (model, DEFAULT_KEY[1])
+
+    key = parse_rules(hand['rules'])
+    return (registry.get_policy_table(key), key[1])
+
+def get_query_hand(args):
+    '''
+    Returns a tuple as:
+    (hand dict in the form of a /get_policy request body, None) for a GET query string, or
+    (None, error message) if it can't be read
+
+    :param args: query string arguments, player_cards as comma separated cards and rules as JSON
+    '''
+    player_cards = args.get('player_cards', '')
+    hand = {
+        'player_cards': player_cards.split(',') if player_cards else [],
+        'dealer_card': args.get('dealer_card', ''),
+        'true_count': args.get('true_count', '', type=int),
+    }
+
+    hand['rules'], error = get_query_rules(args)
+    if error is not None:
+        return (None, error)
+
+    return (hand, None)
+
+def get_query_rules(args):
+    '''
+    Returns a tuple as:
+    (rules field of a query string decoded from JSON, None if there is none, None), or
+    (None, error message) if it isn't valid JSON
+
+    :param args: query string arguments
+    '''
+    if 'rules' not in args:
+        return (None, None)
+
+    try:
+        return (json.loads(args['rules']), None)
+    except ValueError:
+        return (None, "Rules must be a JSON object")
+
+def get_policy_response(policy, state_index):
+    '''
+    Returns the cached response of @policy at @state_index with its ETag and caching headers,
+    or 304 Not Modified for a GET request whose copy is current
+
+    :param policy: PolicyTable
+    :param state_index: encoded state
+    '''
+    body, etag = response_cache.get_response(policy, state_index)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if request.method == 'GET' and etag in request.headers.get("If-None-Match", ""):
+        return Response(status=304, headers=headers)
+
+    return Response(body, mimetype="application/json", headers=headers)
+
+# Send state information to get policy, as a JSON body or, to let browsers and proxies cache the
+# response, as a GET query string like ?player_cards=AH,0S&dealer_card=6D&true_count=0
+@app.route('/get_policy', methods=['GET', 'POST'])
 def get_policy():
-    data = request.json
-    player_cards = data.get('player_cards', '')
-    dealer_card = data.get('dealer_card', '')
-    true_count = data.get('true_count', '')
+    if request.method == 'GET':
+        data, error = get_query_hand(request.args)
+        if error is not None:
+            return error_response(error, "rules")
+    else:
+        data = request.get_json(silent=True)
+
+    if not isinstance(data, dict):
+        return error_response("Request body must be a JSON object", "body")
+
+    try:
+        hand_model, rules = get_model(data)
+    except ValueError as e:
+        return error_response(str(e), "rules")
+
+    state_index, error = parse_hand(data, rules)
+    if error is not None:
+        return error_response(error, get_error_type(error))
+
+    metrics.count_policy(hand_model.get_action(state_index), data['true_count'])
+    return get_policy_response(hand_model, state_index)
+
+# Gzip-compressed exports of each policy and their ETags, by format
+policy_exports = weakref.WeakKeyDictionary()
 
-    state = convert_to_state(player_cards, dealer_card, true_count)
+EXPORT_MIMETYPES = {"json": "application/json", "binary": "application/octet-stream"}
 
-    return jsonify({"policy": model.get_policy(state)})
+# Send the whole policy table of a ruleset, as exported by blackjack_model/policy_export.py, so
+# clients can fetch it once and look policies up locally
+@app.route('/policy_table', methods=['GET'])
+def policy_table():
+    export_format = request.args.get('format', 'json')
+    if export_format not in EXPORT_FORMATS:
+        return error_response(f"Format must be one of {list(EXPORT_FORMATS)}", "format")
 
-def validate_card(card):
+    rules, error = get_query_rules(request.args)
+    if error is not None:
+        return error_response(error, "rules")
+
+    try:
+        table_model, _ = get_model({'rules': rules})
+    except ValueError as e:
+        return error_response(str(e), "rules")
+
+    # Exports are created on first request and kept until their policy is evicted
+    exports = policy_exports.setdefault(table_model, {})
+    if export_format not in exports:
+        data = export_policy(table_model, export_format)
+        exports[export_format] = (data, f'"{zlib.crc32(data):08x}"')
+    data, etag = exports[export_format]
+
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status=304, headers=headers)
+
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+    else:
+        data = gzip.decompress(data)
+
+    return Response(data, mimetype=EXPORT_MIMETYPES[export_format], headers=headers)
+
+# Send a list of states to get a policy for each of them
+@app.route('/get_policies', methods=['POST'])
+def get_policies():
+    data = request.get_json(silent=True)
+
+    if not isinstance(data, list):
+        return error_response("Request body must be a list of hands", "body")
+
+    # Invalid hands get an error in place of their policy
+    policies = []
+    for hand in data:
+        if not isinstance(hand, dict):
+            metrics.count_error("body")
+            policies.append({"error": "Hand must be an object"})
+            continue
+
+        try:
+            hand_model, rules = get_model(hand)
+        except ValueError as e:
+            metrics.count_error("rules")
+            policies.append({"error": str(e)})
+            continue
+
+        state_index, error = parse_hand(hand, rules)
+        if error is not None:
+            metrics.count_error(get_error_type(error))
+            policies.append({"error": error})
+        else:
+            action = hand_model.get_action(state_index)
+            metrics.count_policy(action, hand['true_count'])
+            policies.append({"policy": action})
+
+    return jsonify({"policies": policies})
+
+RANKS = "A234567890JQK"
+SUITS = "HDCS"
+
+# Value of every valid card code, like "AH" or "0S" (0 represents 10), so a card is validated and
+# valued with one lookup
+CARD_VALUES = {rank + suit: 11 if rank == "A" else 10 if rank in "0JQK" else int(rank)
+               for rank in RANKS for suit in SUITS}
+
+def get_card_error(card):
     '''
-    Raises an error if a card is invalid
-    
-    :param card: the card we're checking
+    Returns why a card that isn't in CARD_VALUES is invalid
+
+    :param card: the invalid card
     '''
     if not isinstance(card, str):
-        raise ValueError("Card must be represented as a string")
+        return "Card must be represented as a string"
     if len(card) != 2:
-        raise ValueError("Card must be of length 2")
-    if card[0] not in ["A", "2", "3", "4", "5", "6", "7", "8", "9", "0", "J", "Q", "K"]:
-        raise ValueError("Invalid rank")
-    if card[1] not in ["H", "D", "C", "S"]:
-        raise ValueError("Invalid suit")
+        return "Card must be of length 2"
+    if card[0] not in RANKS:
+        return "Invalid rank"
+    return "Invalid suit"
 
-def validate_input(player_cards, dealer_card, true_count):
-    '''
-    Raises an error if given input is invalid
-    
-    :param player_cards: a list if player cards
-    :param dealer_card: a string representing the dealer's shown card
-    :param true_count: the true count of the deck
-    '''
-    # Validate player cards
-    if not isinstance(player_cards, list):
-        raise ValueError("Player cards must be a list")
-    for card in player_cards:
-        validate_card(card)
+# Label in /metrics of each error of parse_hand, except the true count range error, whose message
+# includes the true count
+HAND_ERROR_TYPES = {
+    "Player cards must be a list": "player_cards",
+    "Player hand must have at least 2 cards": "player_card_count",
+    "Player hand is over 21": "player_bust",
+    "Card must be represented as a string": "card_type",
+    "Card must be of length 2": "card_length",
+    "Invalid rank": "card_rank",
+    "Invalid suit": "card_suit",
+    "True count must be an int": "true_count_type",
+}
 
-    # Validate dealer card
-    validate_card(dealer_card)
+def get_error_type(error):
+    '''
+    Returns the label in /metrics of an error message of parse_hand
 
-    # Validate true count
-    if not isinstance(true_count, int):
-        raise ValueError("True count must be an int")
-    if not -5 <= true_count <= 5:
-        raise ValueError(f"True count of {true_count} is invalid, must be in the range [-5, 5]")
+    :param error: error message
+    '''
+    return HAND_ERROR_TYPES.get(error, "true_count_range")
 
-def convert_to_state(player_cards, dealer_card, true_count):
+def parse_hand(hand, rules=None):
     '''
-    Converts given parameters to a state tuple for the blackjack model
-    
-    :param player_cards: a list of player cards
-    :param dealer_card: a string representing the dealer's shown card
-    :param true_count: the true count of the deck
+    Validates a hand from a request and encodes it in a single pass. Returns a tuple as:
+    (encoded state index for the blackjack model, None) if the hand is valid, or
+    (None, error message) if it isn't
+
+    :param hand: a request dict with player_cards, a list of player cards, dealer_card, a string
+                 representing the dealer's shown card, and true_count, the true count of the deck
+    :param rules: Rules of the table, the default rules if None
     '''
-    validate_input(player_cards, dealer_card, true_count)
+    player_cards = hand.get('player_cards', '')
+    dealer_card = hand.get('dealer_card', '')
+    true_count = hand.get('true_count', '')
 
-    can_double = len(player_cards) == 2
-    dealer_hand_val = calc_card_value(dealer_card)
-    can_split = len(player_cards) == 2 and calc_card_value(player_cards[0]) == calc_card_value(player_cards[1])
+    if not isinstance(player_cards, list):
+        return (None, "Player cards must be a list")
+    if len(player_cards) < 2:
+        return (None, "Player hand must have at least 2 cards")
+
+    # Total the player hand, counting aces as 11
     player_hand_val = 0
     soft_aces = 0
-
-    # Calculate total player hand value and the number of soft aces
     for card in player_cards:
-        val = calc_card_value(card)
-        player_hand_val += val
+        val = CARD_VALUES.get(card) if isinstance(card, str) else None
+        if val is None:
+            return (None, get_card_error(card))
 
-        # Calculate number of soft aces
+        player_hand_val += val
         if val == 11:
             soft_aces += 1
-    
-    # Reduce aces to prevent busting
+
+    dealer_hand_val = CARD_VALUES.get(dealer_card) if isinstance(dealer_card, str) else None
+    if dealer_hand_val is None:
+        return (None, get_card_error(dealer_card))
+
+    if not isinstance(true_count, int):
+        return (None, "True count must be an int")
+    if not -5 <= true_count <= 5:
+        return (None, f"True count of {true_count} is invalid, must be in the range [-5, 5]")
+
+    # Count aces as 1 until the hand doesn't bust
     while soft_aces > 0 and player_hand_val > 21:
-        if player_hand_val + 10 < 22:
-            player_hand_val -= 10
-            soft_aces -= 1
-        else:
-            break
+        player_hand_val -= 10
+        soft_aces -= 1
 
-    is_soft = bool(soft_aces)
+    # Busted hands have no decision left to make
+    if player_hand_val > 21:
+        return (None, "Player hand is over 21")
 
-    return (player_hand_val, is_soft, dealer_hand_val, can_split, can_double, True, true_count)
+    is_pair = len(player_cards) == 2
+    can_split = is_pair and CARD_VALUES[player_cards[0]] == CARD_VALUES[player_cards[1]]
+    if rules is not None and rules.get_max_hands() < 2:
+        can_split = False
+    can_surrender = is_pair and rules is not None and rules.surrender
 
-def calc_card_value(card):
-    '''
-    Returns the value of a given card
-    
-    :param card: the inputted card represented as the rank followed by the suit
-                 (0 represents 10)
-    '''
-    rank = card[0]
-    if rank == "A":
-        return 11
-    elif rank in ["0", "J", "Q", "K"]:
-        return 10
-    else:
-        return int(rank)
+    return (state_encoding.encode_state(player_hand_val, soft_aces > 0, dealer_hand_val, can_split, is_pair, True, true_count,
+                                        can_surrender), None)
+
+# Time every request around the whole app, which costs far less than Flask's request hooks
+app.wsgi_app = metrics.wrap(app.wsgi_app, {rule.rule for rule in app.url_map.iter_rules()})
 
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,48 @@
+import json
+from urllib import request
+
+SERVER_URL = "http://127.0.0.1:5000"
+
+def post(url, data):
+    '''
+    Returns the decoded JSON response to posting @data to @url
+
+    :param url: endpoint to post to
+    :param data: JSON-serializable request body
+    '''
+    req = request.Request(url, data=json.dumps(data).encode(), headers={"Content-Type": "application/json"})
+
+    with request.urlopen(req) as response:
+        return json.loads(response.read())
+
+def get_policy(player_cards, dealer_card, true_count, server_url=SERVER_URL, rules=None):
+    '''
+    Returns the policy for a single hand from /get_policy
+
+    :param player_cards: a list of player cards, such as ["AH", "0S"]
+    :param dealer_card: a string representing the dealer's shown card
+    :param true_count: the true count of the deck
+    :param server_url: base url of the backend
+    :param rules: dict of num_decks and table rules, such as {"num_decks": 2, "surrender": True},
+                  None for the default policy
+    '''
+    hand = {"player_cards": player_cards, "dealer_card": dealer_card, "true_count": true_count}
+    if rules is not None:
+        hand["rules"] = rules
+    return post(server_url + "/get_policy", hand)["policy"]
+
+def get_policies(hands, server_url=SERVER_URL, batch_size=1000):
+    '''
+    Returns a list with the result for each hand from /get_policies, in order. Each result is
+    {"policy": action} or {"error": message} if the hand was invalid.
+
+    :param hands: a list of dicts with player_cards, dealer_card, and true_count, and optionally rules
+    :param server_url: base url of the backend
+    :param batch_size: maximum number of hands sent per request
+    '''
+    results = []
+
+    for start in range(0, len(hands), batch_size):
+        results.extend(post(server_url + "/get_policies", hands[start:start + batch_size])["policies"])
+
+    return results
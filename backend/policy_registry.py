@@ -0,0 +1,175 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from blackjack_model.model_file import MODEL_EXTENSION, get_table_rules, load_policy_table, read_header
+from blackjack_model.rules import Rules
+
+DEFAULT_NUM_DECKS = 6
+
+def get_key(num_decks, rules):
+    '''
+    Returns the key a policy for @num_decks decks and @rules is registered under
+
+    :param num_decks: number of decks in the shoe
+    :param rules: table Rules
+    '''
+    return (num_decks, rules)
+
+def get_key_name(key):
+    '''
+    Returns a readable name of @key, like "6d-s17-das-nls-spu-3:2"
+
+    :param key: key from get_key
+    '''
+    num_decks, rules = key
+    return f"{num_decks}d-{rules.get_name()}"
+
+def parse_rules(rules):
+    '''
+    Returns the registry key of a request's rules field, a dict of num_decks and the Rules
+    parameters, where missing rules take their defaults. Raises ValueError if it's invalid.
+
+    :param rules: the rules field of a request
+    '''
+    if not isinstance(rules, dict):
+        raise ValueError("Rules must be an object")
+
+    table_rules = dict(rules)
+    num_decks = table_rules.pop('num_decks', DEFAULT_NUM_DECKS)
+    if not isinstance(num_decks, int) or isinstance(num_decks, bool) or num_decks < 1:
+        raise ValueError("num_decks must be a positive integer")
+
+    try:
+        return get_key(num_decks, Rules.from_dict(table_rules))
+    except TypeError as e:
+        raise ValueError(str(e))
+
+class PolicyRegistry:
+    '''
+    Policy tables for several rulesets, loaded on first use and kept in a size-bounded LRU cache
+    '''
+    def __init__(self, capacity=8):
+        '''
+        :param capacity: largest number of policies kept loaded at once, not counting pinned ones
+        '''
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+
+        self.capacity = capacity
+        self.paths = {}
+        self.pinned = {}
+        self.loaded = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Key: (seconds taken to load, file size in bytes) of every loaded or pinned policy
+        self.load_info = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def discover(self, directory):
+        '''
+        Registers every model file in @directory under the rules in its header. Only headers are
+        read, the Q-values are loaded when a policy is first requested. Returns the number of
+        model files registered.
+
+        :param directory: directory holding model files
+        '''
+        if not os.path.isdir(directory):
+            return 0
+
+        count = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(MODEL_EXTENSION):
+                continue
+
+            path = os.path.join(directory, name)
+            try:
+                header, _ = read_header(path)
+                rules = header['rules']
+                key = get_key(rules.get('num_decks', DEFAULT_NUM_DECKS), get_table_rules(rules))
+            except (OSError, ValueError, TypeError, KeyError) as e:
+                print(f"Skipping model file {path}: {e}")
+                continue
+
+            if key in self.paths:
+                print(f"Skipping model file {path}: {self.paths[key]} already has rules {get_key_name(key)}")
+                continue
+
+            self.paths[key] = path
+            count += 1
+
+        return count
+
+    def pin(self, key, policy, load_seconds=0.0, size=0):
+        '''
+        Registers an already loaded @policy under @key that is never evicted
+
+        :param key: key from get_key
+        :param policy: PolicyTable
+        :param load_seconds: seconds taken to load @policy
+        :param size: size in bytes of the file @policy was loaded from
+        '''
+        with self.lock:
+            self.pinned[key] = policy
+            self.load_info[key] = (load_seconds, size)
+
+    def get_policy_table(self, key):
+        '''
+        Returns the PolicyTable registered under @key, loading it if it isn't cached and evicting
+        the least recently used policy if the cache is full. Raises ValueError if there is no
+        policy for @key.
+
+        :param key: key from get_key
+        '''
+        with self.lock:
+            if key in self.pinned:
+                self.hits += 1
+                return self.pinned[key]
+
+            if key in self.loaded:
+                self.hits += 1
+                self.loaded.move_to_end(key)
+                return self.loaded[key]
+
+            if key not in self.paths:
+                raise ValueError(f"No policy for rules {get_key_name(key)}")
+
+            self.misses += 1
+            path = self.paths[key]
+            start = time.perf_counter()
+            policy = load_policy_table(path)
+            self.load_info[key] = (time.perf_counter() - start, os.path.getsize(path))
+            self.loaded[key] = policy
+
+            if len(self.loaded) > self.capacity:
+                evicted, _ = self.loaded.popitem(last=False)
+                del self.load_info[evicted]
+                self.evictions += 1
+
+            return policy
+
+    def get_load_info(self):
+        '''
+        Returns a dict of the name of every loaded or pinned policy to (seconds taken to load it,
+        size of its file in bytes)
+        '''
+        with self.lock:
+            return {get_key_name(key): info for key, info in self.load_info.items()}
+
+    def get_stats(self):
+        '''
+        Returns a dict of the registered and loaded policies and the cache counters
+        '''
+        with self.lock:
+            return {
+                'registered': sorted(get_key_name(key) for key in set(self.paths) | set(self.pinned)),
+                'loaded': [get_key_name(key) for key in self.loaded],
+                'pinned': sorted(get_key_name(key) for key in self.pinned),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
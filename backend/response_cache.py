@@ -0,0 +1,97 @@
+import json
+import threading
+import weakref
+import zlib
+import numpy as np
+from blackjack_model import state_encoding
+
+class ResponseCache:
+    '''
+    Serialized /get_policy responses and their ETags for each policy table, indexed by encoded
+    state. Every request that encodes to the same state, whatever its suits, card order or rules
+    field, gets the same cached bytes. Responses are dropped along with their policy when the
+    policy registry evicts it.
+    '''
+    def __init__(self):
+        self.responses = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_responses(self, policy):
+        '''
+        Returns the list of cached responses of @policy, None where a state isn't rendered yet
+
+        :param policy: PolicyTable
+        '''
+        responses = self.responses.get(policy)
+        if responses is None:
+            with self.lock:
+                responses = self.responses.setdefault(policy, [None] * state_encoding.NUM_STATES)
+        return responses
+
+    def render(self, policy, state_index):
+        '''
+        Returns a tuple as:
+        (serialized response body of @policy at @state_index, its quoted ETag)
+
+        :param policy: PolicyTable
+        :param state_index: encoded state
+        '''
+        body = (json.dumps({"policy": policy.get_action(state_index)}, separators=(",", ":")) + "\n").encode()
+        return (body, f'"{zlib.crc32(body):08x}"')
+
+    def get_response(self, policy, state_index):
+        '''
+        Returns a tuple as:
+        (serialized response body of @policy at @state_index, its quoted ETag)
+        rendering and caching it on the first request
+
+        :param policy: PolicyTable
+        :param state_index: encoded state
+        '''
+        responses = self.get_responses(policy)
+        response = responses[state_index]
+
+        with self.lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if response is None:
+            response = self.render(policy, state_index)
+            responses[state_index] = response
+
+        return response
+
+    def warm(self, policy):
+        '''
+        Renders the response of every state a request can encode to, the states where the player
+        can act. Returns the number of states rendered.
+
+        :param policy: PolicyTable
+        '''
+        responses = self.get_responses(policy)
+        states = np.flatnonzero(state_encoding.legal_action_mask()[:, 0]).tolist()
+
+        for state_index in states:
+            if responses[state_index] is None:
+                responses[state_index] = self.render(policy, state_index)
+
+        return len(states)
+
+    def get_stats(self):
+        '''
+        Returns a dict of the cache hits, misses, hit rate and number of cached responses
+        '''
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'policies': len(self.responses),
+                'responses': sum(len(responses) - responses.count(None) for responses in self.responses.values()),
+            }
@@ -0,0 +1,64 @@
+import argparse
+import os
+from gunicorn.app.base import BaseApplication
+
+# Importing the app loads the policy model once in the parent process, before workers are forked,
+# so every worker shares the same copy of it
+from optimal_policy import app, model, response_cache
+
+class PolicyServer(BaseApplication):
+    '''
+    Runs the policy backend under gunicorn with the app preloaded in the parent process
+    '''
+    def __init__(self, application, options):
+        '''
+        :param application: WSGI app to serve
+        :param options: gunicorn settings
+        '''
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        '''
+        Applies @options to the gunicorn config
+        '''
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        '''
+        Returns the preloaded app
+        '''
+        return self.application
+
+def parse_args():
+    '''
+    Returns command line arguments, defaulting to the POLICY_BIND, POLICY_WORKERS, POLICY_THREADS
+    and POLICY_WARM_CACHE environment variables
+    '''
+    parser = argparse.ArgumentParser(description="Serve the policy backend with multiple workers")
+    parser.add_argument("--bind", default=os.environ.get("POLICY_BIND", "127.0.0.1:5000"),
+                        help="address to listen on")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("POLICY_WORKERS", os.cpu_count() or 1)),
+                        help="number of worker processes")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("POLICY_THREADS", 1)),
+                        help="number of threads per worker")
+    parser.add_argument("--warm-cache", action="store_true", default=os.environ.get("POLICY_WARM_CACHE") == "1",
+                        help="render the response of every state of the default policy before forking workers")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Workers share the rendered responses with the parent process
+    if args.warm_cache:
+        print(f"Rendered {response_cache.warm(model)} responses")
+
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "threads": args.threads,
+        "preload_app": True,
+    }
+    PolicyServer(app, options).run()
@@ -0,0 +1,134 @@
+import time
+import bisect
+import threading
+
+# Upper bounds in seconds of the buckets of the request latency histograms
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+def escape_label(value):
+    '''
+    Returns @value escaped for a label value in the Prometheus text format
+
+    :param value: label value
+    '''
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class ServerMetrics:
+    '''
+    Counters and latency histograms of the policy server, rendered in the Prometheus text format.
+    Recording a request takes a bisect and a few list updates under a lock, about a microsecond,
+    and the text is only built when it's scraped.
+    '''
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        '''
+        :param buckets: sorted upper bounds in seconds of the latency histogram buckets
+        '''
+        self.buckets = buckets
+        self.lock = threading.Lock()
+
+        # Route: [count of each bucket and of the +Inf bucket, not cumulative, sum of seconds]
+        self.latencies = {}
+
+        # Error type: count, and (action, true count): count
+        self.errors = {}
+        self.policies = {}
+
+    def observe_request(self, route, seconds):
+        '''
+        Records a request to @route that took @seconds
+
+        :param route: URL rule of the request
+        :param seconds: latency of the request
+        '''
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.latencies.get(route)
+            if histogram is None:
+                histogram = self.latencies[route] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+
+    def wrap(self, wsgi_app, routes):
+        '''
+        Returns @wsgi_app recording the latency of every request, until the app returns its
+        response, by route. Paths that aren't in @routes are recorded as "unmatched" so they
+        can't add labels.
+
+        :param wsgi_app: WSGI application
+        :param routes: set of the paths of the app's routes
+        '''
+        perf_counter = time.perf_counter
+
+        def timed_app(environ, start_response):
+            start = perf_counter()
+            try:
+                return wsgi_app(environ, start_response)
+            finally:
+                path = environ.get('PATH_INFO', '')
+                self.observe_request(path if path in routes else "unmatched", perf_counter() - start)
+
+        return timed_app
+
+    def count_error(self, error_type):
+        '''
+        Records an invalid request
+
+        :param error_type: label of the error, like "card_rank"
+        '''
+        with self.lock:
+            self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    def count_policy(self, action, true_count):
+        '''
+        Records a policy sent in a response
+
+        :param action: action name sent, None where the hand can't act
+        :param true_count: true count of the hand
+        '''
+        key = (action, true_count)
+        with self.lock:
+            self.policies[key] = self.policies.get(key, 0) + 1
+
+    def render(self, models):
+        '''
+        Returns the metrics in the Prometheus text exposition format
+
+        :param models: dict of policy name to (seconds taken to load it, size of its file in bytes)
+        '''
+        with self.lock:
+            latencies = {route: (list(counts), total) for route, (counts, total) in self.latencies.items()}
+            errors = dict(self.errors)
+            policies = dict(self.policies)
+
+        lines = ["# HELP policy_request_duration_seconds Latency of requests by route.",
+                 "# TYPE policy_request_duration_seconds histogram"]
+        for route, (counts, total) in sorted(latencies.items()):
+            route = escape_label(route)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"policy_request_duration_seconds_bucket{{route=\"{route}\",le=\"{bound}\"}} {cumulative}")
+            lines.append(f"policy_request_duration_seconds_sum{{route=\"{route}\"}} {total!r}")
+            lines.append(f"policy_request_duration_seconds_count{{route=\"{route}\"}} {cumulative}")
+
+        lines += ["# HELP policy_request_errors_total Invalid requests and hands by type of error.",
+                  "# TYPE policy_request_errors_total counter"]
+        for error_type, count in sorted(errors.items()):
+            lines.append(f"policy_request_errors_total{{type=\"{escape_label(error_type)}\"}} {count}")
+
+        lines += ["# HELP policy_responses_total Policies sent by action and true count.",
+                  "# TYPE policy_responses_total counter"]
+        for (action, true_count), count in sorted(policies.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+            lines.append(f"policy_responses_total{{action=\"{escape_label(action)}\",true_count=\"{true_count}\"}} {count}")
+
+        lines += ["# HELP policy_model_load_seconds Time taken to load each loaded policy.",
+                  "# TYPE policy_model_load_seconds gauge"]
+        for name, (seconds, _) in sorted(models.items()):
+            lines.append(f"policy_model_load_seconds{{policy=\"{escape_label(name)}\"}} {seconds!r}")
+
+        lines += ["# HELP policy_model_size_bytes Size of the file of each loaded policy.",
+                  "# TYPE policy_model_size_bytes gauge"]
+        for name, (_, size) in sorted(models.items()):
+            lines.append(f"policy_model_size_bytes{{policy=\"{escape_label(name)}\"}} {size}")
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,7 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tests import the backend like its scripts do, with the backend directory on the path
+sys.path.insert(0, BACKEND_DIR)
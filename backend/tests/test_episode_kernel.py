@@ -0,0 +1,29 @@
+import pytest
+from blackjack_model.episode_kernel import BACKENDS, HAVE_NUMBA
+from blackjack_model.kernel_parity import RULESETS, check_parity
+from blackjack_model.shoe import COUNTING_SYSTEMS
+
+# Episodes of each run, enough to reshuffle a single deck shoe many times
+NUM_EPISODES = 1000
+SEEDS = [0, 1]
+
+# The numba backend compiles on first use, which takes a few seconds
+TESTED_BACKENDS = [backend for backend in BACKENDS if backend == 'python' or HAVE_NUMBA]
+
+@pytest.mark.parametrize("backend", TESTED_BACKENDS)
+@pytest.mark.parametrize("rules", RULESETS, ids=[rules.get_name() for rules in RULESETS])
+@pytest.mark.parametrize("num_decks", [6, 1])
+def test_kernel_matches_run_episode(backend, rules, num_decks):
+    '''
+    The kernel makes the same decisions and Q-value updates as run_episode from the same shoe and random stream
+    '''
+    for seed in SEEDS:
+        assert check_parity(rules, seed, NUM_EPISODES, backend, num_decks) == [], f"seed {seed}"
+
+@pytest.mark.parametrize("backend", TESTED_BACKENDS)
+@pytest.mark.parametrize("counting_system", list(COUNTING_SYSTEMS))
+def test_kernel_matches_run_episode_counting_systems(backend, counting_system):
+    '''
+    The kernel's true count follows Shoe.get_true_count for every counting system
+    '''
+    assert check_parity(RULESETS[0], 0, NUM_EPISODES, backend, counting_system=counting_system) == []
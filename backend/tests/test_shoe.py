@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from blackjack_model.shoe import COUNTING_SYSTEMS, Shoe
+
+# Cards dealt before each true count is read, up to the default penetration of 6 decks
+DEPTHS = [0, 100, 200, 280]
+NUM_SHOES = 1000
+
+@pytest.mark.parametrize("counting_system", list(COUNTING_SYSTEMS))
+def test_true_count_is_centered(counting_system):
+    '''
+    The mean true count of shuffled shoes is about 0 at every depth, for balanced and unbalanced systems
+    '''
+    shoe = Shoe(num_decks=6, counting_system=counting_system, seed=0)
+    true_counts = {depth: [] for depth in DEPTHS}
+
+    for _ in range(NUM_SHOES):
+        shoe.shuffle()
+        for depth in DEPTHS:
+            while shoe.cursor < depth:
+                shoe.draw()
+            true_counts[depth].append(shoe.get_true_count())
+
+    for depth in DEPTHS:
+        assert abs(np.mean(true_counts[depth])) < 0.5, f"mean true count at {depth} cards"
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react'
 import Card from '../components/Card.jsx'
+import { loadPolicyTable, getTablePolicy, fetchPolicy } from '../policyTable.js'
 import '../pages_styles/GamePage.css'
 import blackjackLogo from '../assets/blackjack_logo.png'
 
@@ -17,6 +18,7 @@ function GamePage() {
 
     // AI Policy
     const [modelPolicy, setModelPolicy] = useState("")
+    const [policyTable, setPolicyTable] = useState(null)
 
     // Deck management
     const [deckID, setDeckID] = useState("")
@@ -26,9 +28,10 @@ function GamePage() {
     const [buttonColors, setButtonColors] = useState({})
     const [actionsAvailable, setActionsAvailable] = useState(false)
 
-    // Load shoe when loading the page
+    // Load shoe and the policy table when loading the page
     useEffect(() => {
         loadShoe();
+        loadPolicyTable().then(setPolicyTable);
     }, [])
 
     // Loads in the shoe from an API
@@ -74,16 +77,17 @@ function GamePage() {
         setButtonColors({})
     }
 
-    // Fetches the optimal policy from the backend
+    // Looks up the optimal policy in the policy table, or fetches it from the backend if the table isn't loaded
     async function fetchOptimal() {
-        const response = await fetch('http://127.0.0.1:5000/get_policy', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({player_cards: playerCards, dealer_card: dealerCard, true_count: trueCount})
-        });
-        const data = await response.json();
-        setModelPolicy(data['policy']);
-        return data['policy'];
+        let policy;
+        if (policyTable) {
+            policy = getTablePolicy(policyTable, playerCards, dealerCard, trueCount);
+        }
+        else {
+            policy = await fetchPolicy(playerCards, dealerCard, trueCount);
+        }
+        setModelPolicy(policy);
+        return policy;
     }
 
     // Handle game actions
@@ -0,0 +1,93 @@
+// Client-side lookups in the policy table exported by the backend's /policy_table endpoint,
+// following the state encoding in backend/blackjack_model/state_encoding.py
+
+const SERVER_URL = 'http://127.0.0.1:5000'
+
+const EXPORT_VERSION = 1
+const ENCODING_VERSION = 2
+const NO_ACTION_CHAR = '-'
+
+const DEALER_MIN = 2
+const DEALER_VALS = 10
+const TRUE_COUNT_MIN = -5
+const TRUE_COUNTS = 11
+
+// Returns the value of a card code like "AH" or "0S" (0 represents 10)
+function cardValue(card) {
+    const rank = card[0]
+    if (rank === 'A') {
+        return 11
+    }
+    if ('0JQK'.includes(rank)) {
+        return 10
+    }
+    return parseInt(rank)
+}
+
+// Returns the encoded state index of a hand under the default rules
+export function encodeState(playerCards, dealerCard, trueCount) {
+    let playerVal = 0
+    let softAces = 0
+    for (const card of playerCards) {
+        const val = cardValue(card)
+        playerVal += val
+        if (val === 11) {
+            softAces += 1
+        }
+    }
+
+    // Count aces as 1 until the hand doesn't bust
+    while (softAces > 0 && playerVal > 21) {
+        playerVal -= 10
+        softAces -= 1
+    }
+
+    // Special value for bust
+    if (playerVal > 21) {
+        playerVal = 22
+    }
+
+    const isPair = playerCards.length === 2
+    const canSplit = isPair && cardValue(playerCards[0]) === cardValue(playerCards[1])
+
+    let index = playerVal * 2 + (softAces > 0 ? 1 : 0)
+    index = index * DEALER_VALS + (cardValue(dealerCard) - DEALER_MIN)
+    index = index * 2 + (canSplit ? 1 : 0)
+    index = index * 2 + (isPair ? 1 : 0)
+    index = index * 2 + 1
+    index = index * TRUE_COUNTS + (trueCount - TRUE_COUNT_MIN)
+    return index * 2
+}
+
+// Fetches the policy table once, returns null if the backend is down or its table doesn't match
+// this encoding
+export async function loadPolicyTable() {
+    try {
+        const response = await fetch(SERVER_URL + '/policy_table')
+        const table = await response.json()
+        if (table['export_version'] !== EXPORT_VERSION || table['encoding_version'] !== ENCODING_VERSION) {
+            return null
+        }
+        return table
+    } catch (error) {
+        return null
+    }
+}
+
+// Returns the policy of a hand from a loaded policy table
+export function getTablePolicy(table, playerCards, dealerCard, trueCount) {
+    const action = table['policy'][encodeState(playerCards, dealerCard, trueCount)]
+    if (action === NO_ACTION_CHAR) {
+        return null
+    }
+    return table['actions'][parseInt(action)]
+}
+
+// Fetches the policy of a hand from the backend
+export async function fetchPolicy(playerCards, dealerCard, trueCount) {
+    // GET requests let the browser reuse cached responses for hands it has already asked about
+    const params = new URLSearchParams({player_cards: playerCards.join(','), dealer_card: dealerCard, true_count: trueCount})
+    const response = await fetch(SERVER_URL + '/get_policy?' + params)
+    const data = await response.json()
+    return data['policy']
+}